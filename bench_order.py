@@ -0,0 +1,45 @@
+"""
+Compares the insertion orders of `SNT.construct` on uniform and clustered data.
+
+Usage: python bench_order.py [n] [dim] [seed]
+"""
+import sys
+import time
+import random
+from snt import SNT
+from point import Point
+from metric import Euclidean
+from snt_pointlocation import SNTPointLocation
+
+def uniform(n, dim, metric):
+    return [Point([random.uniform(0, 1000) for _ in range(dim)], metric) for _ in range(n)]
+
+def clustered(n, dim, metric, clusters=20, spread=5):
+    # The points arrive cluster after cluster, as when a dataset is sorted by label
+    centers = [[random.uniform(0, 1000) for _ in range(dim)] for _ in range(clusters)]
+    return [Point([random.gauss(c, spread) for c in centers[i * clusters // n]], metric) for i in range(n)]
+
+def sortedbyx(n, dim, metric):
+    # Dumps of spatial data are often sorted by their first coordinate
+    return sorted(uniform(n, dim, metric), key=lambda p: p.coords)
+
+def run(points, metric, order):
+    metric.reset()
+    start = time.perf_counter()
+    T = SNT(7, 1, 1)
+    T.construct(points, SNTPointLocation, order=order)
+    return metric.counter / len(points), time.perf_counter() - start
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    print("%-10s %-8s %12s %10s" % ("data", "order", "dists/point", "seconds"))
+    for name, generate in [('uniform', uniform), ('clustered', clustered), ('sorted', sortedbyx)]:
+        random.seed(seed)
+        metric = Euclidean()
+        points = generate(n, dim, metric)
+        for order in [None, 'random', 'morton', 'hilbert', 'greedy']:
+            random.seed(seed)
+            dists, seconds = run(points, metric, order)
+            print("%-10s %-8s %12.1f %10.2f" % (name, order or 'given', dists, seconds))
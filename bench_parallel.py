@@ -0,0 +1,43 @@
+"""
+Measures the wall time of `SNT.construct_parallel` as workers are added, against `SNT.construct`.
+With one worker the tree is built by `construct`, so the speedup of every row is over the serial 
+construction. The workers beyond the number of CPUs only add shards and seams.
+
+Usage: python bench_parallel.py [n] [dim] [maxworkers] [seed]
+"""
+import os
+import sys
+import time
+import random
+from snt import SNT
+from point import Point
+from metric import Euclidean
+from snt_pointlocation import SNTPointLocation
+
+def run(points, metric, workers):
+    metric.reset()
+    start = time.perf_counter()
+    T = SNT(7, 1, 1)
+    if workers == 1:
+        T.construct(points, SNTPointLocation)
+    else:
+        T.construct_parallel(points, workers=workers)
+    return metric.counter / len(points), time.perf_counter() - start
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    maxworkers = int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count() or 1
+    seed = int(sys.argv[4]) if len(sys.argv) > 4 else 0
+    random.seed(seed)
+    metric = Euclidean()
+    points = [Point([random.uniform(0, 1000) for _ in range(dim)], metric) for _ in range(n)]
+    print("%d points in %d dimensions, %d CPUs" % (n, dim, os.cpu_count() or 1))
+    print("%-8s %12s %10s %8s" % ("workers", "dists/point", "seconds", "speedup"))
+    workers, serial = 1, None
+    while workers <= maxworkers:
+        random.seed(seed)
+        dists, seconds = run(points, metric, workers)
+        serial = serial or seconds
+        print("%-8d %12.1f %10.2f %8.2f" % (workers, dists, seconds, serial / seconds))
+        workers *= 2
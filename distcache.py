@@ -0,0 +1,180 @@
+"""
+Defines bounded caches for the distances computed by a metric
+"""
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from point import pointkey, coordtuple
+
+class DistCache(ABC):
+    """
+    An abstract base class for distance caches. Besides storing the distances,
+    a cache counts its hits, misses and evictions.
+
+    Parameters:
+    ----------
+    capacity : int
+        The maximum number of stored distances. If capacity==None, the cache never evicts.
+    """
+    def __init__(self, capacity=None):
+        if capacity is not None and capacity < 1:
+            raise ValueError("DistCache: the capacity should be a positive integer")
+        self.capacity = capacity
+        self.clear()
+
+    def clear(self):
+        """
+        Removes all stored distances and resets the counters.
+        """
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @abstractmethod
+    def get(self, key):
+        """
+        Looks up a distance.
+
+        Parameters:
+        ----------
+        key : hashable
+            The key of a pair of points.
+
+        Returns:
+        -------
+        float
+            The stored distance, or None if the key is not in the cache.
+        """
+        pass
+
+    @abstractmethod
+    def put(self, key, dist):
+        """
+        Stores a distance, evicting another one if the cache is full.
+
+        Parameters:
+        ----------
+        key : hashable
+            The key of a pair of points.
+        dist : float
+            The distance between the points.
+        """
+        pass
+
+    @abstractmethod
+    def __len__(self):
+        pass
+
+class LRUCache(DistCache):
+    """
+    Evicts the least recently used distance.
+    """
+    def clear(self):
+        DistCache.clear(self)
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        dist = self.entries.get(key)
+        if dist is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return dist
+
+    def put(self, key, dist):
+        self.entries[key] = dist
+        self.entries.move_to_end(key)
+        if self.capacity is not None and len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self.entries)
+
+class ClockCache(DistCache):
+    """
+    Approximates LRU with the CLOCK algorithm: every slot has a reference bit that is set
+    on a hit, and the hand sweeps the slots clearing the bits until it finds one to evict.
+    """
+    def clear(self):
+        DistCache.clear(self)
+        # A dictionary from keys to their slots
+        self.slots = dict()
+        self.keys = []
+        self.dists = []
+        self.refs = bytearray()
+        self.hand = 0
+
+    def get(self, key):
+        slot = self.slots.get(key)
+        if slot is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.refs[slot] = 1
+        return self.dists[slot]
+
+    def put(self, key, dist):
+        slot = self.slots.get(key)
+        if slot is not None:
+            self.dists[slot] = dist
+            self.refs[slot] = 1
+        elif self.capacity is None or len(self.keys) < self.capacity:
+            self.slots[key] = len(self.keys)
+            self.keys.append(key)
+            self.dists.append(dist)
+            self.refs.append(1)
+        else:
+            while self.refs[self.hand]:
+                self.refs[self.hand] = 0
+                self.hand = (self.hand + 1) % self.capacity
+            del self.slots[self.keys[self.hand]]
+            self.evictions += 1
+            self.slots[key] = self.hand
+            self.keys[self.hand] = key
+            self.dists[self.hand] = dist
+            self.hand = (self.hand + 1) % self.capacity
+
+    def __len__(self):
+        return len(self.keys)
+
+def pairkey(first, second):
+    """
+    Returns a key for an unordered pair of points, so (a, b) and (b, a) share one entry.
+    Registered points are identified by their ids. Other points identify themselves, since
+    two points are the same exactly when they have the same coordinates. The pair is ordered
+    by hash, and keys with equal hashes are ordered by `totalkey`.
+    """
+    first, second = pointkey(first), pointkey(second)
+    if isinstance(first, int) and isinstance(second, int):
+        return (first, second) if first <= second else (second, first)
+    hashfirst, hashsecond = hash(first), hash(second)
+    if hashfirst == hashsecond:
+        return (first, second) if totalkey(first) <= totalkey(second) else (second, first)
+    return (first, second) if hashfirst < hashsecond else (second, first)
+
+def totalkey(key):
+    """
+    Orders the keys returned by `pointkey`: ids come first, and points follow by coordinates.
+    """
+    return (0, (key,)) if isinstance(key, int) else (1, coordtuple(key))
+
+def makecache(policy, capacity=None):
+    """
+    Creates a distance cache.
+
+    Parameters:
+    ----------
+    policy : str
+        The eviction policy, either 'lru' or 'clock'.
+    capacity : int
+        The maximum number of stored distances. If capacity==None, the cache never evicts.
+
+    Returns:
+    -------
+    DistCache
+    """
+    policies = {'lru' : LRUCache, 'clock' : ClockCache}
+    if policy not in policies:
+        raise ValueError("makecache: unknown eviction policy " + repr(policy))
+    return policies[policy](capacity)
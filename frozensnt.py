@@ -0,0 +1,378 @@
+"""
+Defines an immutable net-tree stored in flat arrays for read-only serving
+"""
+import json
+import heapq
+import struct
+import itertools
+import numpy
+from pointset import PointSet, PointView
+from metric import Metric, Euclidean
+
+# The file format of saved trees: the magic bytes, the format version and the length of a JSON header,
+# followed by the header and the arrays. Every array starts at a multiple of ALIGN bytes and
+# the offsets in the header are counted from the end of the padded header.
+MAGIC = b'NETTREE\0'
+VERSION = 1
+ALIGN = 64
+
+class FrozenSNT:
+    """
+    Holds a built semi-compressed net-tree as a struct of arrays. Nodes are numbered in
+    breadth-first order from the root, which has number 0. The children and the relatives
+    of node i are `chidx[chptr[i]:chptr[i+1]]` and `relidx[relptr[i]:relptr[i+1]]`.
+
+    Parameters:
+    ----------
+    tau, cp, cc, cr : float
+        The constants of the tree.
+    points : PointSet
+        The input points of the tree.
+    nodepoint : numpy.ndarray
+        The index in `points` of the point associated to each node.
+    level : numpy.ndarray
+        The level of each node, as floats so the root and the leaves can be at +/-infinity.
+    parent : numpy.ndarray
+        The parent of each node, or -1 for the root.
+    chptr, chidx : numpy.ndarray
+        The children of the nodes in compressed sparse row format.
+    relptr, relidx : numpy.ndarray
+        The relatives of the nodes in compressed sparse row format.
+    """
+    def __init__(self, tau, cp, cc, cr, points, nodepoint, level, parent, chptr, chidx, relptr, relidx):
+        self.tau = tau
+        self.cp = cp
+        self.cc = cc
+        self.cr = cr
+        self.points = points
+        self.nodepoint = nodepoint
+        self.level = level
+        self.parent = parent
+        self.chptr = chptr
+        self.chidx = chidx
+        self.relptr = relptr
+        self.relidx = relidx
+
+    @staticmethod
+    def fromtree(tree, metric=None):
+        """
+        Flattens a built net-tree.
+
+        Parameters:
+        ----------
+        tree : SNT
+            A net-tree. An empty tree is flattened without any node or point.
+        metric : Metric
+            The metric of the frozen points. If metric==None, the metric of the first point is used,
+            or Euclidean if the tree is empty.
+
+        Returns:
+        -------
+        FrozenSNT
+        """
+        if tree.root is None:
+            nodes = numpy.zeros(0, dtype=numpy.int64)
+            return FrozenSNT(tree.tau, tree.cp, tree.cc, tree.cr, PointSet(numpy.zeros((0, 0)), metric or Euclidean()),
+                             nodes, numpy.zeros(0), nodes, *csr([]), *csr([]))
+        pointindex = {id(p) : i for i, p in enumerate(tree.points)}
+        nodes = [tree.root]
+        number = {id(tree.root) : 0}
+        for node in nodes:
+            for child in node.ch:
+                number[id(child)] = len(nodes)
+                nodes.append(child)
+        chlists = [[number[id(c)] for c in node.ch] for node in nodes]
+        rellists = [[number[id(r)] for r in node.rel if id(r) in number] for node in nodes]
+        return FrozenSNT(tree.tau, tree.cp, tree.cc, tree.cr,
+                         PointSet.frompoints(tree.points, metric),
+                         numpy.array([pointindex[id(node.point)] for node in nodes], dtype=numpy.int64),
+                         numpy.array([node.level for node in nodes], dtype=float),
+                         numpy.array([number[id(node.par)] if node.par is not None else -1 for node in nodes], dtype=numpy.int64),
+                         *csr(chlists), *csr(rellists))
+
+    def header(self):
+        """
+        Returns the constants of the tree and the name of its metric, as stored in saved files.
+        """
+        return {'tau' : self.tau, 'cp' : self.cp, 'cc' : self.cc, 'cr' : self.cr, 
+                'metric' : type(self.points.metric).__name__}
+
+    def arrays(self):
+        """
+        Returns the arrays of the tree by name, as stored in saved files.
+        """
+        return {'coords' : self.points.coords, 'nodepoint' : self.nodepoint, 'level' : self.level, 
+                'parent' : self.parent, 'chptr' : self.chptr, 'chidx' : self.chidx, 
+                'relptr' : self.relptr, 'relidx' : self.relidx}
+
+    @staticmethod
+    def fromarrays(header, arrays, metric=None):
+        """
+        Creates a frozen tree from the header and the arrays of a saved file, without copying the arrays.
+
+        Parameters:
+        ----------
+        header : dict
+            The constants of the tree and the name of its metric.
+        arrays : dict
+            The arrays of the tree by name.
+        metric : Metric
+            The metric of the points. If metric==None, a new instance of the saved metric class is used.
+
+        Returns:
+        -------
+        FrozenSNT
+        """
+        if metric is None:
+            metrics = {cls.__name__ : cls for cls in Metric.__subclasses__()}
+            if header['metric'] not in metrics:
+                raise ValueError("FrozenSNT: unknown metric " + repr(header['metric']))
+            metric = metrics[header['metric']]()
+        # The points of a tree are distinct, so the rows need not be sorted to find duplicates
+        return FrozenSNT(header['tau'], header['cp'], header['cc'], header['cr'], 
+                         PointSet(arrays['coords'], metric, dedup=False), *(arrays[name] for name in 
+                         ['nodepoint', 'level', 'parent', 'chptr', 'chidx', 'relptr', 'relidx']))
+
+    def save(self, path):
+        """
+        Writes the tree to a binary file that `load` can map into memory.
+        """
+        writearrays(path, self.header(), self.arrays())
+
+    @staticmethod
+    def load(path, mmap=True, metric=None):
+        """
+        Reads a tree written by `save` or `SNT.save`.
+
+        Parameters:
+        ----------
+        path : str
+            The path of the file.
+        mmap : bool
+            If True, the arrays are read-only views of a memory map of the file, so loading reads
+            nothing but the header and processes sharing the file share its pages. Otherwise, the
+            arrays are read into memory.
+        metric : Metric
+            The metric of the points. If metric==None, a new instance of the saved metric class is used.
+
+        Returns:
+        -------
+        FrozenSNT
+        """
+        return FrozenSNT.fromarrays(*readarrays(path, mmap), metric)
+
+    def __len__(self):
+        return len(self.level)
+
+    def children(self, node):
+        return self.chidx[self.chptr[node]:self.chptr[node + 1]]
+
+    def relatives(self, node):
+        return self.relidx[self.relptr[node]:self.relptr[node + 1]]
+
+    def coveringradius(self, nodes):
+        """
+        Bounds the distance between nodes and the points of the leaves below them,
+        as in `SNT.coveringradius`. Works on a single node or an array of nodes.
+        """
+        return self.cc * self.tau ** (self.level[nodes] + 1) / (self.tau - 1)
+
+    def dists(self, point, nodes):
+        """
+        Computes the distances between a point and the points of the given nodes in one batch.
+        The coordinates go straight to the vectorized kernel unless the metric needs the points.
+        """
+        metric = point.metric
+        if metric.cachedist or not metric.vectorized:
+            return metric.dists(point, [PointView(self.points, i) for i in self.nodepoint[nodes]])
+        return metric.dists(point, self.points.rows(self.nodepoint[nodes]))
+
+    def top(self):
+        return int(self.children(0)[0])
+
+    def nn(self, point):
+        """
+        Finds the nearest input point to a query point.
+
+        Parameters:
+        ----------
+        point : Point
+            The query point.
+
+        Returns:
+        -------
+        tuple
+            The nearest point and its distance to `point`, or None if the tree is empty.
+        """
+        result = self.knn(point, 1)
+        return result[0] if result else None
+
+    def knn(self, point, k):
+        """
+        Finds the k nearest input points to a query point with the best-first search of `SNT.knn`.
+
+        Parameters:
+        ----------
+        point : Point
+            The query point.
+        k : int
+            The number of neighbors.
+
+        Returns:
+        -------
+        list
+            Up to k pairs (point, distance) sorted by increasing distance.
+        """
+        if k < 1 or len(self) == 0: return []
+        top = self.top()
+        dst = float(self.dists(point, [top])[0])
+        tiebreak = itertools.count()
+        queue = [(max(dst - self.coveringradius(top), 0), next(tiebreak), dst, top)]
+        # A bounded max-heap keeping the distances of the k best leaves found so far
+        candidates = []
+        result = []
+        while queue and len(result) < k:
+            _, _, dst, node = heapq.heappop(queue)
+            if self.level[node] == float('-inf'):
+                result.append((self.points[int(self.nodepoint[node])], dst))
+                continue
+            children = self.children(node)
+            same = self.nodepoint[children] == self.nodepoint[node]
+            childdsts = numpy.full(len(children), dst)
+            childdsts[~same] = self.dists(point, children[~same])
+            bounds = numpy.maximum(childdsts - self.coveringradius(children), 0)
+            leaves = self.level[children] == float('-inf')
+            for child, childdst, bound, isleaf in zip(children.tolist(), childdsts.tolist(), bounds.tolist(), leaves):
+                if len(candidates) == k and bound > -candidates[0]:
+                    continue
+                if isleaf:
+                    if len(candidates) == k: heapq.heappop(candidates)
+                    heapq.heappush(candidates, -childdst)
+                heapq.heappush(queue, (bound, next(tiebreak), childdst, child))
+        return result
+
+    def range(self, point, r):
+        """
+        Finds the input points within a given distance of a query point, like `SNT.range`.
+
+        Parameters:
+        ----------
+        point : Point
+            The query point.
+        r : float
+            The query radius.
+
+        Returns:
+        -------
+        list
+            The input points within distance `r` of `point`, in no particular order.
+        """
+        if len(self) == 0: return []
+        top = self.top()
+        result = []
+        stack = [(top, float(self.dists(point, [top])[0]))]
+        while stack:
+            node, dst = stack.pop()
+            radius = self.coveringradius(node)
+            if dst - radius > r:
+                continue
+            if dst + radius <= r:
+                result.extend(self.points[int(i)] for i in self.nodepoint[self.leavesbelow(node)])
+                continue
+            children = self.children(node)
+            same = self.nodepoint[children] == self.nodepoint[node]
+            childdsts = numpy.full(len(children), dst)
+            childdsts[~same] = self.dists(point, children[~same])
+            stack.extend(zip(children.tolist(), childdsts.tolist()))
+        return result
+
+    def leavesbelow(self, node):
+        """
+        Returns the leaves in the subtree of a node, without computing any distance.
+        """
+        leaves = []
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if self.level[node] == float('-inf'):
+                leaves.append(node)
+            stack.extend(self.children(node).tolist())
+        return leaves
+
+def csr(lists):
+    """
+    Packs a list of integer lists into the offset and index arrays of the compressed sparse row format.
+    """
+    ptr = numpy.zeros(len(lists) + 1, dtype=numpy.int64)
+    ptr[1:] = numpy.cumsum([len(l) for l in lists])
+    idx = numpy.fromiter(itertools.chain.from_iterable(lists), dtype=numpy.int64, count=int(ptr[-1]))
+    return ptr, idx
+
+def writearrays(path, header, arrays):
+    """
+    Writes a header and named arrays in the binary format of saved trees.
+    The arrays are stored in C order and little-endian.
+
+    Parameters:
+    ----------
+    path : str
+        The path of the file.
+    header : dict
+        A dictionary that can be encoded in JSON.
+    arrays : dict
+        The arrays by name.
+    """
+    arrays = {name : numpy.ascontiguousarray(a, dtype=numpy.asarray(a).dtype.newbyteorder('<')) 
+              for name, a in arrays.items()}
+    table, offset = dict(), 0
+    for name, a in arrays.items():
+        table[name] = {'dtype' : a.dtype.str, 'shape' : list(a.shape), 'offset' : offset}
+        offset += -(-a.nbytes // ALIGN) * ALIGN
+    encoded = json.dumps(dict(header, version=VERSION, arrays=table)).encode()
+    start = len(MAGIC) + 8 + len(encoded)
+    with open(path, 'wb') as f:
+        f.write(MAGIC + struct.pack('<II', VERSION, len(encoded)) + encoded)
+        f.write(bytes(-start % ALIGN))
+        for a in arrays.values():
+            f.write(a.tobytes())
+            f.write(bytes(-a.nbytes % ALIGN))
+
+def readarrays(path, mmap=True):
+    """
+    Reads a file written by `writearrays`.
+
+    Parameters:
+    ----------
+    path : str
+        The path of the file.
+    mmap : bool
+        If True, the arrays are read-only views of one memory map of the file.
+
+    Returns:
+    -------
+    tuple
+        The header and the arrays by name.
+    """
+    with open(path, 'rb') as f:
+        prefix = f.read(len(MAGIC) + 8)
+        if len(prefix) < len(MAGIC) + 8 or prefix[:len(MAGIC)] != MAGIC:
+            raise ValueError("readarrays: " + str(path) + " is not a saved net-tree")
+        version, length = struct.unpack('<II', prefix[len(MAGIC):])
+        if version > VERSION:
+            raise ValueError("readarrays: unsupported format version " + str(version))
+        header = json.loads(f.read(length).decode())
+        start = len(MAGIC) + 8 + length
+        start += -start % ALIGN
+        buffer = numpy.memmap(f, dtype=numpy.uint8, mode='r') if mmap else None
+        arrays = dict()
+        for name, entry in header.pop('arrays').items():
+            dtype, shape = numpy.dtype(entry['dtype']), tuple(entry['shape'])
+            count = int(numpy.prod(shape))
+            if buffer is not None:
+                first = start + entry['offset']
+                a = buffer[first:first + count * dtype.itemsize].view(dtype)
+            else:
+                f.seek(start + entry['offset'])
+                a = numpy.fromfile(f, dtype=dtype, count=count)
+            arrays[name] = a.reshape(shape)
+    return header, arrays
@@ -4,6 +4,12 @@ Defines classes to deal with general metric spaces
 import math
 from abc import ABC, abstractmethod
 import functools
+import numpy
+from pointset import coordmatrix
+from distcache import makecache, pairkey
+
+# The number of coordinates accumulated at once by the early-exit predicates on NumPy coordinates
+BLOCK = 64
 
 class Metric(ABC):
     """
@@ -14,20 +20,39 @@ class Metric(ABC):
     ----------
     cachedist : bool
         Determines whether the computed distances should be stored in 
-        a dictionary to avoid recalculations
+        a cache to avoid recalculations
+    cachesize : int
+        The maximum number of cached distances. If cachesize==None, the cache is unbounded.
+    cachepolicy : str
+        The eviction policy of the cache, either 'lru' or 'clock'.
     """
-    def __init__(self, cachedist):
+    # Whether the concrete metric provides a NumPy kernel for one-to-many distances
+    vectorized = False
+
+    def __init__(self, cachedist, cachesize=None, cachepolicy='lru'):
         self.cachedist = cachedist
-        self.distdict = dict()
+        self.cache = makecache(cachepolicy, cachesize) if cachedist else None
         self.reset()
         
     def reset(self):
         """
         Resets the counter tracing the number of distance computations 
-        and clears the dictionary storing the computed distances
+        and clears the cache storing the computed distances together with its counters
         """
         self.counter = 0
-        self.distdict.clear()
+        if self.cache is not None: self.cache.clear()
+
+    @property
+    def hits(self):
+        return self.cache.hits if self.cache is not None else 0
+
+    @property
+    def misses(self):
+        return self.cache.misses if self.cache is not None else 0
+
+    @property
+    def evictions(self):
+        return self.cache.evictions if self.cache is not None else 0
         
     def dist(self, first, *others):
         """
@@ -45,7 +70,123 @@ class Metric(ABC):
             the minimum distance
         """
         if len(others) == 0: raise TypeError("Metric.dist: this method should have at least two arguments")
-        return min(map(functools.partial(self.getdist, first), others))
+        if len(others) == 1: return self.getdist(first, others[0])
+        return float(self.dists(first, others).min())
+
+    def dists(self, first, others):
+        """
+        Computes the distances of a point to a sequence of other points in one batch.
+        Every pair of distinct points is counted as one distance computation.
+        
+        Parameters
+        ----------
+        first : Point
+            the first point
+        others: list
+            a sequence of points, or a 2-D numpy.ndarray with the coordinates of one point per row
+            if the metric is vectorized and does not cache distances
+        
+        Returns:
+        -------
+        numpy.ndarray
+            the distances of `first` to the points in `others`, in the same order
+        """
+        if isinstance(others, numpy.ndarray):
+            if self.cachedist or not self.vectorized:
+                raise TypeError("Metric.dists: a coordinate matrix needs a vectorized metric without a cache")
+            return self.distances(*self.gather(first, others))
+        others = others if isinstance(others, list) else list(others)
+        if self.cachedist or not self.vectorized or len(others) == 0:
+            return numpy.array(list(map(functools.partial(self.getdist, first), others)), dtype=float)
+        return self.distances(*self.gather(first, others))
+
+    def distmatrix(self, firsts, others):
+        """
+        Computes the distances between two sequences of points in one batch.
+        Every pair of distinct points is counted as one distance computation.
+        
+        Parameters
+        ----------
+        firsts : list
+            a sequence of points
+        others: list
+            another sequence of points
+        
+        Returns:
+        -------
+        numpy.ndarray
+            a matrix whose entry (i, j) is the distance between `firsts[i]` and `others[j]`
+        """
+        firsts = firsts if isinstance(firsts, list) else list(firsts)
+        others = others if isinstance(others, list) else list(others)
+        if self.cachedist or not self.vectorized or len(firsts) == 0 or len(others) == 0:
+            return numpy.array([[self.getdist(first, other) for other in others] for first in firsts], 
+                               dtype=float).reshape(len(firsts), len(others))
+        rows, cols = coordmatrix(firsts), coordmatrix(others)
+        # The kernel runs along the longer side of the matrix
+        if len(rows) <= len(cols):
+            result = numpy.array([self.distances(coords, cols) for coords in rows])
+        else:
+            result = numpy.array([self.distances(coords, rows) for coords in cols]).T
+        # Only equal points are at distance 0
+        self.counter += int(numpy.count_nonzero(result))
+        return result
+
+    def withinmask(self, first, others, radius):
+        """
+        Determines in one batch which points of a sequence are within a radius of a given point.
+        Every pair of distinct points is counted as one distance computation.
+        
+        Parameters
+        ----------
+        first : Point
+            the first point
+        others: list
+            a sequence of points
+        radius : float
+            the radius around `first`
+        
+        Returns:
+        -------
+        numpy.ndarray
+            a boolean array which is True for the points of `others` within `radius` of `first`
+        """
+        others = others if isinstance(others, list) else list(others)
+        if self.cachedist or not self.vectorized or len(others) == 0:
+            return numpy.array([self.within(first, other, radius) for other in others], dtype=bool)
+        return self.arenear(*self.gather(first, others), radius)
+
+    def gather(self, first, others):
+        """
+        Collects the coordinates for a vectorized kernel and counts the distance computations.
+        Equal points are not counted, exactly as in `getdist`, and all kernels return 0 for them.
+        """
+        coords = numpy.asarray(first.coords, dtype=float)
+        matrix = others if isinstance(others, numpy.ndarray) else coordmatrix(others)
+        self.counter += int(numpy.count_nonzero((matrix != coords).any(axis=1)))
+        return coords, matrix
+
+    def argmin(self, first, others):
+        """
+        Finds the point of a sequence which is the closest to a given point.
+        Ties are broken in favor of the point appearing first in `others`.
+        
+        Parameters
+        ----------
+        first : Point
+            the first point
+        others: list
+            a non-empty sequence of points
+        
+        Returns:
+        -------
+        tuple
+            the index of the closest point in `others` and its distance to `first`
+        """
+        dsts = self.dists(first, others)
+        if len(dsts) == 0: raise ValueError("Metric.argmin: others should not be empty")
+        index = int(numpy.argmin(dsts))
+        return index, float(dsts[index])
     
     def getdist(self, first, second):
         """
@@ -63,15 +204,44 @@ class Metric(ABC):
         float
             the distance
         """
-        dist = self.distdict.get((id(first), id(second)), None) if self.cachedist else None
-        if not dist:
-            dist = 0
-            if first != second:
-                dist = self.distance(first, second)
-                self.counter += 1
-            if self.cachedist: 
-                self.distdict[(id(first), id(second))] = dist
+        if first == second:
+            return 0
+        if self.cache is None:
+            self.counter += 1
+            return self.distance(first, second)
+        key = pairkey(first, second)
+        dist = self.cache.get(key)
+        if dist is None:
+            dist = self.distance(first, second)
+            self.counter += 1
+            self.cache.put(key, dist)
         return dist        
+
+    def within(self, first, second, radius):
+        """
+        Determines whether the distance between two points is at most `radius`.
+        The concrete metrics stop accumulating coordinates as soon as the bound is exceeded,
+        which still counts as one distance computation.
+        
+        Parameters
+        ----------
+        first : Point
+            the first point
+        second: Point
+            the second point
+        radius : float
+            the bound on the distance
+            
+        Returns:
+        -------
+        bool
+        """
+        if self.cache is not None:
+            return self.getdist(first, second) <= radius
+        if first == second:
+            return radius >= 0
+        self.counter += 1
+        return self.isnear(first, second, radius)
     
     @abstractmethod
     def distance(self, first, second):
@@ -92,27 +262,107 @@ class Metric(ABC):
             The distance between the first and the second points
         """
         pass
+
+    def distances(self, coords, matrix):
+        """
+        Returns the distances between a coordinate vector and every row of a matrix.
+        To be implemented by the concrete metric subclasses that set `vectorized`.
+        
+        Parameters:
+        ----------
+        coords : numpy.ndarray
+            The coordinates of the first point.
+        matrix : numpy.ndarray
+            A 2-D array with the coordinates of one point per row.
+        
+        Returns:
+        -------
+        numpy.ndarray
+            The distances between `coords` and the rows of `matrix`
+        """
+        raise NotImplementedError("Metric.distances: " + type(self).__name__ + " has no vectorized kernel")
+
+    def isnear(self, first, second, radius):
+        """
+        Returns whether the distance between two points is at most `radius`.
+        Concrete metrics may override it to exit early.
+        """
+        return self.distance(first, second) <= radius
+
+    def arenear(self, coords, matrix, radius):
+        """
+        Returns a boolean array telling which rows of `matrix` are within `radius` of `coords`.
+        Concrete metrics may override it to avoid computing the exact distances.
+        """
+        return self.distances(coords, matrix) <= radius
     
     def __str__(self):
         return type(self).__name__
 
 class Euclidean(Metric):
-    def __init__(self, cachedist=False):
-        Metric.__init__(self, cachedist)
+    vectorized = True
+    def __init__(self, cachedist=False, cachesize=None, cachepolicy='lru'):
+        Metric.__init__(self, cachedist, cachesize, cachepolicy)
     def distance(self, first, second):
         return math.sqrt(sum((first[i] - second[i]) ** 2 for i in range(len(first.coords))))
+    def distances(self, coords, matrix):
+        diff = matrix - coords
+        return numpy.sqrt(numpy.einsum('ij,ij->i', diff, diff))
+    def isnear(self, first, second, radius):
+        # Squared distances are compared against the squared radius, so no square root is taken
+        bound, total = radius * radius, 0
+        if isinstance(first.coords, numpy.ndarray) or isinstance(second.coords, numpy.ndarray):
+            diff = numpy.asarray(first.coords, dtype=float) - numpy.asarray(second.coords, dtype=float)
+            for start in range(0, len(diff), BLOCK):
+                block = diff[start:start + BLOCK]
+                total += float(numpy.dot(block, block))
+                if total > bound: return False
+            return True
+        for a, b in zip(first.coords, second.coords):
+            total += (a - b) ** 2
+            if total > bound: return False
+        return True
+    def arenear(self, coords, matrix, radius):
+        diff = matrix - coords
+        return numpy.einsum('ij,ij->i', diff, diff) <= radius * radius
 
 
 class Manhattan(Metric):
-    def __init__(self, cachedist=False):
-        Metric.__init__(self, cachedist)
+    vectorized = True
+    def __init__(self, cachedist=False, cachesize=None, cachepolicy='lru'):
+        Metric.__init__(self, cachedist, cachesize, cachepolicy)
     def distance(self, first, second):
         return sum([abs(first[i] - second[i]) for i in range(len(first.coords))])
+    def distances(self, coords, matrix):
+        return numpy.abs(matrix - coords).sum(axis=1)
+    def isnear(self, first, second, radius):
+        if isinstance(first.coords, numpy.ndarray) or isinstance(second.coords, numpy.ndarray):
+            diff = numpy.abs(numpy.asarray(first.coords, dtype=float) - numpy.asarray(second.coords, dtype=float))
+            total = 0
+            for start in range(0, len(diff), BLOCK):
+                total += float(diff[start:start + BLOCK].sum())
+                if total > radius: return False
+            return True
+        total = 0
+        for a, b in zip(first.coords, second.coords):
+            total += abs(a - b)
+            if total > radius: return False
+        return True
 
         
 class LInfinity(Metric):
-    def __init__(self, cachedist=False):
-        Metric.__init__(self, cachedist) 
+    vectorized = True
+    def __init__(self, cachedist=False, cachesize=None, cachepolicy='lru'):
+        Metric.__init__(self, cachedist, cachesize, cachepolicy) 
     def distance(self, first, second):
         return max([abs(first[i] - second[i]) for i in range(len(first.coords))])
+    def distances(self, coords, matrix):
+        return numpy.abs(matrix - coords).max(axis=1)
+    def isnear(self, first, second, radius):
+        if isinstance(first.coords, numpy.ndarray) or isinstance(second.coords, numpy.ndarray):
+            diff = numpy.abs(numpy.asarray(first.coords, dtype=float) - numpy.asarray(second.coords, dtype=float))
+            return not (diff > radius).any()
+        for a, b in zip(first.coords, second.coords):
+            if abs(a - b) > radius: return False
+        return True
 
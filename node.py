@@ -5,9 +5,14 @@ Defines nodes that are the building blocks of net-trees
 from point import Point
 
 class Node:
+    # Nodes are created by the million during construction, so they carry no per-instance dict
+    __slots__ = ('point', 'level', 'par', 'rel', 'ch', 'hash')
+
     def __init__(self, point, level):
         self.point = point
         self.level = level
+        # The hash is computed once, since nodes are looked up in every rel, ch and cell operation
+        self.hash = hash((hash(point), level))
         self.par = None
         self.rel = {self}
         self.ch = set()
@@ -32,10 +37,12 @@ class Node:
         return str(self.point) + " at level " + str(self.level) + "\n" + "".join(str(c) for c in self.ch)
     
     def __eq__(self, other):
-        return self.point == other.point and self.level == other.level
+        # Different hashes settle almost every comparison without looking at the coordinates
+        return self is other or (self.hash == other.hash and self.level == other.level and 
+                                 (self.point is other.point or self.point == other.point))
     
     def __hash__(self):
-        return hash((tuple(self.point.coords), self.level))
+        return self.hash
 
 """
 Below are some static methods that allow us to treat the nodes as a metric
@@ -56,7 +63,11 @@ def par(nodes):
             {node.par for node in nodes if node.par is not None}
 
 def nearest(node, others):        
-    return min(others, key=lambda n:node.point.distto(n.point))
+    others = list(others)
+    return others[node.point.metric.argmin(node.point, [n.point for n in others])[0]]
 
 def dist(node, other):
     return node.point.distto(other if isinstance(other, Point) else other.point)
+
+def within(node, other, radius):
+    return node.point.metric.within(node.point, other if isinstance(other, Point) else other.point, radius)
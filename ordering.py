@@ -0,0 +1,175 @@
+"""
+Defines insertion orders for the construction of net-trees
+"""
+import random
+import warnings
+import numpy
+from pointset import coordmatrix
+
+def randomorder(points):
+    """
+    Returns a uniformly random permutation of the points, drawn from the `random` module.
+    """
+    perm = list(range(len(points)))
+    random.shuffle(perm)
+    return numpy.array(perm, dtype=numpy.int64)
+
+# The largest dimension for which a 64-bit key holds one bit of every coordinate
+MAXDIM = 63
+
+def gridcoords(points):
+    """
+    Snaps the coordinates of vector points to an integer grid of 2^bits cells per side
+    spanning their bounding cube. A cube, rather than a box, keeps cells square so the
+    curves preserve distances in every direction.
+
+    Parameters:
+    ----------
+    points : list
+        A list of points with coordinates of the same dimension d <= 63, since a key needs 
+        at least one bit of every coordinate. A ValueError is raised if d > 63.
+
+    Returns:
+    -------
+    tuple
+        An (n, d) uint64 array of cell coordinates and the number of bits per coordinate,
+        chosen so that d * bits <= 63.
+    """
+    coords = coordmatrix(points)
+    if coords.shape[1] > MAXDIM:
+        raise ValueError("gridcoords: the keys hold at most " + str(MAXDIM) + " coordinates, not " + str(coords.shape[1]))
+    bits = max(63 // coords.shape[1], 1) if coords.shape[1] > 0 else 1
+    bits = min(bits, 31)
+    low = coords.min(axis=0)
+    span = float((coords.max(axis=0) - low).max())
+    if span == 0: span = 1.
+    scaled = numpy.floor((coords - low) / span * ((1 << bits) - 1))
+    return scaled.astype(numpy.uint64), bits
+
+def interleave(cells, bits):
+    """
+    Interleaves the bits of the columns of `cells`, most significant bits first.
+    """
+    key = numpy.zeros(cells.shape[0], dtype=numpy.uint64)
+    one = numpy.uint64(1)
+    for b in range(bits - 1, -1, -1):
+        for j in range(cells.shape[1]):
+            key = (key << one) | ((cells[:, j] >> numpy.uint64(b)) & one)
+    return key
+
+def mortonkeys(points):
+    """
+    Returns the Morton (Z-order) keys of vector points and the number of bits per coordinate.
+    """
+    cells, bits = gridcoords(points)
+    return interleave(cells, bits), bits
+
+def hilbertkeys(points):
+    """
+    Returns the Hilbert keys of vector points and the number of bits per coordinate.
+    """
+    cells, bits = gridcoords(points)
+    return hilbert(cells, bits), bits
+
+def hilbert(X, bits):
+    """
+    Computes the Hilbert keys of grid cells. The cells are transformed in place with
+    Skilling's algorithm ("Programming the Hilbert curve", 2004), vectorized over the
+    cells, and the transposed keys are then interleaved.
+    """
+    d = X.shape[1]
+    M = numpy.uint64(1 << (bits - 1))
+    # Inverse undo
+    Q = M
+    while Q > 1:
+        P = Q - numpy.uint64(1)
+        for i in range(d):
+            mask = (X[:, i] & Q) != 0
+            X[mask, 0] ^= P
+            rest = ~mask
+            t = (X[rest, 0] ^ X[rest, i]) & P
+            X[rest, 0] ^= t
+            X[rest, i] ^= t
+        Q >>= numpy.uint64(1)
+    # Gray encode
+    for i in range(1, d):
+        X[:, i] ^= X[:, i - 1]
+    t = numpy.zeros(X.shape[0], dtype=numpy.uint64)
+    Q = M
+    while Q > 1:
+        t[(X[:, d - 1] & Q) != 0] ^= Q - numpy.uint64(1)
+        Q >>= numpy.uint64(1)
+    X ^= t[:, None]
+    return interleave(X, bits)
+
+def mortonorder(points):
+    """
+    Returns the permutation sorting vector points along the Morton (Z-order) curve.
+    """
+    return numpy.argsort(mortonkeys(points)[0], kind='stable')
+
+def hilbertorder(points):
+    """
+    Returns the permutation sorting vector points along the Hilbert curve, which unlike
+    the Morton curve never jumps between distant cells.
+    """
+    return numpy.argsort(hilbertkeys(points)[0], kind='stable')
+
+def greedyorder(points):
+    """
+    Returns an approximate greedy permutation of vector points without computing any distance.
+    A point gets level j if it is the first point along the Hilbert curve in its cell of the
+    grid with 2^j cells per side. Cells of every grid are contiguous along the curve, so
+    the level is read off the highest bit in which the key differs from the previous key.
+    Points are ordered by level and then along the curve, so every prefix of the order is a
+    net of the grid at the level of its last point, much like a prefix of a greedy permutation.
+    """
+    cells, bits = gridcoords(points)
+    d = cells.shape[1]
+    keys = hilbert(cells, bits)
+    perm = numpy.argsort(keys, kind='stable')
+    keys = keys[perm]
+    diff = keys[1:] ^ keys[:-1]
+    # The index of the highest set bit of each difference
+    high = numpy.zeros(diff.shape[0], dtype=numpy.int64)
+    for shift in [32, 16, 8, 4, 2, 1]:
+        mask = (diff >> numpy.uint64(shift)) != 0
+        high[mask] += shift
+        diff[mask] >>= numpy.uint64(shift)
+    levels = numpy.zeros(len(points), dtype=numpy.int64)
+    levels[1:] = numpy.where(diff != 0, bits - high // d, bits + 1)
+    return perm[numpy.argsort(levels, kind='stable')]
+
+ORDERS = {'random' : randomorder, 'morton' : mortonorder, 'hilbert' : hilbertorder, 'greedy' : greedyorder}
+
+def insertionorder(points, order):
+    """
+    Computes the order in which the points are inserted into a net-tree.
+
+    Parameters:
+    ----------
+    points : list
+        The list of points.
+    order : str or callable
+        Either one of 'random', 'morton', 'hilbert' and 'greedy', or a function that
+        takes the list of points and returns a permutation of their indices. The space
+        filling curves and 'greedy' need points with coordinates, and fall back to
+        'random' with a warning above `MAXDIM` dimensions.
+
+    Returns:
+    -------
+    list
+        A permutation of `range(len(points))`.
+    """
+    if isinstance(order, str):
+        if order not in ORDERS:
+            raise ValueError("insertionorder: unknown order " + repr(order))
+        if order != 'random' and len(points) > 0 and len(points[0].coords) > MAXDIM:
+            warnings.warn("insertionorder: the " + order + " order needs at most " + str(MAXDIM) + 
+                          " dimensions, so a random order is used", RuntimeWarning)
+            order = 'random'
+        order = ORDERS[order]
+    perm = [int(i) for i in order(points)]
+    if sorted(perm) != list(range(len(points))):
+        raise ValueError("insertionorder: the order is not a permutation of the points")
+    return perm
@@ -1,6 +1,18 @@
 """
 Declares a point in a metric space
 """
+# The next unused point id. Ids are unique across all registries and point sets.
+_nextpid = 0
+
+def newpids(count=1):
+    """
+    Reserves a block of consecutive point ids and returns the first one.
+    """
+    global _nextpid
+    first = _nextpid
+    _nextpid += count
+    return first
+
 class Point:
     """
     Defines a point in a metric space
@@ -11,10 +23,20 @@ class Point:
         The point coordinates.
     metric : Metric
         The metric used to measure points proximity.
+        
+    A point gets a stable integer id `pid` when it is registered in a `PointRegistry`, 
+    which happens when it enters an `SNT`. The registry interns coordinates, so two points
+    of the same registry are equal exactly when their ids are equal, and the hash of a 
+    registered point is frozen even if its coordinates are edited later.
     """
+    __slots__ = ('coords', 'metric', 'pid', 'registry', 'hashvalue')
+
     def __init__(self, coords, metric):
         self.coords = coords
         self.metric = metric
+        self.pid = None
+        self.registry = None
+        self.hashvalue = None
 
     def distto(self, *others):
         return self.metric.dist(self, *others)
@@ -26,16 +48,24 @@ class Point:
         return "(" + ", ".join(str(c) for c in self.coords) + ")"
     
     def __eq__(self, other):
+        if self is other: return True
+        if self.registry is not None and self.registry is other.registry:
+            return self.pid == other.pid
         return self.coords == other.coords
     
     def __hash__(self):
-        return hash(tuple(self.coords))
+        return self.hashvalue if self.hashvalue is not None else hash(tuple(self.coords))
     
     @staticmethod
     def importFrom(path, metric):
+        """
+        Reads a comma separated file with one point per line into points with list coordinates.
+        Blank lines are skipped. See `pointio.readcsv` for large files.
+        """
         points = []
         with open(path) as f:
             for line in f:
+                if not line.strip(): continue
                 points.append(Point([int(coord) if float(coord).is_integer() else float(coord) for coord in line.split(',')], metric))
         return points
     
@@ -46,3 +76,89 @@ class Point:
 
 def setMetric(metric, points):
     for pt in points: pt.metric = metric
+
+def pointkey(point):
+    """
+    Returns the id of a registered point, or the point itself otherwise, 
+    to be used as a dictionary key standing for its coordinates.
+    """
+    return point.pid if point.pid is not None else point
+
+class PointRegistry:
+    """
+    Gives points stable integer ids and interns duplicate coordinates: the first point
+    registered with some coordinates is the canonical point for all later duplicates.
+    """
+    def __init__(self):
+        # A dictionary from the hashes of coordinate tuples to canonical points, or to lists of 
+        # canonical points whose hashes collide. The tuples themselves are not kept, so the 
+        # coordinates stay where the points keep them, such as in a memory-mapped point set.
+        self.canonical = dict()
+        self.count = 0
+
+    def lookup(self, point, key):
+        """
+        Returns the canonical point with the coordinate tuple `key` of `point`, or None.
+        """
+        found = self.canonical.get(hash(key))
+        if found is None or isinstance(found, Point):
+            return found if found is not None and coordtuple(found) == key else None
+        return next((p for p in found if coordtuple(p) == key), None)
+
+    def intern(self, point):
+        """
+        Registers a point, unless a point with the same coordinates is already registered.
+        A point keeps the id it may have received from another registry or a point set.
+        
+        Parameters:
+        ----------
+        point : Point
+            The point to be registered.
+            
+        Returns:
+        -------
+        Point
+            The canonical point with the coordinates of `point`.
+        """
+        if point.registry is self: return point
+        key = coordtuple(point)
+        canonical = self.lookup(point, key)
+        if canonical is not None: return canonical
+        if point.pid is None: point.pid = newpids()
+        point.hashvalue = hash(key)
+        point.registry = self
+        found = self.canonical.get(point.hashvalue)
+        if found is None: self.canonical[point.hashvalue] = point
+        elif isinstance(found, Point): self.canonical[point.hashvalue] = [found, point]
+        else: found.append(point)
+        self.count += 1
+        return point
+
+    def remove(self, point):
+        """
+        Unregisters a canonical point, so later points with its coordinates are registered anew.
+        The point keeps its id.
+        """
+        if point.registry is not self: return
+        found = self.canonical.get(point.hashvalue)
+        if found is point:
+            del self.canonical[point.hashvalue]
+        elif isinstance(found, list) and any(p is point for p in found):
+            found = [p for p in found if p is not point]
+            self.canonical[point.hashvalue] = found[0] if len(found) == 1 else found
+        else:
+            return
+        point.registry = None
+        self.count -= 1
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, point):
+        return self.lookup(point, coordtuple(point)) is not None
+
+def coordtuple(point):
+    """
+    Returns the coordinates of a point as a tuple of Python numbers.
+    """
+    return tuple(point.coords.tolist()) if hasattr(point.coords, 'tolist') else tuple(point.coords)
@@ -0,0 +1,194 @@
+"""
+Reads and writes point sets as text, .npy and raw binary files
+"""
+import itertools
+import numpy
+from pointset import PointSet, coordmatrix
+
+# The default number of points in a chunk of a streaming reader
+CHUNKSIZE = 1 << 16
+
+def readcsv(path, metric, chunksize=CHUNKSIZE, delimiter=','):
+    """
+    Streams the points of a text file with one point per line and coordinates separated
+    by `delimiter`. Every chunk of lines is parsed by NumPy in one call.
+
+    Parameters:
+    ----------
+    path : str
+        The path of the file.
+    metric : Metric
+        The metric of the points.
+    chunksize : int
+        The number of lines in a chunk.
+    delimiter : str
+        The separator of the coordinates. Spaces around the coordinates are ignored.
+
+    Returns:
+    -------
+    generator
+        A PointSet for every chunk of lines, in the order of the file.
+    """
+    with open(path) as f:
+        while True:
+            lines = [line for line in itertools.islice(f, chunksize) if line.strip()]
+            if len(lines) == 0: return
+            yield PointSet(numpy.loadtxt(lines, delimiter=delimiter, dtype=float, ndmin=2), metric)
+
+def writecsv(path, points, chunksize=CHUNKSIZE, delimiter=','):
+    """
+    Writes points to a text file with one point per line. Coordinates are written as the
+    shortest decimals that are read back exactly.
+
+    Parameters:
+    ----------
+    path : str
+        The path of the file.
+    points : list or PointSet
+        The points, or an iterable of point sets such as the chunks of a reader.
+    chunksize : int
+        The number of points formatted at once.
+    delimiter : str
+        The separator of the coordinates.
+    """
+    with open(path, 'w') as f:
+        for coords in coordchunks(points, chunksize):
+            f.write(''.join(delimiter.join(map(repr, row)) + '\n' for row in coords.tolist()))
+
+def readnpy(path, metric, mmap=True):
+    """
+    Reads the points of a .npy file holding an (n, d) array.
+
+    Parameters:
+    ----------
+    path : str
+        The path of the file.
+    metric : Metric
+        The metric of the points.
+    mmap : bool
+        If True, the coordinates stay in the file and are mapped into memory read-only.
+        The set then does not deduplicate its rows, which would read the whole file.
+        Coordinates of float32 or float16 stay in their type, as in `PointSet`; other types 
+        are converted to float64 in memory, so they cannot stay in the file.
+
+    Returns:
+    -------
+    PointSet
+    """
+    return PointSet(numpy.load(path, mmap_mode='r' if mmap else None), metric, dedup=not mmap)
+
+def writenpy(path, points, chunksize=CHUNKSIZE):
+    """
+    Writes points to a .npy file as an (n, d) float array, one chunk at a time.
+    """
+    if isinstance(points, PointSet):
+        numpy.save(path, points.coords)
+        return
+    chunks = list(coordchunks(points, chunksize))
+    dim = chunks[0].shape[1] if chunks else 0
+    out = numpy.lib.format.open_memmap(path, mode='w+', dtype=float, shape=(sum(len(c) for c in chunks), dim))
+    start = 0
+    for coords in chunks:
+        out[start:start + len(coords)] = coords
+        start += len(coords)
+    out.flush()
+    del out
+
+def readraw(path, metric, dim, dtype=float, mmap=True):
+    """
+    Reads the points of a raw binary file holding the coordinates in row-major order.
+
+    Parameters:
+    ----------
+    path : str
+        The path of the file.
+    metric : Metric
+        The metric of the points.
+    dim : int
+        The number of coordinates of each point.
+    dtype : numpy.dtype
+        The type of the stored coordinates. Coordinates of other types than float64, float32 
+        and float16 are converted in memory, so they cannot stay in the file.
+    mmap : bool
+        If True and `dtype` is a float type, the coordinates stay in the file and are mapped into memory read-only.
+        The set then does not deduplicate its rows, which would read the whole file.
+
+    Returns:
+    -------
+    PointSet
+    """
+    coords = numpy.memmap(path, dtype=dtype, mode='r') if mmap else numpy.fromfile(path, dtype=dtype)
+    if coords.shape[0] % dim != 0:
+        raise ValueError("readraw: the size of " + str(path) + " is not a multiple of the dimension")
+    return PointSet(coords.reshape(-1, dim), metric, dedup=not mmap)
+
+def writeraw(path, points, dtype=float, chunksize=CHUNKSIZE):
+    """
+    Writes the coordinates of points to a raw binary file in row-major order.
+    """
+    with open(path, 'wb') as f:
+        for coords in coordchunks(points, chunksize):
+            f.write(numpy.ascontiguousarray(coords, dtype=dtype).tobytes())
+
+def readpoints(path, metric, **options):
+    """
+    Reads a whole file of points, choosing the reader by the extension of `path`: '.npy' files
+    are read by `readnpy`, '.csv' and '.txt' files by `readcsv` and any other file by `readraw`,
+    which needs the `dim` option.
+
+    Returns:
+    -------
+    PointSet
+    """
+    if str(path).endswith('.npy'):
+        return readnpy(path, metric, **options)
+    if str(path).endswith('.csv') or str(path).endswith('.txt'):
+        return aspoints(readcsv(path, metric, **options))
+    return readraw(path, metric, **options)
+
+def chunks(points, chunksize=CHUNKSIZE):
+    """
+    Splits a point set into point sets of at most `chunksize` points sharing its coordinates.
+    """
+    for start in range(0, len(points), chunksize):
+        yield PointSet(points.coords[start:start + chunksize], points.metric, points.dedup)
+
+def coordchunks(points, chunksize=CHUNKSIZE):
+    """
+    Yields the coordinates of points as 2-D arrays of at most `chunksize` rows.
+    The points are a point set, a list of points or an iterable of point sets.
+    """
+    if isinstance(points, PointSet):
+        for start in range(0, len(points), chunksize):
+            yield points.coords[start:start + chunksize]
+        return
+    points = iter(points)
+    while True:
+        block = list(itertools.islice(points, chunksize))
+        if len(block) == 0: return
+        if isinstance(block[0], PointSet):
+            for pointset in block:
+                yield from coordchunks(pointset, chunksize)
+        else:
+            yield coordmatrix(block)
+
+def aspoints(points):
+    """
+    Turns the chunks of a streaming reader into one point set, so that they can be passed
+    wherever a list of points is expected. Other sequences of points are returned as they are.
+
+    Parameters:
+    ----------
+    points : iterable
+        A sequence of points, a point set, or an iterable of point sets.
+
+    Returns:
+    -------
+    list or PointSet
+    """
+    if isinstance(points, PointSet): return points
+    if not isinstance(points, (list, tuple)): points = list(points)
+    if len(points) > 0 and all(isinstance(p, PointSet) for p in points):
+        if len(points) == 1: return points[0]
+        return PointSet(numpy.concatenate([p.coords for p in points]), points[0].metric)
+    return points
@@ -3,7 +3,8 @@ A base class for different point location algorithms
 """
 from abc import ABC, abstractmethod
 from node import dist, ch, rel
-import functools
+from pointset import PointSet
+import numpy
 
 class PointLocation(ABC):
     def __init__(self, tree):
@@ -37,6 +38,24 @@ class PointLocation(ABC):
     def updateonsplit(self, node):
         pass
     
+    def addpoints(self, points):
+        """
+        Registers new uninserted points, for the algorithms that keep track of them.
+        """
+        pass
+    
+    def defer(self):
+        """
+        Starts holding back the cell updates of new nodes, for the algorithms that keep cells.
+        """
+        pass
+    
+    def flush(self):
+        """
+        Applies the cell updates held back since `defer` and stops holding them back.
+        """
+        pass
+    
 class ParallelPointLocation(PointLocation):
     def __init__(self, tree, points):
         PointLocation.__init__(self, tree)
@@ -48,12 +67,159 @@ class ParallelPointLocation(PointLocation):
         return self.nnhelper(point, {child}, child.level) or self.tree.root
     
     def nnhelper(self, point, currentnodes, level):
-        if point.distto(*[n.point for n in currentnodes]) > self.tree.cr * self.tree.tau ** level:    
+        # One kernel call per level handles all current nodes and another one all their children
+        currentnodes = list(currentnodes)
+        dsts = point.metric.dists(point, [n.point for n in currentnodes])
+        if dsts.min() > self.tree.cr * self.tree.tau ** level:    
             return None
+        children = list(ch(currentnodes))
+        near = point.metric.withinmask(point, [n.point for n in children], self.tree.cr * self.tree.tau ** level)
         nextnodes = {n if n.level == level - 1 else n.par 
-                     for n in ch(currentnodes) if dist(n, point) <= self.tree.cr * self.tree.tau ** level}
+                     for n, isnear in zip(children, near) if isnear}
         nn = self.nnhelper(point, nextnodes, level - 1)
-        return nn if nn else min(currentnodes, key = lambda n : point.distto(n.point))
+        return nn if nn else currentnodes[int(numpy.argmin(dsts))]
+    
+    def nnmany(self, points):
+        """
+        Finds the centers of many points with the descent of `nn`. The points go down in groups 
+        that share the same current nodes, so each node computes its distances to a whole group 
+        in one batch, and the distances of the children are reused at the next level.
+        
+        Parameters:
+        ----------
+        points : list
+            The points to be located.
+            
+        Returns:
+        -------
+        list
+            A pair (center, distance) for every point, in the order of `points`.
+        """
+        if len(points) == 0: return []
+        root = self.tree.root
+        child = root.getchild()
+        metric = child.point.metric
+        # The coordinates of the points are gathered once and every group is a set of views on them
+        points = list(PointSet.frompoints(points, metric))
+        dsts = metric.dists(child.point, points)
+        if child.level == float('-inf'):
+            return [(root, d) for d in dsts.tolist()]
+        result = [None] * len(points)
+        # Every point keeps the best node of the previous level, in case no node is close enough at this level
+        stack = [(numpy.arange(len(points)), [child], dsts[numpy.newaxis, :], child.level, [root] * len(points), dsts)]
+        while stack:
+            indices, nodes, dsts, level, fallback, fallbackdsts = stack.pop()
+            # Groups shrink as they go down, and a group of one point is done without the grouping
+            if len(indices) == 1:
+                result[indices[0]] = self.nnsingle(points[indices[0]], nodes, dsts[:, 0], level, fallback[0], float(fallbackdsts[0]))
+                continue
+            radius = self.tree.cr * self.tree.tau ** level
+            best = dsts.argmin(axis=0)
+            bestdist = dsts[best, numpy.arange(len(indices))]
+            for j in numpy.flatnonzero(bestdist > radius):
+                result[indices[j]] = (fallback[j], float(fallbackdsts[j]))
+            near = numpy.flatnonzero(bestdist <= radius)
+            if len(near) == 0: continue
+            centers = [nodes[best[j]] for j in near]
+            group = [points[indices[j]] for j in near]
+            children = list(ch(nodes))
+            childdsts = self.childdists(nodes, dsts[:, near], children, group, radius)
+            mask = childdsts <= radius
+            # Only the children near some point matter. A child below a jump stands for the jump 
+            # at the next level and has the same point, so it takes the place of its parent.
+            rows = numpy.flatnonzero(mask.any(axis=1))
+            reps = [c if c.level == level - 1 else c.par for c in map(children.__getitem__, rows.tolist())]
+            nextnodes = list(dict.fromkeys(reps))
+            slot = {n : k for k, n in enumerate(nextnodes)}
+            slots = numpy.array([slot[n] for n in reps], dtype=numpy.int64)
+            # The rows of the first child standing for each next node
+            firstrows = numpy.empty(len(nextnodes), dtype=numpy.int64)
+            firstrows[slots[::-1]] = rows[::-1]
+            # The points near the same children form the next groups
+            groups = dict()
+            for j, key in enumerate(numpy.packbits(mask[rows], axis=0).T):
+                groups.setdefault(key.tobytes(), []).append(j)
+            for members in groups.values():
+                selected = numpy.unique(slots[mask[rows, members[0]]])
+                stack.append((indices[near[members]], [nextnodes[k] for k in selected], 
+                              childdsts[firstrows[selected]][:, members], 
+                              level - 1, [centers[j] for j in members], bestdist[near[members]]))
+        return result
+
+    def childdists(self, nodes, dsts, children, group, radius):
+        """
+        Computes the distances between the children of some nodes and a group of points, as far 
+        as they may be within `radius`. A child with the point of its parent has the distances of 
+        its parent. For other children, one distance to their parent, shared by the whole group, 
+        bounds the distances to the points by the triangle inequality, and only the pairs that 
+        may be within `radius` are measured. The other entries are infinite.
+        
+        Parameters:
+        ----------
+        nodes : list
+            The current nodes.
+        dsts : numpy.ndarray
+            The distances between `nodes` (rows) and the points of `group` (columns).
+        children : list
+            The children of `nodes`.
+        group : list
+            The points.
+        radius : float
+            The radius of the search.
+        
+        Returns:
+        -------
+        numpy.ndarray
+            A matrix with a row for each child and a column for each point.
+        """
+        row = {n : i for i, n in enumerate(nodes)}
+        result = numpy.full((len(children), len(group)), numpy.inf)
+        others = []
+        for i, c in enumerate(children):
+            if c.point is c.par.point:
+                result[i] = dsts[row[c.par]]
+            else:
+                others.append(i)
+        if len(others) == 0: return result
+        metric = children[others[0]].point.metric
+        # The distance of every other child to its parent, computed in one batch per parent
+        byparent = dict()
+        for i in others: byparent.setdefault(children[i].par, []).append(i)
+        gaps = numpy.empty(len(children))
+        for parent, rows in byparent.items():
+            gaps[rows] = metric.dists(parent.point, [children[i].point for i in rows])
+        parents = numpy.array([row[children[i].par] for i in others], dtype=numpy.int64)
+        # A lower bound on each distance, less a margin for rounding
+        lower = numpy.abs(dsts[parents] - gaps[others][:, numpy.newaxis]) * (1 - 1e-9)
+        candidates = lower <= radius
+        for k, i in enumerate(others):
+            columns = numpy.flatnonzero(candidates[k])
+            if len(columns) > 0:
+                result[i, columns] = metric.dists(children[i].point, [group[j] for j in columns.tolist()])
+        return result
+
+    def nnsingle(self, point, nodes, dsts, level, fallback, fallbackdist):
+        """
+        Finishes the descent of `nnmany` for a group of one point. It is the descent of `nnhelper`, 
+        reusing the known distances of the point to the current nodes.
+        
+        Returns:
+        -------
+        tuple
+            The center of the point and its distance to the point.
+        """
+        while True:
+            best = int(numpy.argmin(dsts))
+            radius = self.tree.cr * self.tree.tau ** level
+            if dsts[best] > radius: return fallback, fallbackdist
+            fallback, fallbackdist = nodes[best], float(dsts[best])
+            children = list(ch(nodes))
+            childdsts = point.metric.dists(point, [c.point for c in children])
+            # The distance of a jump is the distance of its child, which has the same point
+            nextnodes = dict()
+            for c, d in zip(children, childdsts.tolist()):
+                if d <= radius: nextnodes.setdefault(c if c.level == level - 1 else c.par, d)
+            nodes, dsts, level = list(nextnodes), numpy.array(list(nextnodes.values())), level - 1
     
     def nndist(self, point, nn = None):
         return dist(nn or self.nn(point), point)
@@ -85,17 +251,23 @@ class SinglePathPointLocation(PointLocation):
 #                 newdist = dist(n,point)
 #                 if newdist < closestdist and newdist <= self.tree.cr * self.tree.tau ** n.level:
 #                     nextnode, closestdist = n, newdist
-        while dist(nextnode, point) <= self.tree.cr * self.tree.tau ** nextnode.level:
+        nextdist = dist(nextnode, point)
+        while nextdist <= self.tree.cr * self.tree.tau ** nextnode.level:
             currentnode = nextnode
-            allnodes = ch(rel(currentnode))
+            allnodes = list(ch(rel(currentnode)))
             nextlevel = max(n.level for n in allnodes)
-            nextnode = min(allnodes, 
-                           key = functools.partial(self.mincoveringdist, point = point, level = nextlevel))
+            nextnode, nextdist = self.mincoveringdist(allnodes, point, nextlevel)
         return currentnode
     
-    def mincoveringdist(self, node, point, level):
-        dst = dist(node, point)
-        return dst if dst <= self.tree.cr * self.tree.tau ** level else float('inf')
+    def mincoveringdist(self, nodes, point, level):
+        """
+        Returns the node closest to `point` among the `nodes` within c_r\tau**level of it, 
+        together with its distance. If no node is that close, the first node is returned.
+        """
+        dsts = point.metric.dists(point, [n.point for n in nodes])
+        covering = numpy.where(dsts <= self.tree.cr * self.tree.tau ** level, dsts, float('inf'))
+        index = int(numpy.argmin(covering))
+        return nodes[index], dsts[index]
     
     def nndist(self, point, nn = None):
         return dist(nn or self.nn(point), point)
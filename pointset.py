@@ -0,0 +1,164 @@
+"""
+Stores a collection of points in one contiguous array of coordinates
+"""
+import numpy
+from point import Point, newpids
+
+class PointSet:
+    """
+    Keeps the coordinates of many points in a single contiguous 2-D float array.
+    Coordinates of float32 or float16 keep their type, so a set mapped from a file stays 
+    in the file; they are converted to float64 one batch at a time, by `rows` and the views.
+    The points themselves are handed out as lightweight views that only know
+    their set and their index, so they can be passed to `SNT.construct`, `Node`
+    and the point location classes in place of regular points.
+
+    Parameters:
+    ----------
+    coords : array_like
+        Either an (n, d) array or a sequence of n coordinate sequences of length d.
+    metric : Metric
+        The metric used to measure points proximity.
+    dedup : bool
+        If True, duplicate rows share one id, which sorts all coordinates on first use.
+        A set mapped from a file larger than the memory should pass False; its rows then
+        have distinct ids and views of the set compare their coordinates instead.
+    """
+    def __init__(self, coords, metric, dedup=True):
+        coords = numpy.asarray(coords)
+        keep = coords.dtype.kind == 'f' and coords.dtype.itemsize <= 8 and coords.dtype.isnative
+        self.coords = numpy.ascontiguousarray(coords, dtype=coords.dtype if keep else float)
+        if self.coords.ndim != 2:
+            raise ValueError("PointSet: the coordinates should form a 2-D array")
+        self.metric = metric
+        self.dedup = dedup
+        self.pids = None
+
+    @staticmethod
+    def frompoints(points, metric=None):
+        """
+        Creates a point set holding the coordinates of the given points.
+
+        Parameters:
+        ----------
+        points : list
+            A non-empty list of points of the same dimension.
+        metric : Metric
+            The metric of the new set. If metric==None, the metric of the first point is used.
+
+        Returns:
+        -------
+        PointSet
+        """
+        points = list(points)
+        return PointSet([list(p.coords) for p in points], metric or points[0].metric)
+
+    def pointids(self):
+        """
+        Returns the stable integer ids of the rows, computed on first use. 
+        If the set deduplicates, duplicate rows are interned and share the id of their first occurrence.
+
+        Returns:
+        -------
+        numpy.ndarray
+        """
+        if self.pids is None:
+            self.pids = numpy.arange(len(self), dtype=numpy.int64)
+            if self.dedup and len(self) > 0:
+                _, first, inverse = numpy.unique(self.coords, axis=0, return_index=True, return_inverse=True)
+                self.pids = first[inverse.ravel()].astype(numpy.int64)
+            self.pids += newpids(len(self))
+        return self.pids
+
+    def rows(self, indices):
+        """
+        Returns the coordinates of some rows as a new float64 array.
+
+        Parameters:
+        ----------
+        indices : array_like
+            The indices of the rows.
+
+        Returns:
+        -------
+        numpy.ndarray
+        """
+        return self.coords[indices].astype(float, copy=False)
+
+    @property
+    def dim(self):
+        return self.coords.shape[1]
+
+    def __len__(self):
+        return self.coords.shape[0]
+
+    def __getitem__(self, index):
+        if index < 0: index += len(self)
+        if not 0 <= index < len(self): raise IndexError("PointSet: index out of range")
+        return PointView(self, index)
+
+    def __iter__(self):
+        return (PointView(self, i) for i in range(len(self)))
+
+class PointView(Point):
+    """
+    A point whose coordinates are the row `index` of `pointset.coords`.
+
+    Parameters:
+    ----------
+    pointset : PointSet
+        The set holding the coordinates.
+    index : int
+        The row of the point in the set.
+        
+    A view is registered in its point set, which gives it the id of its row.
+    """
+    __slots__ = ('pointset', 'index')
+
+    def __init__(self, pointset, index):
+        self.pointset = pointset
+        self.index = index
+        self.metric = pointset.metric
+        self.pid = int(pointset.pointids()[index])
+        self.registry = pointset
+        self.hashvalue = None
+
+    @property
+    def coords(self):
+        return self.pointset.coords[self.index].astype(float, copy=False)
+
+    def __getitem__(self, index):
+        return float(self.pointset.coords[self.index, index])
+
+    def __eq__(self, other):
+        if self is other: return True
+        if self.registry is other.registry:
+            # Rows of a set that does not deduplicate may repeat coordinates under other ids
+            if self.pid == other.pid or self.registry is not self.pointset or self.pointset.dedup:
+                return self.pid == other.pid
+        return numpy.array_equal(self.coords, other.coords)
+
+    def __hash__(self):
+        if self.hashvalue is None:
+            self.hashvalue = hash(tuple(self.coords.tolist()))
+        return self.hashvalue
+
+def coordmatrix(points):
+    """
+    Gathers the coordinates of a sequence of points into one 2-D float array.
+    Views of the same point set are gathered with a single fancy-indexing operation.
+
+    Parameters:
+    ----------
+    points : list
+        A list of points of the same dimension.
+
+    Returns:
+    -------
+    numpy.ndarray
+        An array whose i-th row holds the coordinates of `points[i]`.
+    """
+    pointset = getattr(points[0], 'pointset', None) if len(points) > 0 else None
+    if pointset is not None and all(getattr(p, 'pointset', None) is pointset for p in points):
+        return pointset.rows([p.index for p in points])
+    return numpy.array([p.coords for p in points], dtype=float)
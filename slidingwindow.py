@@ -0,0 +1,132 @@
+"""
+Defines a net-tree over the most recent points of a stream
+"""
+import time
+from collections import deque
+from snt import SNT
+from pointlocation import ParallelPointLocation
+
+class SlidingWindowSNT:
+    """
+    Maintains a semi-compressed net-tree over a window of the latest points of a stream.
+    Arriving points go through `SNT.insert` and expired points through `SNT.delete`, so the
+    tree is never rebuilt. Every insertion deletes at most `budget` expired points, which
+    spreads the expiry over the stream, and a query first deletes all points that have expired.
+
+    Parameters:
+    ----------
+    tau, cp, cc, cr : float
+        The constants of the tree.
+    size : int
+        The maximum number of points in the window. If size==None, the number of points is not bounded.
+    duration : float
+        The number of seconds a point stays in the window. If duration==None, points do not expire by age.
+    budget : int
+        The maximum number of expired points deleted by one insertion.
+    pointlocation : PointLocation
+        A point location class that finds the centers of new points by searching the tree.
+    """
+    def __init__(self, tau, cp, cc, cr=None, size=None, duration=None, budget=2, pointlocation=ParallelPointLocation):
+        if size is None and duration is None:
+            raise ValueError("SlidingWindowSNT: either size or duration should be given")
+        if budget < 1:
+            raise ValueError("SlidingWindowSNT: the budget should be a positive integer")
+        self.tree = SNT(tau, cp, cc, cr)
+        self.size = size
+        self.duration = duration
+        self.budget = budget
+        self.pointlocation = pointlocation
+        # The points of the window as triples (arrival time, point, payload id), oldest first
+        self.window = deque()
+
+    def insert(self, point, now=None):
+        """
+        Inserts an arriving point and deletes some of the expired ones.
+
+        Parameters:
+        ----------
+        point : Point
+            The arriving point.
+        now : float
+            The arrival time. If now==None, the current time is used.
+
+        Returns:
+        -------
+        int
+            The payload id of the point in the tree.
+        """
+        now = time.monotonic() if now is None else now
+        if self.tree.root is None:
+            self.tree.setroot(point)
+            self.tree.ploc = self.pointlocation(self.tree, [])
+            self.tree.ploc.addnode(self.tree.root.getchild())
+        else:
+            self.tree.insert(point)
+        point = self.tree.registry.intern(point)
+        payload = self.tree.payloads[point.pid][-1]
+        self.window.append((now, point, payload))
+        self.expire(now, self.budget)
+        return payload
+
+    def expire(self, now=None, budget=None):
+        """
+        Deletes the points that are out of the window, oldest first. The window never keeps
+        more than `size` points, whatever the budget.
+
+        Parameters:
+        ----------
+        now : float
+            The current time. If now==None, the current time is used.
+        budget : int
+            The maximum number of points deleted because of their age. If budget==None, all
+            expired points are deleted.
+        """
+        now = time.monotonic() if now is None else now
+        while self.size is not None and len(self.window) > self.size:
+            self.evict()
+        while self.window and self.isexpired(self.window[0], now) and budget != 0:
+            self.evict()
+            if budget is not None: budget -= 1
+
+    def isexpired(self, entry, now):
+        return self.duration is not None and now - entry[0] > self.duration
+
+    def evict(self):
+        _, point, payload = self.window.popleft()
+        self.tree.delete(point, payload)
+
+    def __len__(self):
+        return len(self.window)
+
+    def nn(self, point, now=None):
+        """
+        Finds the nearest point of the window to a query point.
+
+        Returns:
+        -------
+        tuple
+            The nearest point and its distance to `point`, or None if the window is empty.
+        """
+        result = self.knn(point, 1, now)
+        return result[0] if result else None
+
+    def knn(self, point, k, now=None):
+        """
+        Finds the k nearest points of the window to a query point, as `SNT.knn`.
+        """
+        self.expire(now)
+        return self.tree.knn(point, k)
+
+    def range(self, point, r, now=None):
+        """
+        Finds the points of the window within a given distance of a query point, as `SNT.range`.
+        """
+        self.expire(now)
+        return self.tree.range(point, r)
+
+    def ann(self, point, eps, now=None):
+        """
+        Finds a (1+eps)-approximate nearest point of the window to a query point, as `SNT.ann`.
+        """
+        self.expire(now)
+        return self.tree.ann(point, eps) if self.tree.root is not None else None
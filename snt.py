@@ -1,5 +1,18 @@
+import os
 import math
-from node import Node, dist, rel, par, ch, nearest
+import heapq
+import random
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import numpy
+from node import Node, dist, within, rel, par, ch, nearest
+from snt_pointlocation import SNTPointLocation
+from pointlocation import ParallelPointLocation
+from frozensnt import FrozenSNT, writearrays, readarrays, csr
+from point import PointRegistry, pointkey, coordtuple
+from ordering import insertionorder
+from pointset import PointSet
+from pointio import aspoints
 
 class SNT:
     """
@@ -22,6 +35,20 @@ class SNT:
         self.cc = cc
         self.cr = cr or (2 * cc * tau) / (tau - 4)
         self.root = None
+        # Gives the points of the tree their ids and interns duplicate coordinates
+        self.registry = PointRegistry()
+        # Duplicates share one set of nodes: a dictionary from the id of each distinct point 
+        # to the payload ids of its copies, and the number of payload ids given so far
+        self.payloads = dict()
+        self.records = 0
+        # A dictionary from the points of the tree to their leaves, to find the nodes of a deleted point
+        self.leaves = dict()
+        # The distinct points of the tree in the order of their insertion, until some are deleted
+        self.points = []
+        # The position of each point in `self.points` by id, known for the first `positioned` positions,
+        # so a deleted point leaves the list in constant time
+        self.position = dict()
+        self.positioned = 0
 
     def setroot(self, point):
         """
@@ -32,32 +59,418 @@ class SNT:
         point : Point
             The first point to be inserted in the net-tree.
         """
+        point = self.registry.intern(point)
+        self.payloads = {point.pid : [0]}
+        self.records = 1
+        self.leaves = dict()
+        self.points = [point]
+        self.position = dict()
+        self.positioned = 0
         self.root = Node(point, float('inf'))
         self.splitbelow(self.root, float('-inf'))
 
-    def construct(self, points, pointlocation):
+    def construct(self, points, pointlocation, queries=None, order=None):
         """
         Constructs a net-tree from a given sequence of points based an a point location algorithm.
         
         Parameters:
         ----------
         points : list
-            The list of points.
+            The list of points, or the chunks of a reader of `pointio`. Copies of a point are 
+            inserted once and the payload id of every copy is its index in `points`.
         pointlocation : PointLocation    
             The point location class to be used to find the center of a point.
+        queries : list
+            Query points whose nearest input points are computed offline. The queries are 
+            registered in the point location structure like uninserted points, so with 
+            `SNTPointLocation` their centers are maintained by the cell updates of the build,
+            but they are never inserted. The final center of a query is close to its nearest 
+            point but not always the nearest, so after the build `knnaround` searches around 
+            the center, starting from the distance kept in the cell.
+        order : str or callable
+            The insertion order, as in `ordering.insertionorder`. If order==None, the last 
+            point becomes the root and the others are inserted in the given order. Otherwise 
+            the first point of the order becomes the root. Payload ids remain indices in `points`.
+            
+        Returns:
+        -------
+        list
+            If queries are given, a pair (point, distance) with the nearest input point of 
+            each query, in the order of `queries`. Otherwise None.
         """
-        self.points=[points[-1]]
-        points = list(points)
-        self.setroot(points.pop())
-        self.ploc = pointlocation(self, points)
+        records = [self.registry.intern(p) for p in aspoints(points)]
+        queries = None if queries is None else aspoints(queries)
+        if order is None:
+            sequence, root = records, records[-1]
+        else:
+            sequence = [records[i] for i in insertionorder(records, order)]
+            root = sequence[0]
+        # Interned copies are the same object, so only the distinct points are inserted
+        points = list(dict.fromkeys(sequence))
+        # Queries that coincide with an input point are answered directly and others are registered once
+        inputs = set(points)
+        pending = [] if queries is None else list(dict.fromkeys(q for q in queries if q not in inputs))
+        points.remove(root)
+        self.setroot(root)
+        self.ploc = pointlocation(self, points + pending)
         self.ploc.addnode(self.root.getchild())
         for p in points:
-            self.points.append(p)
             self.insert(p)
+        self.payloads = dict()
+        for i, p in enumerate(records):
+            self.payloads.setdefault(p.pid, []).append(i)
+        self.records = len(records)
+        if queries is None: return None
+        nearest = {p : (p, 0) for p in self.points}
+        for q in pending:
+            center = self.ploc.nn(q)
+            nearest[q] = self.knnaround(q, 1, center, self.ploc.nndist(q, center))[0]
+            self.ploc.removepoint(q)
+        return [nearest[q] for q in queries]
+
+    def construct_greedy(self, points):
+        """
+        Constructs a net-tree by inserting the points in greedy (farthest-first) order, and returns 
+        this order. The distance of every uninserted point to its center in `SNTPointLocation` is 
+        an upper bound on its distance to the inserted points, so the points are kept in a lazy 
+        max-heap of these bounds. The top point is inserted once its bound is certified exact 
+        for the current tree by `knnaround`, and otherwise it goes back with the exact value.
+        
+        Parameters:
+        ----------
+        points : list
+            The list of points. The first point starts the permutation.
+            
+        Returns:
+        -------
+        tuple
+            The points in greedy order, the index in this order of the nearest earlier point of each 
+            point (the predecessor), and the distance to it (the insertion radius). The first point 
+            has predecessor -1 and radius infinity.
+        """
+        records = [self.registry.intern(p) for p in aspoints(points)]
+        points = list(dict.fromkeys(records))
+        first = points[0]
+        self.setroot(first)
+        self.ploc = SNTPointLocation(self, points[1:])
+        self.ploc.addnode(self.root.getchild())
+        index = {first : 0}
+        preds, radii = [-1], [float('inf')]
+        tiebreak = itertools.count()
+        # Entries (-bound, tiebreak, point, nearest point, number of inserted points when the bound was exact)
+        heap = [(-d, next(tiebreak), p, first, 1) for p, d in zip(points[1:], first.metric.dists(first, points[1:]).tolist())]
+        heapq.heapify(heap)
+        while heap:
+            negbound, _, p, closest, stamp = heapq.heappop(heap)
+            if stamp != len(self.points):
+                center = self.ploc.nn(p)
+                closest, dst = self.knnaround(p, 1, center, self.ploc.nndist(p, center))[0]
+                heapq.heappush(heap, (-dst, next(tiebreak), p, closest, len(self.points)))
+                continue
+            index[p] = len(self.points)
+            preds.append(index[closest])
+            radii.append(-negbound)
+            self.insert(p)
+        self.payloads = dict()
+        for i, p in enumerate(records):
+            self.payloads.setdefault(p.pid, []).append(i)
+        self.records = len(records)
+        return list(self.points), preds, radii
 
-    def insert(self, point, closest=None):
+    def construct_from_greedy(self, points, preds, radii):
         """
-        Insertes a point into the net-tree.
+        Constructs a net-tree from points in greedy order without any point location. The center 
+        of each point is the lowest node of its predecessor reaching its insertion level, and 
+        its distance to the center is its insertion radius, so no distance is computed to locate it.
+        
+        Parameters:
+        ----------
+        points : list
+            The points in greedy order.
+        preds : list
+            The index in `points` of the nearest earlier point of each point, with any value for the first one.
+        radii : list
+            The distance of each point to its predecessor, with any value for the first one.
+        """
+        if hasattr(self, 'ploc'): del self.ploc
+        records = [self.registry.intern(p) for p in points]
+        self.setroot(records[0])
+        for i in range(1, len(records)):
+            p, pred, radius = records[i], records[preds[i]], radii[i]
+            if p.pid in self.payloads:
+                self.insert(p)
+                continue
+            level = self.minlevelrelatives(None, None, radius)
+            if radius <= self.cp * self.tau ** level: 
+                level -= 1
+            closest = self.leaves[pointkey(pred)]
+            while closest.level < level:
+                closest = closest.par
+            if closest.point is not pred:
+                raise ValueError("SNT.construct_from_greedy: the points are not in greedy order")
+            self.insert(p, closest, radius)
+        # Later insertions locate their centers by searching the tree
+        self.ploc = ParallelPointLocation(self, [])
+
+    def construct_parallel(self, points, pointlocation=SNTPointLocation, workers=None, shards=None):
+        """
+        Constructs a net-tree with a pool of processes. A coarse net, the k-centers of a random sample,
+        is built first as the top of the tree, and its points are split into `shards` shards by their
+        nearest point among the first centers. Every other point goes to the shard of its nearest net
+        point, and its margin is the gap between its distance to the net points of other shards and
+        to its nearest net point. Each worker thaws the top and inserts the points of one shard, see
+        `buildshard`. The trees of the shards are spliced under the top by `splice`, and `mend` fixes
+        the nodes near the seams between shards.
+
+        A point of another shard is farther from a point than half its margin, so only the points
+        whose nodes reach that far, the seam points, and the nodes of the net that the shards split
+        may miss relatives or a nearer parent in the spliced tree. The serial part of the work grows
+        with the net and the seams rather than with the number of points.
+
+        Parameters:
+        ----------
+        points : list
+            The list of points, as in `construct`.
+        pointlocation : PointLocation
+            The point location class used by the workers.
+        workers : int
+            The number of processes. If workers==None, the number of CPUs is used.
+        shards : int
+            The number of shards. If shards==None, there is one shard per worker.
+        """
+        workers = workers or os.cpu_count() or 1
+        shards = shards or workers
+        records = [self.registry.intern(p) for p in aspoints(points)]
+        distinct = list(dict.fromkeys(records))
+        if shards == 1 or len(distinct) < 64 * shards:
+            self.construct(points, pointlocation)
+            return
+        metric = distinct[0].metric
+        # The sample is copied, so the points stay in the registry of this tree
+        sample = SNT(self.tau, self.cp, self.cc, self.cr)
+        sample.construct(PointSet.frompoints(random.sample(distinct, min(len(distinct), 64 * shards))), SNTPointLocation)
+        net = [self.registry.lookup(c, coordtuple(c)) for c in sample.k_centers(4 * shards)]
+        owner = metric.distmatrix(net, net[:shards]).argmin(axis=1)
+        isnet = {id(c) for c in net}
+        groups, margins = [[] for _ in range(shards)], [[] for _ in range(shards)]
+        for i in range(0, len(distinct), 4096):
+            chunk = distinct[i:i + 4096]
+            dsts = metric.distmatrix(chunk, net)
+            shard = owner[dsts.argmin(axis=1)]
+            # The distance of every point to the nearest net point of every shard
+            byshard = numpy.stack([dsts[:, owner == s].min(axis=1) for s in range(shards)], axis=1)
+            rows = numpy.arange(len(chunk))
+            own = byshard[rows, shard]
+            byshard[rows, shard] = numpy.inf
+            for p, s, margin in zip(chunk, shard.tolist(), (byshard.min(axis=1) - own).tolist()):
+                if id(p) not in isnet:
+                    groups[s].append(p)
+                    margins[s].append(margin)
+        self.construct(net, SNTPointLocation)
+        del self.ploc
+        net = list(self.points)
+        top = self.freeze()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            shardtrees = list(executor.map(buildshard, itertools.repeat(top),
+                                           [PointSet.frompoints(net + group) for group in groups],
+                                           itertools.repeat(pointlocation), [numpy.array(m) for m in margins]))
+        shardof = {id(p) : s for s, group in enumerate(groups) for p in group}
+        new = self.splice([frozen for frozen, _, _ in shardtrees], [net + group for group in groups])
+        seams = [(group[i], margin[i]) for group, margin, (_, seam, _) in zip(groups, margins, shardtrees) for i in seam.tolist()]
+        # The distances computed by the workers are charged to the metric of the points
+        metric.counter += sum(counter for _, _, counter in shardtrees)
+        # Later insertions locate their centers by searching the tree
+        self.ploc = ParallelPointLocation(self, [])
+        self.insert_many(self.mend(new, seams, shardof))
+        self.payloads = dict()
+        for i, p in enumerate(records):
+            self.payloads.setdefault(p.pid, []).append(i)
+        self.records = len(records)
+
+    def splice(self, trees, pointlists):
+        """
+        Splices net-trees built from thawed copies of this tree by inserting disjoint sets of new
+        points, as the shards of `construct_parallel`. The nodes of the points of this tree are
+        matched by their levels and the nodes that the trees split from their jumps are added, while
+        the nodes of the new points are moved as they are, with their parents, children and relatives.
+        A highest node of a point of this tree that the trees put under different parents gets the
+        nearest one, and no other distance is computed.
+
+        Parameters:
+        ----------
+        trees : list
+            The frozen net-trees.
+        pointlists : list
+            The points of the nodes of every tree, in the order of its `points`. The points of this
+            tree should be given as they are here.
+
+        Returns:
+        -------
+        list
+            The new nodes of the points that were already in this tree.
+        """
+        # The nodes of every point of this tree by their levels
+        chains, new, parents = dict(), [], dict()
+        for p in self.points:
+            node, chain = self.leaves[pointkey(p)], dict()
+            while node is not None and node.point is p:
+                chain[node.level] = node
+                node = node.par
+            chains[id(p)] = chain
+        for frozen, points in zip(trees, pointlists):
+            nodes = []
+            for i, level in zip(frozen.nodepoint.tolist(), frozen.level.tolist()):
+                point, level = points[i], float(level) if math.isinf(level) else int(level)
+                chain = chains.get(id(point))
+                node = chain.get(level) if chain is not None else None
+                if node is None:
+                    node = Node(point, level)
+                    if chain is not None:
+                        chain[level] = node
+                        new.append(node)
+                    elif level == float('-inf'):
+                        self.leaves[pointkey(point)] = node
+                nodes.append(node)
+            for i, node in enumerate(nodes):
+                for j in frozen.children(i).tolist():
+                    child = nodes[j]
+                    # The nodes of a point of this tree are chained below, and its highest node is placed last
+                    if id(child.point) not in chains:
+                        node.addch(child)
+                    elif child.point is not node.point:
+                        parents.setdefault(child, set()).add(node)
+                node.rel.update(nodes[j] for j in frozen.relatives(i).tolist())
+            for p in points:
+                if id(p) not in chains:
+                    self.points.append(p)
+                    self.payloads[p.pid] = [self.records]
+                    self.records += 1
+        for chain in chains.values():
+            levels = sorted(chain, reverse=True)
+            for upper, lower in zip(levels, levels[1:]):
+                chain[upper].addch(chain[lower])
+        for child, candidates in parents.items():
+            nearest(child, candidates).addch(child)
+        return new
+
+    def mend(self, nodes, seams, shardof):
+        """
+        Fixes the spliced tree of `construct_parallel` near the seams between shards. Two points
+        should have relatives at every level from the least one at which they can be relatives to the
+        highest node of either, so the nodes that the shards split from the jumps of the net and the
+        nodes of the seam points get the relatives that another shard saw, splitting jumps as needed.
+        A point of another shard is not closer to a seam point than half its margin, so only the nodes 
+        at the levels where such a point can be a relative are searched. Then the seam points move 
+        under nearer parents found among the relatives of their parents. A seam point left closer to 
+        a point of another shard than the packing condition allows at some level is deleted and 
+        returned, to be inserted again.
+
+        Parameters:
+        ----------
+        nodes : list
+            The nodes of the net that the shards split from its jumps.
+        seams : list
+            The points whose nodes may reach other shards, in pairs with their margins.
+        shardof : dict
+            The shard of every point outside the net, by its id.
+
+        Returns:
+        -------
+        list
+            The deleted points.
+        """
+        work = [(node.point, self.cr * self.tau ** node.level, node.level, None) for node in nodes]
+        for p, margin in seams:
+            node = self.highest(p)
+            level = self.minlevelrelatives(None, None, margin / 2) if margin > 0 else float('-inf')
+            work.append((p, max(self.cr * self.tau ** node.level, dist(node, node.par)), level, shardof[id(p)]))
+        seams = [p for p, _ in seams]
+        # The highest nodes whose parents are checked, which are those of the seams and of the net
+        moving = seams + list({node.point for node in nodes})
+        touched = set()
+
+        def nodeat(point, level):
+            node = self.leaves[pointkey(point)]
+            while node.par.point is point and node.par.level <= level:
+                node = node.par
+            if node.level == level: return node
+            # A new node needs the relatives of its level
+            node = self.splitbelow(node.par, level)
+            work.append((point, self.cr * self.tau ** level, level, None))
+            touched.add(node)
+            return node
+
+        while work:
+            while work:
+                point, radius, level, shard = work.pop()
+                top = self.highest(point).level
+                for other, dst in self.near(point, radius, level):
+                    if shard is not None and shardof.get(id(other)) == shard: continue
+                    for l in range(self.minlevelrelatives(None, None, dst), min(top, self.highest(other).level) + 1):
+                        nodeat(point, l).addrel(nodeat(other, l))
+            for p in moving:
+                node = self.highest(p)
+                if node.par.level == float('inf'): continue
+                newpar = nearest(node, node.par.rel)
+                if dist(node, newpar) < dist(node, node.par):
+                    touched.add(node.par)
+                    if newpar.getchild().level < node.level:
+                        nodeat(newpar.point, node.level)
+                    node.setpar(newpar)
+        # Every pair of points closer than the packing condition allows at a level are relatives there
+        left = set()
+        for p in seams:
+            node = self.highest(p)
+            while node.level > float('-inf') and p not in left:
+                others = [r.point for r in node.rel if r.point is not p and r.point not in left and shardof.get(id(r.point)) != shardof[id(p)]]
+                if any(d <= self.cp * self.tau ** node.level for d in p.metric.dists(p, others).tolist()):
+                    left.add(p)
+                node = [c for c in node.ch if c.point is p][0]
+        if touched: self.compress(touched | ch(touched) | par(touched))
+        for p in left:
+            self.delete(p)
+        return list(left)
+
+    def near(self, point, radius, level):
+        """
+        Finds the points of the tree other than `point` that can be relatives of its nodes or
+        parents of its highest node, with their distances. These are the points whose highest nodes
+        are at `level` or above, at a level l, and within the smaller of `radius` and c_r\tau**l.
+        The bound shrinks with the level, so the walk down the tree stays near `point`. The children 
+        of all nodes reached are measured together, one generation at a time.
+        """
+        top = self.root.getchild()
+        found = []
+        nodes, dsts = [top], [point.distto(top.point)]
+        while nodes:
+            children, childdsts = [], []
+            for node, dst in zip(nodes, dsts):
+                bound = min(radius, self.cr * self.tau ** node.level)
+                if dst - self.coveringradius(node) > bound: continue
+                if dst <= bound and node.point is not point and (node is top or node.par.point is not node.point):
+                    found.append((node.point, dst))
+                for c in node.ch:
+                    if c.level >= level:
+                        children.append(c)
+                        childdsts.append(dst if c.point is node.point else None)
+            others = [c.point for c, d in zip(children, childdsts) if d is None]
+            measured = iter(point.metric.dists(point, others).tolist())
+            nodes, dsts = children, [next(measured) if d is None else d for d in childdsts]
+        return found
+
+    def highest(self, point):
+        """
+        Returns the highest node of a point of the tree below the root.
+        """
+        node = self.leaves[pointkey(point)]
+        while node.par is not None and node.par.point is point and node.par.level < float('inf'):
+            node = node.par
+        return node
+
+    def insert(self, point, closest=None, closestdist=None):
+        """
+        Insertes a point into the net-tree. A copy of a point of the tree only gets 
+        the next payload id, without computing any distance.
         
         Parameters:
         ----------
@@ -66,9 +479,21 @@ class SNT:
         closest : Node
             The center of the point. If `closest` is not provided, then the 
             point location data structure is used to find it.
+        closestdist : float
+            The distance between the point and `closest`, if it is already known.
         """
+        point = self.registry.intern(point)
+        if point.pid in self.payloads:
+            self.payloads[point.pid].append(self.records)
+            self.records += 1
+            return
+        self.payloads[point.pid] = [self.records]
+        self.records += 1
+        self.points.append(point)
         closest = closest or self.ploc.nn(point)
-        if hasattr(self, 'ploc'):
+        if closestdist is not None:
+            dst = closestdist
+        elif hasattr(self, 'ploc'):
             dst = self.ploc.nndist(point, closest)
             # Removes the uninserted point from the point location data structure.
             # In other words, the point is removed from the mappings for the centers and cells
@@ -101,6 +526,249 @@ class SNT:
         while not self.iscovered(node):
             node = self.promote(node)
 
+    def insert_many(self, points):
+        """
+        Inserts a batch of points into a net-tree. The new points are first registered in the 
+        point location data structure, which finds their centers in one grouped descent, and then 
+        inserted one by one as in `construct`, so their centers are kept up to date by the cell 
+        updates instead of being searched again for every point. The cell updates of the new 
+        nodes are held back by `defer` until a point whose center they may change is inserted, 
+        and then applied together, grouped by the parents of the new nodes. A tree without a 
+        point location data structure gets a `ParallelPointLocation`, and an empty tree takes 
+        the first point as its root.
+        
+        Parameters:
+        ----------
+        points : list
+            The points to be inserted. Copies of the points of the tree only get payload ids.
+        """
+        records = [self.registry.intern(p) for p in aspoints(points)]
+        if len(records) == 0: return
+        if self.root is None:
+            self.setroot(records[0])
+            records = records[1:]
+            self.ploc = ParallelPointLocation(self, [])
+        elif not hasattr(self, 'ploc'):
+            self.ploc = ParallelPointLocation(self, [])
+        new = [p for p in dict.fromkeys(records) if p.pid not in self.payloads]
+        self.ploc.addpoints(new)
+        self.ploc.defer()
+        for p in records:
+            self.insert(p)
+        self.ploc.flush()
+
+    def merge(self, other):
+        """
+        Merges another net-tree with the same constants into this one. The trees are walked 
+        top-down: the points of `other` are inserted in the order of their highest nodes, so the 
+        parent of every point in `other` is already merged when the point is inserted, and the 
+        nearest merged point is found by `knnaround` from the nodes of that parent instead of by 
+        a point location structure. The new nodes are linked by `update`, as in `insert`.
+        The payload ids of the copies in `other` are shifted by the number of payload ids of 
+        this tree. Merging into an empty tree adopts the nodes of `other`. The points of `other` 
+        are moved to the registry of this tree, so `other` should not be used afterwards.
+        
+        Parameters:
+        ----------
+        other : SNT
+            The net-tree to be merged.
+        """
+        if (self.tau, self.cp, self.cc, self.cr) != (other.tau, other.cp, other.cc, other.cr):
+            raise ValueError("SNT.merge: the trees have different constants")
+        if other.root is None: return
+        if self.root is None:
+            for name in ['root', 'registry', 'payloads', 'records', 'leaves', 'points', 'position', 'positioned', 'ploc']:
+                if hasattr(other, name): setattr(self, name, getattr(other, name))
+            # The adopted point location searches and updates this tree from now on
+            if hasattr(self, 'ploc'): self.ploc.tree = self
+            return
+        base = self.records
+        ploc = getattr(self, 'ploc', None)
+        # Points without a usable parent fall back to searching the tree
+        self.ploc = ParallelPointLocation(self, [])
+        for node in [other.root] + other.topnodes():
+            ids = other.payloads[node.point.pid]
+            p = self.registry.intern(node.point)
+            existing = self.payloads.get(p.pid)
+            if existing is None:
+                if node.par is None:
+                    self.insert(p)
+                else:
+                    self.insert(p, *self.locate(p, self.registry.intern(node.par.point)))
+                existing = []
+            self.payloads[p.pid] = existing + [base + i for i in ids]
+        self.records = base + other.records
+        if isinstance(ploc, SNTPointLocation):
+            # The cells of the new nodes are created empty, so `insert_many` keeps working
+            self.ploc = SNTPointLocation(self, [])
+            stack = [self.root]
+            while stack:
+                node = stack.pop()
+                self.ploc.addnode(node)
+                stack.extend(node.ch)
+        elif ploc is not None:
+            self.ploc = ploc
+
+    def locate(self, point, hint):
+        """
+        Finds the center of a new point from a nearby point of the tree. The nearest point of the 
+        tree is searched around the nodes of `hint`, and the center is its lowest node that can 
+        be a relative of `point`.
+        
+        Parameters:
+        ----------
+        point : Point
+            A point that is not in the tree.
+        hint : Point
+            A point of the tree near `point`.
+            
+        Returns:
+        -------
+        tuple
+            The center and its distance to `point`, or (None, None) if the nearest point 
+            has no node high enough and the point location structure should be used instead.
+        """
+        def lowestnode(p, level):
+            node = self.leaves[pointkey(p)]
+            while node.level < level and node.par is not None and node.par.point is node.point:
+                node = node.par
+            return node
+        dst = point.distto(hint)
+        nn, dst = self.knnaround(point, 1, lowestnode(hint, self.minlevelrelatives(None, None, dst)), dst)[0]
+        center = lowestnode(nn, self.minlevelrelatives(None, None, dst))
+        if center.level < self.minlevelrelatives(None, None, dst):
+            return None, None
+        return center, dst
+
+    def delete(self, point, payload=None):
+        """
+        Deletes a copy of a point from the net-tree. Deleting the last copy removes all nodes of the point.
+        The nodes are visited bottom-up and the other children of each one are either reattached to 
+        the nearest relative of their parent that covers them, or promoted one level up as in `insert`.
+        Finally, the nodes that are no longer needed by the semi-compressed condition are merged into jumps.
+        
+        Parameters:
+        ----------
+        point : Point
+            A point with the coordinates of the copy to be deleted.
+        payload : int
+            The payload id of the copy. If payload==None, the oldest copy is deleted.
+            A KeyError is raised if the point is not in the tree or none of its copies has this id.
+        """
+        copies = self.duplicates(point)
+        if not copies: raise KeyError("SNT.delete: the point is not in the tree")
+        if payload is not None and payload not in copies:
+            raise KeyError("SNT.delete: " + str(payload) + " is not the payload id of a copy of the point")
+        copies.remove(copies[0] if payload is None else payload)
+        if copies: return
+        point = self.registry.intern(point)
+        del self.payloads[point.pid]
+        leaf = self.leaves.pop(pointkey(point))
+        self.unlist(point)
+        self.registry.remove(point)
+        node = leaf.par
+        while node.point is point and node.par is not None:
+            self.reattach(node)
+            node = node.par
+        chain = [leaf]
+        while chain[-1].par is not None and chain[-1].par.point is point:
+            chain.append(chain[-1].par)
+        if self.root.point is point:
+            remaining = [c for c in chain[-2].ch if c.point is not point]
+            if not remaining:
+                self.root = None
+                return
+            # The only other child left below the old root becomes the top of the tree
+            self.root = Node(remaining[0].point, float('inf'))
+            if hasattr(self, 'ploc'): self.ploc.addnode(self.root)
+            self.root.addch(remaining[0])
+            # The cells of the old root move to the new root
+            chain[-1].par = self.root
+        touched = {chain[-1].par}
+        for node in chain:
+            if hasattr(self, 'ploc'): self.ploc.updateonremoval(node)
+            for other in node.rel:
+                if other is not node:
+                    other.rel.discard(node)
+                    touched.add(other)
+        chain[-1].par.ch.discard(chain[-1])
+        self.compress(touched | set(ch(touched)) | par(touched))
+
+    def unlist(self, point):
+        """
+        Removes a point from `self.points` in constant time by moving the last point to its position.
+        """
+        i = self.position.get(point.pid)
+        if i is None or i >= len(self.points) or self.points[i] is not point:
+            # Points appended since the last removal get their positions, and if the list was 
+            # replaced altogether, all positions are found again
+            for j in range(min(self.positioned, len(self.points)), len(self.points)):
+                self.position[self.points[j].pid] = j
+            i = self.position.get(point.pid)
+            if i is None or i >= len(self.points) or self.points[i] is not point:
+                self.position = {p.pid : j for j, p in enumerate(self.points)}
+                i = self.position[point.pid]
+        last = self.points.pop()
+        if last is not point:
+            self.points[i] = last
+            self.position[last.pid] = i
+        del self.position[point.pid]
+        self.positioned = len(self.points)
+
+    def reattach(self, node):
+        """
+        Finds new parents for the children of a node of a deleted point, except the child 
+        associated to the same point. A child covered by a relative of `node` moves to the 
+        nearest such relative, and the others are promoted. Below the root of a deleted point, 
+        one child is left to become the new top of the tree.
+        
+        Parameters:
+        ----------
+        node : Node
+            A node associated to the deleted point.
+        """
+        while True:
+            orphans = [c for c in node.ch if c.point is not node.point]
+            if not orphans or (len(orphans) == 1 and node.par is self.root and self.root.point is node.point):
+                return
+            orphan = orphans[0]
+            others = [r for r in node.rel if r is not node]
+            dsts = orphan.point.metric.dists(orphan.point, [r.point for r in others])
+            covering = [(d, i) for i, d in enumerate(dsts.tolist()) if d <= self.cc * self.tau ** node.level]
+            if covering:
+                newpar = others[min(covering)[1]]
+                if newpar.getchild().level < orphan.level:
+                    self.splitbelow(newpar, orphan.level)
+                    if self.isrel(orphan, newpar): orphan.addrel(newpar.getchild())
+                orphan.setpar(newpar)
+                continue
+            # The promoted node takes `orphan` as a child, since `node` is one of its relatives
+            promoted = self.promote(orphan)
+            while promoted.par.point is not node.point and not self.iscovered(promoted):
+                promoted = self.promote(promoted)
+
+    def compress(self, nodes):
+        """
+        Merges into jumps the given nodes that have one child, no relatives, and a parent with 
+        only one child, which are the nodes that the semi-compressed condition does not keep.
+        
+        Parameters:
+        ----------
+        nodes : set
+            Nodes whose children or relatives have changed.
+        """
+        stack = list(nodes)
+        while stack:
+            node = stack.pop()
+            if node.par is None or node not in node.par.ch or node.level == float('-inf'):
+                continue
+            if len(node.ch) == 1 and len(node.rel) == 1 and len(node.par.ch) == 1:
+                if hasattr(self, 'ploc'): self.ploc.updateonremoval(node)
+                child = node.getchild()
+                node.par.addch(child)
+                node.par.ch.discard(node)
+                stack.append(child)
+
     def promote(self, node):
         """
         Promotes `node` to one level up.
@@ -130,8 +798,10 @@ class SNT:
         closest : Node
             The node closest to `node` at the same level.
         """
-        for other in ch(rel(par(closest))):
-            if self.isrel(node, other):
+        others = list(ch(rel(par(closest))))
+        near = node.point.metric.withinmask(node.point, [o.point for o in others], self.cr * (self.tau ** node.level))
+        for other, isnear in zip(others, near):
+            if isnear:
                 if other.level < node.level:
                     other = self.splitabove(other, node.level)
                 node.addrel(other)
@@ -211,6 +881,7 @@ class SNT:
             The level to split the jump.
         """
         newnode = Node(node.point, level)
+        if level == float('-inf'): self.leaves[pointkey(node.point)] = newnode
         if node.ch: newnode.addch(node.getchild())
         node.ch = set()
         newnode.setpar(node)
@@ -245,7 +916,7 @@ class SNT:
             Returns True is the distance between `node` and its parent is 
             not greater than c_c\tau**(node.level+1).
         """
-        return dist(node, node.par) <= self.cc * (self.tau ** (node.level + 1))
+        return within(node, node.par, self.cc * (self.tau ** (node.level + 1)))
 
     def isrel(self, node, other, computeddist=None):
         """
@@ -264,7 +935,9 @@ class SNT:
         Returns:
             bool
         """
-        return (computeddist or dist(node, other)) <= self.cr * (self.tau ** node.level)
+        if computeddist:
+            return computeddist <= self.cr * (self.tau ** node.level)
+        return within(node, other, self.cr * (self.tau ** node.level))
 
     def minlevelrelatives(self, first, second, computeddist=None):
         """
@@ -283,8 +956,617 @@ class SNT:
         Returns:
         -------
         float
+            The minimum level, which is -\infty if the two are at the same point.
+        """
+        dst = computeddist or dist(first, second)
+        if dst == 0: return float('-inf')
+        return math.ceil(math.log(dst / self.cr, self.tau))
+
+    def multiplicity(self, point):
+        """
+        Returns the number of copies of a point inserted in the tree, which is 0 if the 
+        point is not in the tree.
+        """
+        return len(self.duplicates(point))
+
+    def duplicates(self, point):
+        """
+        Returns the payload ids of the copies of a point inserted in the tree,
+        in the order of their insertion.
+        
+        Parameters:
+        ----------
+        point : Point
+            A point with the coordinates of the copies.
+            
+        Returns:
+        -------
+        list
+        """
+        if point.registry is not self.registry:
+            if point not in self.registry: return []
+            point = self.registry.intern(point)
+        return self.payloads.get(point.pid, [])
+
+    def coveringradius(self, node):
+        """
+        Bounds the distance between a node and the points of the leaves below it.
+        Every child is within c_c\tau**(level) of its parent, so summing over the levels below
+        the node gives c_c\tau**(node.level+1) / (\tau - 1).
+        
+        Parameters:
+        ----------
+        node : Node
+            A node of the tree.
+            
+        Returns:
+        -------
+        float
+            The radius of a ball around `node.point` containing the whole subtree of `node`.
+        """
+        return self.cc * self.tau ** (node.level + 1) / (self.tau - 1)
+
+    def knn(self, point, k, withduplicates=False):
+        """
+        Finds the k nearest input points to a query point.
+        The tree is searched best-first: a node is expanded in the order of the lower bound 
+        that its covering radius gives on the distances to the points below it, and a node
+        is pruned as soon as this bound exceeds the distance of the k-th best candidate.
+        Children associated to the same point as their parent reuse the parent's distance.
+        
+        Parameters:
+        ----------
+        point : Point
+            The query point.
+        k : int
+            The number of neighbors.
+        withduplicates : bool
+            If True, every copy of a point counts as one neighbor. The k nearest copies 
+            belong to at most k distinct points, so no extra distance is computed.
+            
+        Returns:
+        -------
+        list
+            Up to k pairs (point, distance) sorted by increasing distance, or triples
+            (point, distance, payload id) if withduplicates==True.
+        """
+        if k < 1 or self.root is None: return []
+        top = self.root.getchild()
+        result = self.knnhelper(point, k, [(top, point.distto(top.point))])
+        if not withduplicates: return result
+        return [(p, d, i) for p, d in result for i in self.payloads[p.pid]][:k]
+
+    def knnhelper(self, point, k, seeds):
+        """
+        Searches the subtrees of the given nodes best-first for the k nearest points to `point`.
+        
+        Parameters:
+        ----------
+        point : Point
+            The query point.
+        k : int
+            The number of neighbors.
+        seeds : list
+            Pairs (node, distance) of nodes with disjoint subtrees and their distances to `point`.
+            
+        Returns:
+        -------
+        list
+            Up to k pairs (point, distance) sorted by increasing distance.
         """
-        return math.ceil(math.log((computeddist or dist(first, second)) / self.cr, self.tau))
+        tiebreak = itertools.count()
+        queue = []
+        # A bounded max-heap keeping the distances of the k best leaves found so far
+        candidates = []
+        for node, dst in seeds:
+            if node.level == float('-inf'):
+                if len(candidates) == k: heapq.heappushpop(candidates, -dst)
+                else: heapq.heappush(candidates, -dst)
+            queue.append((max(dst - self.coveringradius(node), 0), next(tiebreak), dst, node))
+        heapq.heapify(queue)
+        result = []
+        while queue and len(result) < k:
+            bound, _, dst, node = heapq.heappop(queue)
+            if node.level == float('-inf'):
+                # Every entry left in the queue is at least as far as this leaf
+                result.append((node.point, dst))
+                continue
+            others = [c for c in node.ch if c.point is not node.point]
+            dsts = point.metric.dists(point, [c.point for c in others])
+            for child, childdst in itertools.chain(((c, dst) for c in node.ch if c.point is node.point), zip(others, dsts)):
+                bound = max(childdst - self.coveringradius(child), 0)
+                if len(candidates) == k and bound > -candidates[0]:
+                    continue
+                if child.level == float('-inf'):
+                    if len(candidates) == k: heapq.heappop(candidates)
+                    heapq.heappush(candidates, -childdst)
+                heapq.heappush(queue, (bound, next(tiebreak), childdst, child))
+        return result
+
+    def knnaround(self, point, k, center, dst):
+        """
+        Finds the k nearest input points to `point` by searching only the subtrees of the 
+        relatives of a nearby node. Any point below another node at the level of `center` 
+        is farther than c_r\tau**(level) - dst - coveringradius(center), so the local answer is 
+        returned when its k-th distance is within this bound and `knn` is used otherwise.
+        
+        Parameters:
+        ----------
+        point : Point
+            The query point.
+        k : int
+            The number of neighbors.
+        center : Node
+            A node of the tree close to `point`, such as its center in a point location structure.
+        dst : float
+            The distance between `center` and `point`.
+            
+        Returns:
+        -------
+        list
+            Up to k pairs (point, distance) sorted by increasing distance.
+        """
+        if center.level == float('inf'):
+            return self.knn(point, k)
+        others = [n for n in center.rel if n is not center]
+        seeds = [(center, dst)] + list(zip(others, point.metric.dists(point, [n.point for n in others])))
+        result = self.knnhelper(point, k, seeds)
+        certified = self.cr * self.tau ** center.level - dst - self.coveringradius(center)
+        if len(result) == k and result[-1][1] <= certified:
+            return result
+        return self.knn(point, k)
+
+    def all_nn(self, k=1):
+        """
+        Computes the k nearest other input points of every point of the tree.
+        One traversal collects the leaves, which number the points. Then every point runs its 
+        own `knnaround` from the lowest node above its leaf, so the relatives of this node seed 
+        the search and the full `knn` is only used when the local answer cannot be certified. 
+        The searches of different points share no distances.
+        
+        Parameters:
+        ----------
+        k : int
+            The number of neighbors.
+            
+        Returns:
+        -------
+        tuple
+            The list of the n points in the order of the leaves, and two (n, k) arrays, the indices 
+            in this list of the neighbors of each point and their distances, both sorted by increasing 
+            distance. Missing neighbors, when there are fewer than k other points, have index -1 and 
+            distance infinity.
+        """
+        leaves = self.leafnodes() if self.root is not None else []
+        points = [leaf.point for leaf in leaves]
+        index = {id(p) : i for i, p in enumerate(points)}
+        indices = numpy.full((len(points), k), -1, dtype=numpy.int64)
+        dists = numpy.full((len(points), k), float('inf'))
+        for i, leaf in enumerate(leaves):
+            neighbors = [(p, d) for p, d in self.knnaround(leaf.point, k + 1, leaf.par, 0) if p is not leaf.point]
+            for j, (p, d) in enumerate(neighbors[:k]):
+                indices[i, j] = index[id(p)]
+                dists[i, j] = d
+        return points, indices, dists
+
+    def greedy_permutation(self):
+        """
+        Streams the points in an approximate greedy (farthest-first) order read off the tree.
+        A point enters the order at the level of its highest node, so one traversal buckets
+        these nodes by level and the buckets are emitted from the top level down. The
+        insertion radius of a point is its distance to the nearest point among the relatives
+        of the parent of its highest node, all of which come earlier in the order.
+        
+        Returns:
+        -------
+        generator
+            The pairs (point, radius), starting with the point of the root and radius infinity.
+            The radius of a point whose highest node is at level l is between cp * tau^l and 
+            the covering radius of its parent.
+        """
+        if self.root is None: return
+        yield self.root.point, float('inf')
+        for node in self.topnodes():
+            others = [other.point for other in node.par.rel]
+            yield node.point, node.point.distto(*others)
+
+    def topnodes(self):
+        """
+        Returns the highest node of every point other than the point of the root, from the top level down.
+        """
+        buckets = dict()
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            for child in node.ch:
+                if child.point is not node.point:
+                    buckets.setdefault(child.level, []).append(child)
+            stack.extend(node.ch)
+        return [node for level in sorted(buckets, reverse=True) for node in buckets[level]]
+
+    def k_centers(self, k):
+        """
+        Returns the first k points of the exact greedy (farthest-first) order starting at the point 
+        of the root, as centers of a k-center clustering. The (k+1)-th point is at distance r from 
+        the centers and the first k+1 points are at least r apart, so the optimal radius is at least 
+        r/2 and the radius r of the centers is within a factor 2 of the optimum.
+        
+        The tree is searched best-first, with the nodes in a lazy max-heap of the bounds that their 
+        covering radii give on the distances of the points below them to the centers. The distance 
+        of a node to the centers is brought up to date with the centers added since it was computed 
+        when the node reaches the top, and a leaf at the top with an up to date distance is the 
+        farthest point, which becomes the next center.
+        
+        Parameters:
+        ----------
+        k : int
+            The number of centers.
+            
+        Returns:
+        -------
+        list
+            The centers, or all the points if there are at most k of them.
+        """
+        if k < 1:
+            raise ValueError("k_centers: k should be a positive integer")
+        if self.root is None: return []
+        centers = [self.root.point]
+        metric = self.root.point.metric
+        tiebreak = itertools.count()
+        # Entries (-bound, tiebreak, node, distance of the node to the centers, number of centers then)
+        heap = [(-self.coveringradius(self.root), next(tiebreak), self.root, 0.0, 1)]
+        while heap and len(centers) < k:
+            _, _, node, dst, stamp = heapq.heappop(heap)
+            if stamp != len(centers):
+                dst = min(dst, float(metric.dists(node.point, centers[stamp:]).min()))
+                # A margin for rounding keeps the bound above the distances below the node
+                bound = dst + self.coveringradius(node) * (1 + 1e-9)
+                heapq.heappush(heap, (-bound, next(tiebreak), node, dst, len(centers)))
+            elif node.level == float('-inf'):
+                if dst > 0: centers.append(node.point)
+            else:
+                # A child with the point of the node has its distance, and the others are measured in one batch
+                others = [child for child in node.ch if child.point is not node.point]
+                dsts = dict()
+                if others:
+                    dsts = dict(zip(others, metric.distmatrix([child.point for child in others], centers).min(axis=1).tolist()))
+                for child in node.ch:
+                    childdst = dsts.get(child, dst)
+                    bound = childdst + self.coveringradius(child) * (1 + 1e-9)
+                    heapq.heappush(heap, (-bound, next(tiebreak), child, childdst, len(centers)))
+        return centers
+
+    def leafnodes(self):
+        """
+        Returns the leaves of the tree, which are the nodes at level -\infty.
+        """
+        leaves = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node.level == float('-inf'):
+                leaves.append(node)
+            stack.extend(node.ch)
+        return leaves
+
+    def ann(self, point, eps):
+        """
+        Finds a (1+eps)-approximate nearest input point to a query point.
+        Like `ParallelPointLocation.nnhelper`, the tree is descended level by level, keeping the
+        set of nodes whose subtrees may still hold a closer point and computing the distances 
+        to all their children in one batch. The descent stops as soon as the covering radius
+        of the current level is at most an eps/(1+eps) fraction of the best distance found, 
+        so larger values of eps trade accuracy for fewer distance computations.
+        
+        Parameters:
+        ----------
+        point : Point
+            The query point.
+        eps : float
+            The non-negative approximation factor. If eps==0, the exact nearest neighbor is returned.
+            
+        Returns:
+        -------
+        tuple
+            The approximate nearest point, its distance to `point` and the number of distances computed,
+            or None if the tree is empty.
+        """
+        if self.root is None: return None
+        start = point.metric.counter
+        top = self.root.getchild()
+        bestdst = point.distto(top.point)
+        best = top.point
+        currentnodes = [(top, bestdst)]
+        while currentnodes:
+            highest = max((node for node, _ in currentnodes), key=lambda node: node.level)
+            level = highest.level
+            if self.coveringradius(highest) <= eps / (1 + eps) * bestdst:
+                break
+            nextnodes = [(node, dst) for node, dst in currentnodes if node.level < level]
+            children = [(c, dst) for node, dst in currentnodes if node.level == level 
+                        for c in node.ch if c.point is node.point]
+            others = [c for node, _ in currentnodes if node.level == level 
+                      for c in node.ch if c.point is not node.point]
+            dsts = point.metric.dists(point, [c.point for c in others])
+            if len(others) > 0 and dsts.min() < bestdst:
+                index = int(dsts.argmin())
+                best, bestdst = others[index].point, float(dsts[index])
+            nextnodes.extend(children)
+            nextnodes.extend(zip(others, dsts))
+            # Subtrees that cannot hold a point closer than bestdst/(1+eps) are dropped
+            currentnodes = [(node, dst) for node, dst in nextnodes 
+                            if dst - self.coveringradius(node) <= bestdst / (1 + eps)]
+        return best, bestdst, point.metric.counter - start
+
+    def batch_nn(self, queries):
+        """
+        Finds the nearest input point of every query in a batch with a dual-tree traversal.
+        A net-tree with the same constants is built over the distinct queries, and then the 
+        pairs of a query node and a data node are visited top-down, always splitting the node 
+        with the larger covering radius. A pair is pruned when the covering balls of its nodes
+        are farther apart than the largest current nearest distance among the queries below 
+        the query node. A pair whose split node keeps its point reuses the distance of the 
+        parent pair; other repeated distances are only saved by the cache of the metric.
+        
+        Parameters:
+        ----------
+        queries : list
+            The query points.
+            
+        Returns:
+        -------
+        list
+            A pair (point, distance) for each query, in the order of `queries`,
+            or None for each query if the tree is empty.
+        """
+        queries = list(aspoints(queries))
+        if len(queries) == 0: return []
+        if self.root is None: return [None] * len(queries)
+        querytree = SNT(self.tau, self.cp, self.cc, self.cr)
+        querytree.construct(list(dict.fromkeys(queries)), SNTPointLocation)
+        inf = float('inf')
+        # The current nearest neighbor of every query, keyed by the id of the query point
+        best = dict()
+        # For each query node, an upper bound on the nearest distances of the queries below it
+        bound = dict()
+        
+        def pairdist(querynode, datanode, parentpoints, parentdist):
+            # A node with the point of its parent is at the distance of the parent pair
+            if (querynode.point, datanode.point) == parentpoints: return parentdist
+            return querynode.point.distto(datanode.point)
+        
+        tiebreak = itertools.count()
+        querytop, datatop = querytree.root.getchild(), self.root.getchild()
+        # The pairs are visited depth-first; a query node without a pair node tightens the 
+        # bound of the query node once the pairs of all its children are done
+        stack = [(querytop, datatop, querytop.point.distto(datatop.point))]
+        while stack:
+            querynode, datanode, dst = stack.pop()
+            if datanode is None:
+                bound[id(querynode)] = min(bound[id(querynode)], max(bound[id(c)] for c in querynode.ch))
+                continue
+            queryradius = querytree.coveringradius(querynode)
+            dataradius = self.coveringradius(datanode)
+            if dst - queryradius - dataradius > bound.get(id(querynode), inf):
+                continue
+            # Every query below `querynode` has `datanode.point` within dst + queryradius
+            bound[id(querynode)] = min(bound.get(id(querynode), inf), dst + queryradius)
+            points = (querynode.point, datanode.point)
+            if querynode.level == datanode.level == float('-inf'):
+                if dst < best.get(id(querynode.point), (None, inf))[1]:
+                    best[id(querynode.point)] = (datanode.point, dst)
+            elif datanode.level == float('-inf') or \
+                    (querynode.level != float('-inf') and queryradius >= dataradius):
+                stack.append((querynode, None, None))
+                children = [(child, datanode, pairdist(child, datanode, points, dst)) for child in querynode.ch]
+                stack.extend(reversed(children))
+            else:
+                children = sorted((pairdist(querynode, c, points, dst), next(tiebreak), c) for c in datanode.ch)
+                stack.extend((querynode, child, childdst) for childdst, _, child in reversed(children))
+        nearest = {q : best[id(q)] for q in querytree.points}
+        return [nearest[q] for q in queries]
+
+    def range(self, point, r, withduplicates=False):
+        """
+        Finds the input points within a given distance of a query point.
+        The tree is walked downward from `root.getchild()`. A node is skipped when the ball 
+        of its covering radius cannot intersect the query ball, and when this ball is fully 
+        inside the query ball all points below the node are reported without computing 
+        any more distances.
+        
+        Parameters:
+        ----------
+        point : Point
+            The query point.
+        r : float
+            The query radius.
+        withduplicates : bool
+            If True, the copies of the points are reported with their payload ids.
+            
+        Returns:
+        -------
+        list
+            The input points within distance `r` of `point`, in no particular order, or pairs
+            (point, payload id) for all their copies if withduplicates==True.
+        """
+        if self.root is None: return []
+        top = self.root.getchild()
+        result = []
+        stack = [(top, point.distto(top.point))]
+        while stack:
+            node, dst = stack.pop()
+            radius = self.coveringradius(node)
+            if dst - radius > r:
+                continue
+            if dst + radius <= r:
+                result.extend(self.pointsbelow(node))
+                continue
+            others = [c for c in node.ch if c.point is not node.point]
+            stack.extend((c, dst) for c in node.ch if c.point is node.point)
+            stack.extend(zip(others, point.metric.dists(point, [c.point for c in others])))
+        if not withduplicates: return result
+        return [(p, i) for p in result for i in self.payloads[p.pid]]
+
+    def pointsbelow(self, node):
+        """
+        Returns the points of all leaves in the subtree of a node, without computing any distance.
+        
+        Parameters:
+        ----------
+        node : Node
+            A node of the tree.
+            
+        Returns:
+        -------
+        list
+        """
+        points = []
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node.level == float('-inf'):
+                points.append(node.point)
+            stack.extend(node.ch)
+        return points
+
+    def freeze(self, metric=None):
+        """
+        Returns an immutable copy of the tree held in flat arrays, for read-only serving.
+        
+        Parameters:
+        ----------
+        metric : Metric
+            The metric of the frozen points. If metric==None, the metric of the first point is used.
+            
+        Returns:
+        -------
+        FrozenSNT
+        """
+        return FrozenSNT.fromtree(self, metric)
+
+    def save(self, path):
+        """
+        Writes the tree to a versioned binary file. The coordinates are stored as one float matrix and 
+        the nodes, their levels, parents, children and relatives, and the payload ids of the points as 
+        integer arrays, in the layout of `FrozenSNT`. A saved tree can be loaded either mutable by `load` 
+        or immutable by `FrozenSNT.load`, which maps the file into memory without reading it.
+        
+        Parameters:
+        ----------
+        path : str
+            The path of the file.
+        """
+        frozen = self.freeze()
+        arrays = frozen.arrays()
+        arrays['payptr'], arrays['payidx'] = csr([self.payloads[p.pid] for p in self.points])
+        writearrays(path, dict(frozen.header(), records=self.records), arrays)
+
+    @staticmethod
+    def load(path, mmap=True, metric=None):
+        """
+        Reads a tree written by `save`. The nodes are rebuilt as in `thaw`, while the coordinates 
+        stay in the file if `mmap` is True.
+        
+        Parameters:
+        ----------
+        path : str
+            The path of the file.
+        mmap : bool
+            If True, the points are views of a read-only memory map of the file.
+        metric : Metric
+            The metric of the points. If metric==None, a new instance of the saved metric class is used.
+            
+        Returns:
+        -------
+        SNT
+        """
+        header, arrays = readarrays(path, mmap)
+        tree = SNT.thaw(FrozenSNT.fromarrays(header, arrays, metric))
+        if 'payptr' in arrays:
+            ptr, idx = arrays['payptr'].tolist(), arrays['payidx'].tolist()
+            tree.payloads = {p.pid : idx[ptr[i]:ptr[i + 1]] for i, p in enumerate(tree.points)}
+            tree.records = header['records']
+        return tree
+
+    @staticmethod
+    def thaw(frozen, points=None):
+        """
+        Rebuilds a net-tree from its frozen copy, which undoes `freeze`.
+        
+        Parameters:
+        ----------
+        frozen : FrozenSNT
+            A frozen net-tree.
+        points : list
+            The points to put in the nodes in place of the frozen ones, in the order of `frozen.points`.
+            If points==None, the views of `frozen.points` are used.
+            
+        Returns:
+        -------
+        SNT
+            A net-tree whose later insertions locate their centers by searching the tree.
+        """
+        tree = SNT(frozen.tau, frozen.cp, frozen.cc, frozen.cr)
+        points = list(frozen.points) if points is None else points
+        tree.points = [tree.registry.intern(p) for p in points]
+        nodes = [Node(tree.points[i], float(level) if math.isinf(level) else int(level)) 
+                 for i, level in zip(frozen.nodepoint.tolist(), frozen.level.tolist())]
+        for i, node in enumerate(nodes):
+            node.ch = {nodes[j] for j in frozen.children(i).tolist()}
+            for child in node.ch: child.par = node
+            node.rel = {nodes[j] for j in frozen.relatives(i).tolist()}
+            if node.level == float('-inf'): tree.leaves[pointkey(node.point)] = node
+        tree.root = nodes[0] if nodes else None
+        tree.payloads = {p.pid : [i] for i, p in enumerate(tree.points)}
+        tree.records = len(tree.points)
+        tree.ploc = ParallelPointLocation(tree, [])
+        return tree
 
     def __str__(self):
         return str(self.root)
+
+def buildshard(top, points, pointlocation, margins):
+    """
+    Inserts the points of one shard of `SNT.construct_parallel` into a thawed copy of the top of the
+    tree in a worker process, and finds its seam points. A point of another shard is farther from a
+    point of this shard than half the margin of the latter, and the nodes of a point reach their
+    relatives within c_r\tau**l at their level l and their parents, so the seam points are those
+    whose highest nodes reach half their margins.
+
+    Parameters:
+    ----------
+    top : FrozenSNT
+        The tree of the net.
+    points : PointSet
+        The points of `top` in the order of `top.points`, followed by the points of the shard.
+    pointlocation : PointLocation
+        The point location class used to find the centers of the points.
+    margins : numpy.ndarray
+        The margin of every point of the shard.
+
+    Returns:
+    -------
+    tuple
+        The frozen tree, whose points are in the order of `points`, the indices of the seam points 
+        among the points of the shard and the number of distances computed.
+    """
+    points.metric.reset()
+    views = list(points)
+    tree = SNT.thaw(top, views[:len(top.points)])
+    shard = views[len(top.points):]
+    tree.ploc = pointlocation(tree, [])
+    stack = [tree.root]
+    while stack:
+        node = stack.pop()
+        tree.ploc.addnode(node)
+        stack.extend(node.ch)
+    tree.ploc.addpoints(shard)
+    for p in shard:
+        tree.insert(p)
+    seams = []
+    for i, (p, margin) in enumerate(zip(shard, margins.tolist())):
+        node = tree.highest(p)
+        # The margin for rounding takes the points whose reach is about their margin
+        if margin / 2 <= max(tree.cr * tree.tau ** node.level, dist(node, node.par)) * (1 + 1e-9):
+            seams.append(i)
+    return tree.freeze(), numpy.array(seams, dtype=numpy.int64), points.metric.counter
@@ -5,8 +5,12 @@ The rnn's are split into two groups, in and out, depending on their distance
 to the node relative to the level of the node.
 """
 
+import os
+from array import array
+import numpy
 from node import Node, ch, rel, par, dist
-from pointlocation import PointLocation
+from pointlocation import PointLocation, ParallelPointLocation
+from pointset import PointSet, PointView, coordmatrix
 
 class SNTPointLocation(PointLocation):
     """
@@ -32,6 +36,8 @@ class SNTPointLocation(PointLocation):
         # A dictionary from nodes to uninserted points. 
         # For each node, it provides the set of all uninserted points in its outer cell
         self._rnn_out = {tree.root : set()}
+        # The cell updates held back by `defer`, or None if they are applied at once
+        self.events = None
 
     def rnn_in(self, nodes):
         """
@@ -97,7 +103,12 @@ class SNTPointLocation(PointLocation):
         Node
             The center of the uninserted point.
         """
-        return self._nn[point]
+        center = self._nn[point]
+        if self.events and center in self.watched and point in self._rnn_out[center]:
+            # A held scan may still move the point
+            self.apply()
+            center = self._nn[point]
+        return center
     
     def nndist(self, point, nn = None):
         """
@@ -133,6 +144,24 @@ class SNTPointLocation(PointLocation):
         self._nn.pop(point, None)
         self._nndist.pop(point, None)
 
+    def addpoints(self, points):
+        """
+        Registers new uninserted points in the cells of their centers, which are found 
+        for all of them in one grouped descent of the tree.
+        
+        Parameters:
+        ----------
+        points : list
+            Points that are not in the tree and not yet registered.
+        """
+        for point, (center, todist) in zip(points, ParallelPointLocation(self.tree, []).nnmany(points)):
+            self._nn[point] = center
+            self._nndist[point] = todist
+            if todist <= self.tree.cp * (self.tree.tau ** (center.level - 1)) / 2:
+                self._rnn_in[center].add(point)
+            else:
+                self._rnn_out[center].add(point)
+
     def addnode(self, node):
         """
         Creates an inner and an outer cell for the new node.
@@ -160,6 +189,9 @@ class SNTPointLocation(PointLocation):
         node : Node
             A removing node.
         """
+        if self.events is not None:
+            self.extend(node, node.par)
+            if node in self.fresh: self.replaced[node] = node.par
         for point in self.rnn_out(node).copy():
             self.changernn(point, node, node.par, self.nndist(point))
             self._nn[point] = node.par
@@ -181,8 +213,53 @@ class SNTPointLocation(PointLocation):
             The new inserted node.
         """
         self.addnode(node)
-        for point in self.rnn_out(rel(par(node)) | ch(rel(par(node))) | ch(rel(node))):
-            self.trytochangernn(point, node)
+        neighborhood = rel(par(node)) | ch(rel(par(node))) | ch(rel(node))
+        if self.events is not None:
+            self.events.append(('scan', node, node.par, neighborhood))
+            self.fresh.add(node)
+            self.watched.update(neighborhood)
+            return
+        self.scan(node, neighborhood)
+
+    def scan(self, node, neighborhood, moveto=None, centerdists=None):
+        """
+        Moves the uninserted points in the outer cells of a neighborhood whose center should become 
+        a new node. The distance between the new node and the center of a cell bounds the distances 
+        of all points of the cell to the new node, by the triangle inequality with their distances 
+        to their center, so only the points that may move are measured, in one batch.
+        
+        Parameters:
+        ----------
+        node : Node
+            The new inserted node.
+        neighborhood : set
+            The nodes whose outer cells are scanned.
+        moveto : Node
+            The node receiving the points in place of `node`, as in `trytochangernn`.
+        centerdists : dict
+            The distances between `node` and the centers of some cells, if they are already known.
+        """
+        cells = [cell for cell in neighborhood if self._rnn_out.get(cell)]
+        centerdists = dict() if centerdists is None else centerdists
+        missing = [cell for cell in cells if cell not in centerdists and cell.point != node.point]
+        centerdists.update(zip(missing, node.point.metric.dists(node.point, [cell.point for cell in missing]).tolist()))
+        radius = self.tree.cr * (self.tree.tau ** node.level)
+        points = []
+        for cell in cells:
+            if cell.point == node.point:
+                # The distances to the node are the distances to the center
+                for point in list(self._rnn_out[cell]):
+                    self.trytochangernn(point, node, None, moveto)
+                continue
+            between = centerdists[cell]
+            for point in self._rnn_out[cell]:
+                todist = self.nndist(point, cell)
+                # A lower bound on the distance to the node, less a margin for rounding
+                lower = abs(between - todist) * (1 - 1e-9)
+                if lower <= radius and lower < todist:
+                    points.append(point)
+        for point, todist in zip(points, node.point.metric.dists(node.point, points).tolist()):
+            self.trytochangernn(point, node, todist, moveto)
 
     def updateonsplit(self, node):
         """
@@ -196,9 +273,98 @@ class SNTPointLocation(PointLocation):
         self.addnode(node)
         # The cells of the leaves or the nodes in level -\infty are always empty
         if node.level != float('-inf'):
+            if self.events is not None:
+                self.extend(par(node), node)
+                # The points that held scans move to a new node later reach this split again
+                if par(node) in self.fresh:
+                    self.fresh.add(node)
+                    self.events.append(('split', node, par(node), None))
             for point in self.rnn(par(node)):
                 self.trytochangernn(point, node)
 
+    def defer(self):
+        """
+        Holds back the neighborhood scans of new nodes, which `flush` applies later. A scan only 
+        moves points in the outer cells of the neighborhood of its node, so the held scans are 
+        applied as soon as the center of such a point is read, and `insert_many` inserts the 
+        points whose centers are elsewhere in between. Splits and removals still move points 
+        at once, and a held neighborhood later includes the nodes receiving points from its nodes.
+        """
+        # The held events, as tuples of a kind ('scan', 'split' or 'move'), two nodes and a neighborhood
+        self.events = []
+        # The nodes in the held neighborhoods
+        self.watched = set()
+        # The new nodes of the held scans and the nodes split from them
+        self.fresh = set()
+        # A dictionary from removed new nodes to the nodes that received their cells
+        self.replaced = dict()
+
+    def flush(self):
+        """
+        Applies the held scans and stops holding them back.
+        """
+        if self.events: self.apply()
+        self.events = None
+
+    def extend(self, source, target):
+        """
+        Records that the points of `source` move to the cells of `target` while scans are held back.
+        """
+        if source in self.watched:
+            self.events.append(('move', target, source, None))
+            self.watched.add(target)
+
+    def outer(self, nodes):
+        """
+        Returns the uninserted points in the outer cells of the given nodes that are still in the tree.
+        """
+        return set().union(*(self._rnn_out[node] for node in nodes if node in self._rnn_out))
+
+    def apply(self):
+        """
+        Applies the held scans in the order of their nodes, as `updateoninsertion` would have.
+        The new nodes are grouped by their parents, whose neighborhoods they share, and the 
+        distances of the points in the outer cells around each group of several nodes to its 
+        nodes are computed in one batch. A split of a new node moves the points that reached it again.
+        """
+        events, self.events = self.events, []
+        replaced = self.replaced
+        self.watched, self.fresh, self.replaced = set(), set(), dict()
+        # The neighborhoods grow by the moves that happened after their scans were held
+        scans = []
+        for kind, target, source, neighborhood in events:
+            if kind == 'move':
+                for scanned in scans:
+                    if source in scanned: scanned.add(target)
+            elif kind == 'scan':
+                scans.append(neighborhood)
+        groups = dict()
+        for kind, node, parent, neighborhood in events:
+            if kind == 'scan':
+                groups.setdefault(parent, []).append((node, neighborhood))
+        known = dict()
+        for group in groups.values():
+            if len(group) == 1: continue
+            cells = [cell for cell in set().union(*(neighborhood for _, neighborhood in group)) if self._rnn_out.get(cell)]
+            if len(cells) == 0: continue
+            nodes = [node for node, _ in group]
+            dsts = nodes[0].point.metric.distmatrix([node.point for node in nodes], [cell.point for cell in cells])
+            for node, row in zip(nodes, dsts.tolist()):
+                known[node] = dict(zip(cells, row))
+        
+        def resolve(node):
+            while node in replaced: node = replaced[node]
+            return node
+        
+        for kind, node, source, neighborhood in events:
+            if kind == 'split':
+                source = resolve(source)
+                if source is not resolve(node):
+                    for point in self.rnn(source).copy():
+                        self.trytochangernn(point, node, None, resolve(node))
+            elif kind == 'scan':
+                self.scan(node, neighborhood, resolve(node), known.get(node))
+
     def changernn(self, point, fromnode, tonode, todist=None):
         """
         Changes the center of an uninserted point to a different node and moves the point 
@@ -226,7 +392,7 @@ class SNTPointLocation(PointLocation):
         self._rnn_in[fromnode].discard(point)
         self._rnn_out[fromnode].discard(point)
 
-    def trytochangernn(self, point, tonode):
+    def trytochangernn(self, point, tonode, todist=None, moveto=None):
         """
         Determines whether an uninserted point should change its cells or not. If so, the change will happen.
         
@@ -236,9 +402,17 @@ class SNTPointLocation(PointLocation):
             The uninserted point.
         tonode : Node
             The node that may be the new center for the uninserted point.
+        todist : float
+            The precomputed distance between point and tonode.
+            If todist==None, then the method computes the distance.
+        moveto : Node
+            The node receiving the point in place of `tonode`, if `tonode` was removed since.
         """
         fromnode = self._nn[point]
-        todist = self.nndist(point) if fromnode.point == tonode.point else dist(tonode, point)
+        if fromnode.point == tonode.point:
+            todist = self.nndist(point)
+        elif todist is None:
+            todist = dist(tonode, point)
         if self.tree.isrel(tonode, point, todist):
             '''
             we change the center of a point if either:
@@ -249,4 +423,306 @@ class SNTPointLocation(PointLocation):
             '''
             if (fromnode.point == tonode.point and fromnode.level > tonode.level) or \
                 (fromnode.point != tonode.point and todist < self.nndist(point)):
-                self.changernn(point, fromnode, tonode, todist)
+                self.changernn(point, fromnode, moveto or tonode, todist)
+
+class ArrayPointLocation(PointLocation):
+    """
+    Tracks the same cells and centers as `SNTPointLocation` without a Python object per 
+    uninserted point, for inputs too large for the dictionaries and sets of `SNTPointLocation`.
+    An uninserted point is a row of one point set, such as a set mapped from a file by 
+    `pointio.readnpy`. The center, the distance to the center and the cell (inner or outer) 
+    of every row are kept in three arrays of 17 bytes per row in total, which are files 
+    mapped into memory if a directory is given. Nodes are numbered, and the cells of every node 
+    are append-only arrays of rows: a row that leaves a cell is not searched for, but dropped 
+    when the cell is read next.
+    
+    Parameters:
+    ----------
+    tree : SNT
+        A semi-compressed local net-tree created for one point, as in `SNTPointLocation`.
+    points : list
+        A list of points that are not inserted to the tree. Views of one point set are 
+        tracked by their rows; other points are first copied into a new point set in memory.
+    directory : str
+        The directory of the files of the arrays. If directory==None, the arrays are kept in memory.
+        A directory is passed with `functools.partial(ArrayPointLocation, directory=...)`.
+    """
+    def __init__(self, tree, points, directory=None):
+        PointLocation.__init__(self, tree)
+        self.directory = directory
+        # The nodes by number, the ids of their points, and the numbers of the nodes that have cells
+        self.nodes = []
+        self.nodepids = array('q')
+        self.numbers = dict()
+        # A dictionary from node numbers to pairs of arrays of rows in the inner and the outer cells
+        self.cells = dict()
+        self.addnode(tree.root)
+        self.track(points)
+
+    def track(self, points):
+        """
+        Allocates the arrays for the rows of the point set of `points` and puts the points 
+        in the inner cell of the root.
+        """
+        pointset = getattr(points[0], 'pointset', None) if len(points) > 0 else None
+        if pointset is not None and all(getattr(p, 'pointset', None) is pointset for p in points):
+            # A dictionary from points to rows is only needed if the points were copied
+            self.pointset, self.rowof = pointset, None
+            rows = numpy.fromiter((p.index for p in points), dtype=numpy.int64, count=len(points))
+        else:
+            self.pointset = PointSet(coordmatrix(points), points[0].metric, dedup=False) if len(points) > 0 else None
+            self.rowof = {p : i for i, p in enumerate(points)}
+            rows = numpy.arange(len(points), dtype=numpy.int64)
+        n = len(self.pointset) if self.pointset is not None else 0
+        # The number of the center of every row, or -1 if the row is not an uninserted point
+        self.center = self.allocate('center', n, numpy.int64, -1)
+        # The distance of every row to its center, or nan if it is not computed yet
+        self.dist = self.allocate('dist', n, numpy.float64, numpy.nan)
+        # Whether every row is in the inner cell of its center
+        self.inner = self.allocate('inner', n, numpy.bool_, False)
+        self.center[rows] = self.numbers[self.tree.root]
+        self.inner[rows] = True
+        self.cells[self.numbers[self.tree.root]][0].frombytes(rows.tobytes())
+
+    def allocate(self, name, n, dtype, fill):
+        if self.directory is None:
+            return numpy.full(n, fill, dtype=dtype)
+        values = numpy.lib.format.open_memmap(os.path.join(self.directory, name + '.npy'), mode='w+', dtype=dtype, shape=(n,))
+        values[:] = fill
+        return values
+
+    def row(self, point):
+        return point.index if self.rowof is None else self.rowof[point]
+
+    def view(self, row):
+        return PointView(self.pointset, row)
+
+    def dists(self, point, rows):
+        """
+        Computes the distances of a point to rows in one batch. If the metric has a NumPy kernel, 
+        the coordinates of the rows are gathered without views.
+        """
+        metric = point.metric
+        if metric.cachedist or not metric.vectorized or len(rows) == 0:
+            return metric.dists(point, [self.view(row) for row in rows.tolist()])
+        coords = numpy.asarray(point.coords, dtype=float)
+        matrix = self.pointset.rows(rows)
+        # Equal points are not counted, as in `Metric.gather`
+        metric.counter += int(numpy.count_nonzero((matrix != coords).any(axis=1)))
+        return metric.distances(coords, matrix)
+
+    def cell(self, node, inner):
+        """
+        Returns the rows in the inner or the outer cell of a node, and drops the rows that have left the cell.
+        
+        Parameters:
+        ----------
+        node : Node
+            A node in the net-tree.
+        inner : bool
+            Whether the inner or the outer cell is read.
+            
+        Returns:
+        -------
+        numpy.ndarray
+            The rows in the cell.
+        """
+        number = self.numbers.get(node)
+        rows = self.cells[number][0 if inner else 1] if number is not None else ()
+        if len(rows) == 0: return numpy.zeros(0, dtype=numpy.int64)
+        current = numpy.frombuffer(rows, dtype=numpy.int64)
+        current = current[(self.center[current] == number) & (self.inner[current] == inner)]
+        # A row that came back to the cell is in it more than once
+        if len(current) > 1: current = numpy.unique(current)
+        if len(current) < len(rows):
+            del rows[:]
+            rows.frombytes(current.tobytes())
+        return current
+
+    def cells_of(self, nodes, inner):
+        """
+        Returns the rows in the inner or the outer cells of given nodes. The cells are read in one 
+        batch, and only the cells with rows that have left them are compacted one by one.
+        """
+        if isinstance(nodes, Node): return self.cell(nodes, inner)
+        side = 0 if inner else 1
+        numbers = [self.numbers.get(node) for node in nodes]
+        numbers = [number for number in numbers if number is not None and len(self.cells[number][side]) > 0]
+        if len(numbers) == 0: return numpy.zeros(0, dtype=numpy.int64)
+        sizes = [len(self.cells[number][side]) for number in numbers]
+        rows = numpy.concatenate([numpy.frombuffer(self.cells[number][side], dtype=numpy.int64) for number in numbers])
+        live = (self.center[rows] == numpy.repeat(numpy.array(numbers, dtype=numpy.int64), sizes)) & (self.inner[rows] == inner)
+        if not live.all():
+            counts = numpy.add.reduceat(live, numpy.cumsum([0] + sizes[:-1]))
+            for number, size, count in zip(numbers, sizes, counts.tolist()):
+                if count < size: self.cell(self.nodes[number], inner)
+        # Every row is in one cell of one node, so only rows that came back to a cell repeat
+        return numpy.unique(rows[live])
+
+    def rnn_in(self, nodes):
+        """
+        Returns the rows of the uninserted points in the inner cell of given nodes.
+        """
+        return self.cells_of(nodes, True)
+
+    def rnn_out(self, nodes):
+        """
+        Returns the rows of the uninserted points in the outer cell of given nodes.
+        """
+        return self.cells_of(nodes, False)
+
+    def rnn(self, nodes):
+        """
+        Returns the rows of the uninserted points in both the inner and the outer cells of given nodes.
+        """
+        return numpy.concatenate([self.rnn_in(nodes), self.rnn_out(nodes)])
+
+    def nn(self, point):
+        """
+        Returns the center of an uninserted point.
+        """
+        return self.nodes[self.center[self.row(point)]]
+
+    def nndist(self, point, nn = None):
+        """
+        Returns the distance of point to its center, as in `SNTPointLocation`.
+        """
+        return self.rowdist(self.row(point), nn)
+
+    def rowdist(self, row, nn = None):
+        todist = self.dist[row]
+        return float(todist) if todist > 0 else dist(nn or self.nodes[self.center[row]], self.view(row))
+
+    def removepoint(self, point):
+        """
+        Removes an uninserted point, which will be inserted to the tree later.
+        """
+        self.center[self.row(point)] = -1
+
+    def addpoints(self, points):
+        """
+        Registers new uninserted points in the cells of their centers, which are found for all 
+        of them in one grouped descent of the tree. The new points should be rows of the point 
+        set of the tracked points, unless no point was tracked yet.
+        
+        Parameters:
+        ----------
+        points : list
+            Points that are not in the tree and not yet registered.
+        """
+        if len(points) == 0: return
+        if self.pointset is None:
+            # The rows first go to the cell of the root, which they leave for their centers
+            self.track(points)
+        elif self.rowof is not None or any(getattr(p, 'pointset', None) is not self.pointset for p in points):
+            raise ValueError("ArrayPointLocation: new points should be rows of the point set of the uninserted points")
+        for point, (center, todist) in zip(points, ParallelPointLocation(self.tree, []).nnmany(points)):
+            self.changernn(self.row(point), center, todist)
+
+    def addnode(self, node):
+        """
+        Numbers a new node and creates its empty inner and outer cells.
+        """
+        if node not in self.numbers:
+            self.numbers[node] = len(self.nodes)
+            self.cells[len(self.nodes)] = (array('q'), array('q'))
+            self.nodes.append(node)
+            self.nodepids.append(node.point.pid)
+
+    def updateonremoval(self, node):
+        """
+        Moves the rows in the cells of a removing node to the cells of its parent, as in `SNTPointLocation`.
+        """
+        parent = node.par
+        self.addnode(parent)
+        outer, inner = self.cell(node, False), self.cell(node, True)
+        todist = numpy.array([self.rowdist(row, node) for row in outer.tolist()], dtype=numpy.float64)
+        toinner = todist <= self.tree.cp * (self.tree.tau ** (parent.level - 1)) / 2
+        number = self.numbers[parent]
+        self.center[outer] = number
+        self.dist[outer] = todist
+        self.inner[outer] = toinner
+        self.center[inner] = number
+        self.cells[number][0].frombytes(numpy.concatenate([inner, outer[toinner]]).tobytes())
+        self.cells[number][1].frombytes(outer[~toinner].tobytes())
+        number = self.numbers.pop(node)
+        del self.cells[number]
+        self.nodes[number] = None
+
+    def updateoninsertion(self, node):
+        """
+        Creates a new cell for the new node and updates the cells of its neighbors, as in `SNTPointLocation`.
+        """
+        self.addnode(node)
+        rows = self.rnn_out(rel(par(node)) | ch(rel(par(node))) | ch(rel(node)))
+        if len(rows) == 0: return
+        # The rows whose centers have other points and known distances are decided in one batch, 
+        # as `trytochangernn` would decide them, and the others one by one
+        nndist = self.dist[rows]
+        centers = self.center[rows]
+        batch = (nndist > 0) & (numpy.frombuffer(self.nodepids, dtype=numpy.int64)[centers] != node.point.pid)
+        for row in rows[~batch].tolist():
+            self.trytochangernn(row, node)
+        rows, nndist, centers = rows[batch], nndist[batch], centers[batch]
+        if len(rows) == 0: return
+        # As in `SNTPointLocation.scan`, the distances to the centers bound the distances to the node
+        numbers, inverse = numpy.unique(centers, return_inverse=True)
+        between = node.point.metric.dists(node.point, [self.nodes[number].point for number in numbers.tolist()])
+        radius = self.tree.cr * (self.tree.tau ** node.level)
+        lower = numpy.abs(between[inverse] - nndist) * (1 - 1e-9)
+        near = (lower <= radius) & (lower < nndist)
+        rows, nndist = rows[near], nndist[near]
+        todist = self.dists(node.point, rows)
+        move = (todist <= radius) & (todist < nndist)
+        self.moverows(rows[move], node, todist[move])
+
+    def updateonsplit(self, node):
+        """
+        Creates a new cell for the new inserted node, which splits a jump, from the cell of its parent.
+        """
+        self.addnode(node)
+        # The cells of the leaves or the nodes in level -\infty are always empty
+        if node.level != float('-inf'):
+            for row in self.rnn(par(node)).tolist():
+                self.trytochangernn(row, node)
+
+    def changernn(self, row, tonode, todist=None):
+        """
+        Changes the center of a row to a different node and adds the row to the cell of that node.
+        The row is dropped from the cell of its former center when that cell is read next.
+        """
+        todist = todist or dist(tonode, self.view(row))
+        if tonode not in self.numbers: self.addnode(tonode)
+        number = self.numbers[tonode]
+        toinner = todist <= self.tree.cp * (self.tree.tau ** (tonode.level - 1)) / 2
+        self.center[row] = number
+        self.dist[row] = todist
+        self.inner[row] = toinner
+        self.cells[number][0 if toinner else 1].append(row)
+
+    def moverows(self, rows, tonode, todist):
+        """
+        Changes the centers of many rows to one node, as `changernn` with known distances.
+        """
+        number = self.numbers[tonode]
+        toinner = todist <= self.tree.cp * (self.tree.tau ** (tonode.level - 1)) / 2
+        self.center[rows] = number
+        self.dist[rows] = todist
+        self.inner[rows] = toinner
+        self.cells[number][0].frombytes(rows[toinner].tobytes())
+        self.cells[number][1].frombytes(rows[~toinner].tobytes())
+
+    def trytochangernn(self, row, tonode, todist=None):
+        """
+        Determines whether a row should change its cells or not, as in `SNTPointLocation`.
+        """
+        fromnode = self.nodes[self.center[row]]
+        if fromnode.point == tonode.point:
+            todist = self.rowdist(row)
+        elif todist is None:
+            todist = dist(tonode, self.view(row))
+        # As `SNT.isrel` with the distance known, which needs no view of the row
+        if todist <= self.tree.cr * (self.tree.tau ** tonode.level):
+            if (fromnode.point == tonode.point and fromnode.level > tonode.level) or \
+                (fromnode.point != tonode.point and todist < self.rowdist(row)):
+                self.changernn(row, tonode, todist)
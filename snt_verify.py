@@ -1,4 +1,5 @@
 from node import Node, dist, rel
+from point import pointkey, coordtuple
 
 class SNTVerify:
     def __init__(self, T, points):
@@ -7,6 +8,13 @@ class SNTVerify:
         self.uncomplevels = dict()
         self.minlevels = dict()
         
+    def key(self, point):
+        # The given points may be equal to the points of the tree without being the same objects
+        registry = getattr(self.T, 'registry', None)
+        if registry is not None and point.registry is not registry:
+            point = registry.lookup(point, coordtuple(point)) or point
+        return pointkey(point)
+
     def populate(self):
         self.finduncomplevels()
         self.findminlevelrels()
@@ -75,7 +83,7 @@ class SNTVerify:
                     continue
                 relno = 0
                 for n2 in self.uncomplevels[level] - {n1}:                    
-                    if self.minlevels[(n1.point, n2.point)] <= level:
+                    if self.minlevels[(self.key(n1.point), self.key(n2.point))] <= level:
                         relno += 1
                 if (relno == 0 and n1.level == level and len(n1.par.ch) == 1) or (relno > 0 and n1.level != level):
                     print('Violates Semi-compressed condition')
@@ -86,7 +94,7 @@ class SNTVerify:
         for level in self.uncomplevels:
             for n1 in self.uncomplevels[level]:
                 for n2 in self.uncomplevels[level] - {n1}:
-                    if self.minlevels[(n1.point, n2.point)] <= level and (n1 not in n2.rel or n2 not in n1.rel):
+                    if self.minlevels[(self.key(n1.point), self.key(n2.point))] <= level and (n1 not in n2.rel or n2 not in n1.rel):
                         print('Relatives are not correct')
                         return False
         return True
@@ -116,6 +124,6 @@ class SNTVerify:
         self.minlevels = dict()
         for p1 in self.points:
             for p2 in self.points:
-                self.minlevels[(p1, p2)] = float('-inf') if p1 == p2 else self.T.minlevelrelatives(Node(p1,0), p2)
+                self.minlevels[(self.key(p1), self.key(p2))] = float('-inf') if p1 == p2 else self.T.minlevelrelatives(Node(p1,0), p2)
         return self.minlevels
         
@@ -99,5 +99,16 @@ class TestNode(unittest.TestCase):
         b = Node(Point([4, 6], Euclidean()), 2)
         self.assertEqual(dist(a, b), 5)
 
+    def testeqandhash(self):
+        a = Node(Point([1, 2], Euclidean()), 2)
+        b = Node(Point([1, 2], Euclidean()), 2)
+        c = Node(a.point, 3)
+        self.assertEqual(a, b)
+        self.assertEqual(hash(a), hash(b))
+        self.assertNotEqual(a, c)
+        self.assertNotEqual(a, Node(Point([2, 1], Euclidean()), 2))
+        self.assertEqual(len({a, b, c}), 2)
+        self.assertFalse(hasattr(a, '__dict__'))
+
 if __name__ == '__main__':
     unittest.main()
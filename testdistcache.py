@@ -0,0 +1,91 @@
+import unittest
+from distcache import LRUCache, ClockCache, makecache, pairkey
+from point import Point, PointRegistry
+from metric import Euclidean
+
+
+class TestDistCache(unittest.TestCase):
+    def testlru(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual((cache.hits, cache.misses, cache.evictions), (3, 1, 1))
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual((cache.hits, cache.misses, cache.evictions), (0, 0, 0))
+
+    def testclock(self):
+        cache = ClockCache(3)
+        for key, dist in zip('abc', [1, 2, 3]):
+            cache.put(key, dist)
+        # The first sweep clears every reference bit and evicts the oldest entry
+        cache.put('d', 4)
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(cache.get('b'), 2)
+        # 'b' is referenced again, so 'c' is the next victim
+        cache.put('e', 5)
+        self.assertEqual(cache.get('c'), None)
+        self.assertEqual(cache.get('b'), 2)
+        self.assertEqual(cache.get('d'), 4)
+        self.assertEqual(cache.get('e'), 5)
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(cache.evictions, 2)
+
+    def testunbounded(self):
+        for policy in ['lru', 'clock']:
+            cache = makecache(policy)
+            for i in range(100): cache.put(i, i)
+            self.assertEqual(len(cache), 100)
+            self.assertEqual(cache.evictions, 0)
+        self.assertRaises(ValueError, makecache, 'fifo')
+        self.assertRaises(ValueError, makecache, 'lru', 0)
+
+    def testpairkey(self):
+        metric = Euclidean()
+        p, q = Point([0, 1], metric), Point([2, 3], metric)
+        self.assertEqual(pairkey(p, q), pairkey(q, p))
+        self.assertEqual(pairkey(p, q), pairkey(Point([2, 3], metric), Point([0, 1], metric)))
+        # Points with equal hashes are ordered by their coordinates
+        p, q = Point([-1, 0], metric), Point([-2, 0], metric)
+        self.assertEqual(hash(p), hash(q))
+        self.assertEqual(pairkey(p, q), pairkey(q, p))
+        self.assertEqual(pairkey(p, q), (q, p))
+        r = PointRegistry().intern(Point([5, 5], metric))
+        self.assertEqual(pairkey(r, p), pairkey(p, r))
+
+    def testcachecollisions(self):
+        metric = Euclidean(cachedist=True)
+        p, q = Point([-1, 0], metric), Point([-2, 0], metric)
+        self.assertEqual(p.distto(q), 1)
+        self.assertEqual(q.distto(p), 1)
+        self.assertEqual(metric.cache.hits, 1)
+        self.assertEqual(metric.counter, 1)
+
+    def testmetriccache(self):
+        for policy in ['lru', 'clock']:
+            metric = Euclidean(cachedist=True, cachesize=2, cachepolicy=policy)
+            p, q, r = Point([0, 0], metric), Point([3, 4], metric), Point([12, 5], metric)
+            self.assertEqual(p.distto(q), 5)
+            self.assertEqual(q.distto(p), 5)
+            self.assertEqual(p.distto(p), 0)
+            self.assertEqual(metric.counter, 1)
+            self.assertEqual((metric.hits, metric.misses), (1, 1))
+            p.distto(r)
+            q.distto(r)
+            self.assertEqual(metric.evictions, 1)
+            self.assertEqual(len(metric.cache), 2)
+            metric.reset()
+            self.assertEqual((metric.counter, metric.hits, metric.misses, metric.evictions), (0, 0, 0, 0))
+            self.assertEqual(len(metric.cache), 0)
+        metric = Euclidean()
+        self.assertTrue(metric.cache is None)
+        self.assertEqual((metric.hits, metric.misses, metric.evictions), (0, 0, 0))
+
+if __name__ == '__main__':
+    unittest.main()
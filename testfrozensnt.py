@@ -0,0 +1,108 @@
+import os
+import unittest
+import random
+import tempfile
+import numpy
+from snt import SNT
+from point import Point
+from metric import Euclidean
+from frozensnt import FrozenSNT
+from snt_pointlocation import SNTPointLocation
+from pointlocation import ParallelPointLocation
+
+
+class TestFrozenSNT(unittest.TestCase):
+    def setUp(self):
+        self.metric = Euclidean()
+        points = [Point([random.randint(-1000, 1000) for _ in range(2)], self.metric) for _ in range(200)]
+        self.points = list(set(points))
+        self.T = SNT(7, 1, 1)
+        self.T.construct(self.points, SNTPointLocation)
+        self.F = self.T.freeze()
+
+    def teststructure(self):
+        F = self.F
+        self.assertTrue(isinstance(F, FrozenSNT))
+        self.assertEqual(len(F.points), len(self.points))
+        self.assertEqual(F.parent[0], -1)
+        self.assertEqual(F.level[0], float('inf'))
+        self.assertEqual(len(F.children(0)), 1)
+        self.assertEqual(F.chptr[-1], len(F) - 1)
+        self.assertEqual(sum(F.level == float('-inf')), len(self.points))
+        for node in range(1, len(F)):
+            self.assertTrue(node in F.children(F.parent[node]))
+            self.assertTrue(node in F.relatives(node))
+            for other in F.relatives(node):
+                self.assertEqual(F.level[other], F.level[node])
+                self.assertTrue(node in F.relatives(other))
+        self.assertEqual({F.points[int(i)] for i in F.nodepoint}, set(self.points))
+
+    def testqueries(self):
+        for _ in range(20):
+            query = Point([random.randint(-1000, 1000) for _ in range(2)], self.metric)
+            self.assertEqual([d for _, d in self.F.knn(query, 5)], [d for _, d in self.T.knn(query, 5)])
+            p, dst = self.F.nn(query)
+            self.assertEqual(dst, min(query.distto(other) for other in self.points))
+            self.assertEqual(query.distto(p), dst)
+            self.assertEqual(set(self.F.range(query, 300)), set(self.T.range(query, 300)))
+        self.assertEqual(self.F.knn(query, 0), [])
+
+    def testcachedmetric(self):
+        # A caching metric takes the points instead of the coordinate matrix and counts the same distances
+        cached = Euclidean(cachedist=True)
+        for _ in range(10):
+            coords = [random.randint(-1000, 1000) for _ in range(2)]
+            self.metric.counter, cached.counter = 0, 0
+            result = self.F.knn(Point(coords, self.metric), 5)
+            self.assertEqual(self.F.knn(Point(coords, cached), 5), result)
+            self.assertEqual(cached.counter, self.metric.counter)
+
+    def testsinglepoint(self):
+        T = SNT(7, 1, 1)
+        T.construct([Point([1, 1], self.metric)], SNTPointLocation)
+        F = T.freeze()
+        self.assertEqual(F.nn(Point([4, 5], self.metric))[1], 5)
+        self.assertEqual(len(F.range(Point([4, 5], self.metric), 5)), 1)
+
+    def testinsertfreeze(self):
+        T = SNT(7, 1, 1)
+        T.construct(self.points[:90], ParallelPointLocation)
+        for p in self.points[90:100] + self.points[:3]:
+            T.insert(p)
+        T.delete(self.points[50])
+        F = T.freeze()
+        remaining = [p for p in self.points[:100] if p is not self.points[50]]
+        self.assertEqual(len(F.points), len(remaining))
+        self.assertEqual(set(F.points), set(remaining))
+        query = Point([random.randint(-1000, 1000) for _ in range(2)], self.metric)
+        self.assertEqual([d for _, d in F.knn(query, 5)], [d for _, d in T.knn(query, 5)])
+
+    def testempty(self):
+        F = SNT(7, 1, 1).freeze()
+        self.assertEqual(len(F), 0)
+        self.assertEqual(len(F.points), 0)
+        query = Point([1, 1], self.metric)
+        self.assertEqual(F.knn(query, 3), [])
+        self.assertEqual(F.nn(query), None)
+        self.assertEqual(F.range(query, 10), [])
+
+    def testsaveload(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'tree.snt')
+            self.F.save(path)
+            for mmap in [True, False]:
+                F = FrozenSNT.load(path, mmap)
+                self.assertTrue(isinstance(F.points.metric, Euclidean))
+                self.assertEqual(F.cr, self.F.cr)
+                for name, array in self.F.arrays().items():
+                    self.assertTrue(numpy.array_equal(F.arrays()[name], array))
+                self.assertEqual(F.points.coords.flags['WRITEABLE'], not mmap)
+                query = Point([random.randint(-1000, 1000) for _ in range(2)], self.metric)
+                self.assertEqual(F.knn(query, 5), self.F.knn(query, 5))
+                del F
+            with open(path, 'r+b') as f:
+                f.write(b'NOTATREE')
+            self.assertRaises(ValueError, FrozenSNT.load, path)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+import random
+import numpy
+from metric import Euclidean, Manhattan, LInfinity
+from point import Point
+from pointset import PointSet
+
+
+class TestMetric(unittest.TestCase):
+    def testdists(self):
+        for metric in [Euclidean(), Manhattan(), LInfinity()]:
+            p = Point([0, 0], metric)
+            others = [Point(c, metric) for c in [[3, 4], [0, 0], [12, 5], [-1, 1]]]
+            dsts = metric.dists(p, others)
+            self.assertEqual(metric.counter, 3)
+            self.assertEqual(list(dsts), [metric.distance(p, q) for q in others])
+            self.assertEqual(len(metric.dists(p, [])), 0)
+
+    def testdistsonpointset(self):
+        metric = Euclidean()
+        S = PointSet([[0, 0], [3, 4], [12, 5], [0, 0]], metric)
+        self.assertEqual(list(metric.dists(S[0], list(S))), [0, 5, 13, 0])
+        self.assertEqual(metric.counter, 2)
+        self.assertEqual(list(metric.dists(S[0], [Point([3, 4], metric), S[2]])), [5, 13])
+
+    def testdistsonmatrix(self):
+        for metric in [Euclidean(), Manhattan(), LInfinity()]:
+            p = Point([0, 0], metric)
+            matrix = numpy.array([[3, 4], [0, 0], [12, 5]], dtype=float)
+            self.assertEqual(list(metric.dists(p, matrix)), list(metric.dists(p, [Point(list(c), metric) for c in matrix])))
+            self.assertEqual(metric.counter, 4)
+        self.assertRaises(TypeError, Euclidean(cachedist=True).dists, p, matrix)
+
+    def testdistscached(self):
+        metric = Euclidean(cachedist=True)
+        p = Point([0, 0], metric)
+        others = [Point([3, 4], metric), Point([12, 5], metric)]
+        self.assertEqual(list(metric.dists(p, others)), [5, 13])
+        self.assertEqual(list(metric.dists(p, others)), [5, 13])
+        self.assertEqual(metric.counter, 2)
+
+    def testdistmatrix(self):
+        for metric in [Euclidean(), Manhattan(), LInfinity(), Euclidean(cachedist=True)]:
+            firsts = [Point(c, metric) for c in [[0, 0], [3, 4]]]
+            others = [Point(c, metric) for c in [[3, 4], [0, 0], [12, 5], [-1, 1]]]
+            for rows, cols in [(firsts, others), (others, firsts)]:
+                metric.reset()
+                matrix = metric.distmatrix(rows, cols)
+                self.assertEqual(matrix.shape, (len(rows), len(cols)))
+                self.assertEqual(matrix.tolist(), [[metric.distance(p, q) for q in cols] for p in rows])
+                # The cache computes the symmetric pair of [0, 0] and [3, 4] only once
+                self.assertEqual(metric.counter, 5 if metric.cachedist else 6)
+            self.assertEqual(metric.distmatrix(firsts, []).shape, (2, 0))
+
+    def testargmin(self):
+        metric = Manhattan()
+        p = Point([0, 0], metric)
+        others = [Point(c, metric) for c in [[3, 4], [1, 2], [12, 5], [2, 1]]]
+        self.assertEqual(metric.argmin(p, others), (1, 3))
+        self.assertEqual(metric.counter, 4)
+        self.assertRaises(ValueError, metric.argmin, p, [])
+
+    def testwithin(self):
+        for metric in [Euclidean(), Manhattan(), LInfinity()]:
+            for dim in [2, 100]:
+                points = [Point([random.randint(-5, 5) for _ in range(dim)], metric) for _ in range(20)]
+                S = PointSet([list(p.coords) for p in points], metric)
+                for p, v in zip(points, S):
+                    for q, w in zip(points, S):
+                        for radius in [0, 3, 7.5, 40]:
+                            isnear = metric.getdist(p, q) <= radius
+                            self.assertEqual(metric.within(p, q, radius), isnear)
+                            self.assertEqual(metric.within(v, w, radius), isnear)
+
+    def testwithincounter(self):
+        metric = Euclidean()
+        p, q = Point([0, 0], metric), Point([3, 4], metric)
+        self.assertTrue(metric.within(p, q, 5))
+        self.assertFalse(metric.within(p, q, 4.9))
+        self.assertTrue(metric.within(p, Point([0, 0], metric), 0))
+        self.assertEqual(metric.counter, 2)
+        metric = Euclidean(cachedist=True)
+        p, q = Point([0, 0], metric), Point([3, 4], metric)
+        self.assertTrue(metric.within(p, q, 5))
+        self.assertFalse(metric.within(q, p, 1))
+        self.assertEqual((metric.counter, metric.hits), (1, 1))
+
+    def testwithinmask(self):
+        for metric in [Euclidean(), Manhattan(), LInfinity(), Euclidean(cachedist=True)]:
+            p = Point([0, 0], metric)
+            others = [Point(c, metric) for c in [[3, 4], [0, 0], [12, 5], [-1, 1]]]
+            self.assertEqual(list(metric.withinmask(p, others, 5)), [metric.getdist(p, q) <= 5 for q in others])
+            self.assertEqual(len(metric.withinmask(p, [], 5)), 0)
+
+if __name__ == '__main__':
+    unittest.main()
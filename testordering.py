@@ -0,0 +1,59 @@
+import unittest
+import random
+import warnings
+from ordering import insertionorder, mortonorder, hilbertorder, greedyorder, randomorder
+from point import Point
+from pointset import PointSet
+from metric import Euclidean
+
+
+class TestOrdering(unittest.TestCase):
+    def testmortonorder(self):
+        metric = Euclidean()
+        points = [Point([x, y], metric) for y in range(2) for x in range(2)]
+        self.assertEqual(list(mortonorder(points)), [0, 2, 1, 3])
+
+    def testhilbertorder(self):
+        metric = Euclidean()
+        for dim, side in [(2, 16), (3, 4)]:
+            points = PointSet([[(i // side ** j) % side for j in range(dim)] for i in range(side ** dim)], metric)
+            perm = list(hilbertorder(list(points)))
+            self.assertEqual(sorted(perm), list(range(len(points))))
+            # Consecutive cells of the curve are adjacent
+            for a, b in zip(perm, perm[1:]):
+                self.assertEqual(sum(abs(points[a][j] - points[b][j]) for j in range(dim)), 1)
+
+    def testgreedyorder(self):
+        metric = Euclidean()
+        points = [Point([0, 0], metric), Point([1, 1], metric), Point([1000, 1000], metric),
+                  Point([1, 0], metric), Point([999, 999], metric)]
+        perm = list(greedyorder(points))
+        self.assertEqual(sorted(perm), list(range(5)))
+        # The first two points come from different clusters
+        self.assertEqual(len({perm[0] in {2, 4}, perm[1] in {2, 4}}), 2)
+        self.assertEqual(list(greedyorder(points[:1])), [0])
+
+    def testinsertionorder(self):
+        metric = Euclidean()
+        points = [Point([random.randint(-100, 100) for _ in range(3)], metric) for _ in range(50)]
+        for order in ['random', 'morton', 'hilbert', 'greedy', randomorder, lambda P: range(len(P))]:
+            self.assertEqual(sorted(insertionorder(points, order)), list(range(50)))
+        self.assertRaises(ValueError, insertionorder, points, 'unknown')
+        self.assertRaises(ValueError, insertionorder, points, lambda P: [0] * len(P))
+
+    def testhighdimension(self):
+        metric = Euclidean()
+        points = [Point([random.random() for _ in range(64)], metric) for _ in range(20)]
+        for order in [mortonorder, hilbertorder, greedyorder]:
+            self.assertRaises(ValueError, order, points)
+        for order in ['morton', 'hilbert', 'greedy']:
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always')
+                self.assertEqual(sorted(insertionorder(points, order)), list(range(20)))
+            self.assertEqual(len(caught), 1)
+            self.assertTrue(issubclass(caught[0].category, RuntimeWarning))
+        # 63 dimensions still fit one bit each
+        self.assertEqual(sorted(mortonorder([Point(list(p.coords)[:63], metric) for p in points])), list(range(20)))
+
+if __name__ == '__main__':
+    unittest.main()
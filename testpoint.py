@@ -1,5 +1,5 @@
 import unittest
-from point import Point, setMetric
+from point import Point, PointRegistry, setMetric, pointkey
 from metric import Euclidean, Manhattan, LInfinity
 
 
@@ -33,5 +33,47 @@ class TestPoint(unittest.TestCase):
         self.assertEqual(p.distto(r), 12)
         self.assertEqual(p.distto(q, r), 4)        
 
+    def testregistry(self):
+        registry = PointRegistry()
+        p = Point([1, 2], Euclidean())
+        q = Point([1, 2], Euclidean())
+        r = Point([3, 4], Euclidean())
+        self.assertEqual(pointkey(p), p)
+        self.assertTrue(registry.intern(p) is p)
+        self.assertTrue(registry.intern(q) is p)
+        self.assertTrue(registry.intern(r) is r)
+        self.assertEqual(q.pid, None)
+        self.assertNotEqual(p.pid, r.pid)
+        self.assertEqual(pointkey(p), p.pid)
+        self.assertTrue(p.registry is registry)
+        self.assertEqual(len(registry), 2)
+        self.assertTrue(q in registry)
+        self.assertFalse(Point([5, 6], Euclidean()) in registry)
+        # Points whose coordinate hashes collide are told apart by their coordinates
+        s, t = Point([-1], Euclidean()), Point([-2], Euclidean())
+        self.assertEqual(hash(s), hash(t))
+        self.assertTrue(registry.intern(s) is s)
+        self.assertTrue(registry.intern(t) is t)
+        self.assertTrue(registry.intern(Point([-2], Euclidean())) is t)
+        registry.remove(s)
+        self.assertFalse(s in registry)
+        self.assertTrue(t in registry)
+        registry.remove(t)
+        self.assertEqual(len(registry), 2)
+        # Equality and hashing stay consistent between registered and unregistered points
+        self.assertEqual(p, q)
+        self.assertEqual(hash(p), hash(q))
+        self.assertNotEqual(p, r)
+        # Editing the coordinates of a registered point does not change its hash or id
+        pid, h = p.pid, hash(p)
+        p.coords = [7, 7]
+        self.assertEqual((p.pid, hash(p)), (pid, h))
+        self.assertTrue(registry.intern(p) is p)
+        # A point keeps its id when it enters another registry
+        other = PointRegistry()
+        self.assertTrue(other.intern(r) is r)
+        self.assertEqual(r.pid, pointkey(r))
+        self.assertTrue(r.registry is other)
+
 if __name__ == '__main__':
     unittest.main()
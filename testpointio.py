@@ -0,0 +1,95 @@
+import os
+import unittest
+import random
+import tempfile
+import numpy
+from pointio import readcsv, writecsv, readnpy, writenpy, readraw, writeraw, readpoints, chunks, aspoints
+from pointset import PointSet
+from point import Point
+from metric import Euclidean
+from snt import SNT
+from snt_verify import SNTVerify
+from snt_pointlocation import SNTPointLocation
+
+
+class TestPointIO(unittest.TestCase):
+    def setUp(self):
+        self.metric = Euclidean()
+        self.coords = numpy.array([[random.uniform(-1000, 1000) for _ in range(3)] for _ in range(100)])
+        self.coords[0] = [1, 2, 3]
+        self.S = PointSet(self.coords, self.metric)
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def testcsv(self):
+        writecsv(self.path('points.csv'), self.S)
+        parts = list(readcsv(self.path('points.csv'), self.metric, chunksize=30))
+        self.assertEqual([len(p) for p in parts], [30, 30, 30, 10])
+        self.assertTrue(numpy.array_equal(aspoints(parts).coords, self.coords))
+        # Spaces and blank lines are accepted, as in files written by the old exporter
+        with open(self.path('old.csv'), 'w') as f:
+            f.write("1, 2.5\n3, 4\n\n")
+        imported = Point.importFrom(self.path('old.csv'), self.metric)
+        self.assertEqual(imported, [Point([1, 2.5], self.metric), Point([3, 4], self.metric)])
+        self.assertEqual([type(p) for p in imported], [Point, Point])
+        self.assertEqual(imported[1].coords, [3, 4])
+        imported[1].coords = [5, 6]
+        Point.exportTo(self.path('new.csv'), list(self.S))
+        self.assertTrue(numpy.array_equal(readpoints(self.path('new.csv'), self.metric).coords, self.coords))
+
+    def testnpy(self):
+        for points in [self.S, list(self.S), chunks(self.S, 40)]:
+            writenpy(self.path('points.npy'), points)
+            for mmap in [True, False]:
+                S = readnpy(self.path('points.npy'), self.metric, mmap)
+                self.assertTrue(numpy.array_equal(S.coords, self.coords))
+                self.assertEqual(S.coords.flags['WRITEABLE'], not mmap)
+                self.assertEqual(S.dedup, not mmap)
+                del S
+
+    def testnpyfloat32(self):
+        numpy.save(self.path('points.npy'), self.coords.astype(numpy.float32))
+        S = readnpy(self.path('points.npy'), self.metric)
+        # The coordinates stay in the file in their type, and are converted in batches
+        self.assertFalse(S.coords.flags['WRITEABLE'] or S.coords.flags['OWNDATA'])
+        self.assertEqual(S.coords.dtype, numpy.float32)
+        U = PointSet(self.coords.astype(numpy.float32).astype(float), self.metric)
+        self.assertEqual(S[3].coords.dtype, numpy.float64)
+        self.assertTrue(numpy.array_equal(S.rows([1, 2]), U.coords[[1, 2]]))
+        self.assertTrue(numpy.array_equal(self.metric.dists(S[0], list(S)), self.metric.dists(U[0], list(U))))
+        T, V = SNT(7, 1, 1), SNT(7, 1, 1)
+        T.construct(S, SNTPointLocation)
+        V.construct(U, SNTPointLocation)
+        self.assertEqual(sorted(T.all_nn()[2]), sorted(V.all_nn()[2]))
+        del S
+
+    def testraw(self):
+        writeraw(self.path('points.bin'), chunks(self.S, 7))
+        S = readpoints(self.path('points.bin'), self.metric, dim=3)
+        self.assertTrue(numpy.array_equal(S.coords, self.coords))
+        writeraw(self.path('points.f32'), self.S, dtype=numpy.float32)
+        S = readraw(self.path('points.f32'), self.metric, 3, numpy.float32)
+        self.assertTrue(numpy.allclose(S.coords, self.coords, atol=1e-3))
+        self.assertRaises(ValueError, readraw, self.path('points.bin'), self.metric, 7)
+
+    def testconstruct(self):
+        writecsv(self.path('points.csv'), self.S)
+        T = SNT(7, 1, 1)
+        queries = chunks(PointSet(self.coords[:10] + 0.5, self.metric), 4)
+        nearest = T.construct(readcsv(self.path('points.csv'), self.metric, chunksize=30), SNTPointLocation, queries)
+        self.assertEqual(len(T.points), 100)
+        self.assertEqual(len(nearest), 10)
+        ver = SNTVerify(T, T.points)
+        ver.populate()
+        self.assertTrue(ver.relativescorrect())
+        self.assertTrue(ver.islocalnettree())
+        self.assertTrue(ver.issemicompressed())
+        self.assertEqual(T.batch_nn(chunks(self.S, 30)), [(p, 0) for p in self.S])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+import numpy
+import random
+from pointset import PointSet, PointView
+from point import Point
+from metric import Euclidean
+from snt import SNT
+from snt_verify import SNTVerify
+from snt_pointlocation import SNTPointLocation
+from pointlocation import ParallelPointLocation, SinglePathPointLocation
+
+
+class TestPointSet(unittest.TestCase):
+    def testinit(self):
+        metric = Euclidean()
+        S = PointSet([[0, 1], [2, 3], [4, 5]], metric)
+        self.assertEqual(len(S), 3)
+        self.assertEqual(S.dim, 2)
+        self.assertEqual(S.coords.shape, (3, 2))
+        self.assertTrue(S.coords.flags['C_CONTIGUOUS'])
+        self.assertRaises(ValueError, PointSet, [1, 2, 3], metric)
+        # Float coordinates keep their type, and integer ones become float64
+        self.assertEqual(PointSet(numpy.ones((2, 2), dtype=numpy.float32), metric).coords.dtype, numpy.float32)
+        self.assertEqual(PointSet(numpy.ones((2, 2), dtype=numpy.int32), metric).coords.dtype, numpy.float64)
+
+    def testviews(self):
+        metric = Euclidean()
+        S = PointSet([[0, 1], [2, 3], [4, 5]], metric)
+        p = S[1]
+        self.assertTrue(isinstance(p, PointView))
+        self.assertTrue(p.pointset is S)
+        self.assertEqual(p.index, 1)
+        self.assertTrue(p.metric is metric)
+        self.assertEqual(p[0], 2)
+        self.assertEqual(p[1], 3)
+        self.assertEqual(S[-1].index, 2)
+        self.assertRaises(IndexError, S.__getitem__, 3)
+        self.assertEqual([q.index for q in S], [0, 1, 2])
+        self.assertFalse(hasattr(p, '__dict__'))
+
+    def testeqandhash(self):
+        metric = Euclidean()
+        S = PointSet([[0, 1], [2, 3], [0, 1]], metric)
+        self.assertEqual(S[0], S[0])
+        self.assertEqual(S[0], S[2])
+        self.assertNotEqual(S[0], S[1])
+        self.assertEqual(S[1], Point([2, 3], metric))
+        self.assertEqual(Point([2, 3], metric), S[1])
+        self.assertEqual(hash(S[1]), hash(Point([2, 3], metric)))
+        self.assertEqual(len({S[0], S[1], S[2], Point([0, 1], metric)}), 2)
+
+    def testpointids(self):
+        S = PointSet([[0, 1], [2, 3], [0, 1]], Euclidean())
+        self.assertEqual(S[0].pid, S[2].pid)
+        self.assertNotEqual(S[0].pid, S[1].pid)
+        self.assertEqual(S[1].pid, S[1].pid)
+        self.assertTrue(S[0].registry is S)
+        T = PointSet([[0, 1]], Euclidean())
+        self.assertNotEqual(T[0].pid, S[0].pid)
+        self.assertEqual(T[0], S[0])
+
+    def testdedup(self):
+        metric = Euclidean()
+        S = PointSet([[0, 1], [2, 3], [0, 1]], metric, dedup=False)
+        self.assertNotEqual(S[0].pid, S[2].pid)
+        self.assertEqual(S[0], S[2])
+        self.assertNotEqual(S[0], S[1])
+        self.assertEqual(hash(S[0]), hash(S[2]))
+        self.assertEqual(len({S[0], S[1], S[2]}), 2)
+        T = SNT(7, 1, 1)
+        p, q = S[2], S[0]
+        self.assertTrue(T.registry.intern(p) is p)
+        self.assertTrue(T.registry.intern(q) is p)
+
+    def testdistto(self):
+        metric = Euclidean()
+        S = PointSet([[0, 0], [3, 4], [12, 5]], metric)
+        self.assertEqual(S[0].distto(S[1]), 5)
+        self.assertEqual(S[0].distto(S[1], S[2]), 5)
+        self.assertEqual(S[0].distto(Point([12, 5], metric)), 13)
+
+    def testfrompoints(self):
+        metric = Euclidean()
+        points = [Point([x, 2 * x], metric) for x in range(5)]
+        S = PointSet.frompoints(points)
+        self.assertTrue(S.metric is metric)
+        self.assertEqual(list(S), points)
+
+    def testconstruct(self):
+        coords = {(random.randint(-1000, 1000), random.randint(-1000, 1000)) for _ in range(100)}
+        for PL in [SNTPointLocation, ParallelPointLocation, SinglePathPointLocation]:
+            S = PointSet(sorted(coords), Euclidean())
+            T = SNT(7, 1, 1)
+            T.construct(S, PL)
+            ver = SNTVerify(T, list(S))
+            ver.populate()
+            self.assertTrue(ver.relativescorrect())
+            self.assertTrue(ver.islocalnettree())
+            self.assertTrue(ver.issemicompressed())
+
+if __name__ == '__main__':
+    unittest.main()
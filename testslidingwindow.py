@@ -0,0 +1,59 @@
+import unittest
+import random
+from slidingwindow import SlidingWindowSNT
+from point import Point
+from metric import Euclidean
+from snt_verify import SNTVerify
+
+
+class TestSlidingWindowSNT(unittest.TestCase):
+    def testinit(self):
+        self.assertRaises(ValueError, SlidingWindowSNT, 7, 1, 1)
+        self.assertRaises(ValueError, SlidingWindowSNT, 7, 1, 1, size=10, budget=0)
+        W = SlidingWindowSNT(7, 1, 1, size=10)
+        self.assertEqual(len(W), 0)
+        self.assertEqual(W.knn(Point([0, 0], Euclidean()), 1), [])
+        self.assertEqual(W.nn(Point([0, 0], Euclidean())), None)
+
+    def testsize(self):
+        metric = Euclidean()
+        W = SlidingWindowSNT(7, 1, 1, size=30)
+        points = [Point([random.randint(-1000, 1000) for _ in range(2)], metric) for _ in range(200)]
+        points = list(set(points))
+        for t, p in enumerate(points):
+            W.insert(p, now=t)
+            self.assertLessEqual(len(W), 30)
+            if t % 20 == 19:
+                recent = points[max(t - 29, 0):t + 1]
+                ver = SNTVerify(W.tree, recent)
+                ver.populate()
+                self.assertTrue(ver.relativescorrect())
+                self.assertTrue(ver.islocalnettree())
+                self.assertTrue(ver.issemicompressed())
+                self.assertEqual(set(W.tree.pointsbelow(W.tree.root)), set(recent))
+                query = Point([random.randint(-1000, 1000) for _ in range(2)], metric)
+                self.assertEqual(W.nn(query, now=t)[1], min(query.distto(p) for p in recent))
+        self.assertEqual(len(W.tree.registry), 30)
+        # The tree of the window can be frozen at any time
+        F = W.tree.freeze()
+        self.assertEqual(set(F.points), set(points[-30:]))
+        query = Point([random.randint(-1000, 1000) for _ in range(2)], metric)
+        self.assertEqual(F.nn(query)[1], min(query.distto(p) for p in points[-30:]))
+
+    def testduration(self):
+        metric = Euclidean()
+        W = SlidingWindowSNT(7, 1, 1, duration=10, budget=1)
+        points = [Point([random.randint(-100, 100)], metric) for _ in range(100)]
+        for t, p in enumerate(points):
+            W.insert(p, now=t)
+        # The budget defers some expired points until the next query
+        self.assertLessEqual(len(W), 12)
+        self.assertEqual(sorted(W.range(Point([0], metric), 1000, now=99), key=lambda p: p[0]),
+                         sorted(set(points[-11:]), key=lambda p: p[0]))
+        self.assertEqual(len(W), 11)
+        self.assertEqual(W.knn(Point([0], metric), 5, now=1000), [])
+        W.insert(points[0], now=1001)
+        self.assertEqual(W.nn(points[0], now=1001), (points[0], 0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,14 @@
+import os
+import sys
 import unittest
+import tempfile
 from snt import SNT
 from point import Point
-from metric import Euclidean
+from metric import Euclidean, Manhattan
 from node import Node
 from snt_verify import SNTVerify
 import random
+from snt_pointlocation import SNTPointLocation
 # from snt_pointlocation import SNTPointLocation as PL
 from pointlocation import SinglePathPointLocation as PL
 
@@ -262,5 +266,558 @@ class TestSNT(unittest.TestCase):
         T.cp = (tau - 3) / (2 * (tau - 1))
         self.assertTrue(ver.isglobalnettree())
 
+    def testconstructregisterspoints(self):
+        metric = Euclidean()
+        points = [Point([x], metric) for x in [0, 2, 11, 28, 30]]
+        T = SNT(5, 1, 1)
+        T.construct(points, PL)
+        self.assertEqual(len({p.pid for p in points}), len(points))
+        self.assertTrue(all(p.registry is T.registry for p in points))
+        self.assertEqual(len(T.registry), len(points))
+        self.assertTrue(all(n.point is T.root.point for n in [T.root, T.root.getchild()]))
+
+    def testconstructwithduplicates(self):
+        metric = Euclidean()
+        distinct = [Point([random.randint(-1000, 1000) for _ in range(2)], metric) for _ in range(100)]
+        distinct = list(set(distinct))
+        records = [Point(list(random.choice(distinct).coords), metric) for _ in range(500)] + distinct
+        random.shuffle(records)
+        for pointlocation in [SNTPointLocation, PL]:
+            T = SNT(7, 1, 1)
+            metric.reset()
+            T.construct(records, pointlocation)
+            self.assertEqual(len(T.points), len(distinct))
+            self.assertEqual(T.records, len(records))
+            ver = SNTVerify(T, T.points)
+            ver.populate()
+            self.assertTrue(ver.relativescorrect())
+            self.assertTrue(ver.islocalnettree())
+            self.assertTrue(ver.issemicompressed())
+            for p in distinct:
+                copies = [i for i, q in enumerate(records) if q == p]
+                self.assertEqual(T.duplicates(p), copies)
+                self.assertEqual(T.multiplicity(p), len(copies))
+            self.assertEqual(T.multiplicity(Point([.5, .5], metric)), 0)
+            
+            # A copy is inserted without computing any distance
+            metric.reset()
+            T.insert(Point(list(distinct[0].coords), metric))
+            self.assertEqual(metric.counter, 0)
+            self.assertEqual(T.duplicates(distinct[0])[-1], len(records))
+            self.assertEqual(T.minlevelrelatives(T.root, T.root.point), float('-inf'))
+            
+            query = Point([.5, .5], metric)
+            result = T.knn(query, 10, withduplicates=True)
+            self.assertEqual(len(result), 10)
+            self.assertEqual([d for _, d, _ in result], sorted(query.distto(p) for p in records + [distinct[0]])[:10])
+            self.assertEqual(len({i for _, _, i in result}), 10)
+            self.assertTrue(all(query.distto(records[i]) == d for _, d, i in result if i < len(records)))
+            inside = T.range(query, 300, withduplicates=True)
+            self.assertEqual(sorted(i for _, i in inside), [i for i, p in enumerate(records + [distinct[0]]) if query.distto(p) <= 300])
+            
+    def testconstruct_greedy(self):
+        metric = Euclidean()
+        points = [Point([random.randint(-1000, 1000) for _ in range(2)], metric) for _ in range(100)]
+        points = list(set(points))
+        T = SNT(7, 1, 1)
+        order, preds, radii = T.construct_greedy(points + points[:3])
+        self.assertEqual(order[0], points[0])
+        self.assertEqual(set(order), set(points))
+        self.assertEqual(len(order), len(points))
+        self.assertEqual((preds[0], radii[0]), (-1, float('inf')))
+        for i in range(1, len(order)):
+            self.assertEqual(radii[i], max(min(p.distto(q) for q in order[:i]) for p in order[i:]))
+            self.assertEqual(radii[i], order[i].distto(order[preds[i]]))
+            self.assertLess(preds[i], i)
+        self.assertEqual(T.multiplicity(points[1]), 2)
+        ver = SNTVerify(T, points)
+        ver.populate()
+        self.assertTrue(ver.relativescorrect())
+        self.assertTrue(ver.islocalnettree())
+        self.assertTrue(ver.issemicompressed())
+
+    def testconstruct_from_greedy(self):
+        metric = Euclidean()
+        points = [Point([random.randint(-1000, 1000) for _ in range(2)], metric) for _ in range(200)]
+        points = list(set(points))
+        order, preds, radii = SNT(7, 1, 1).construct_greedy(points)
+        metric.reset()
+        SNT(7, 1, 1).construct(points, SNTPointLocation)
+        constructcount = metric.counter
+        metric.reset()
+        T = SNT(7, 1, 1)
+        T.construct_from_greedy(order, preds, radii)
+        self.assertLess(metric.counter, constructcount)
+        self.assertEqual(T.points, order)
+        ver = SNTVerify(T, points)
+        ver.populate()
+        self.assertTrue(ver.relativescorrect())
+        self.assertTrue(ver.islocalnettree())
+        self.assertTrue(ver.issemicompressed())
+        # The tree still accepts insertions after the fast path
+        extra = Point([2000, 2000], metric)
+        T.insert(extra)
+        self.assertEqual(T.knn(extra, 1), [(extra, 0)])
+        
+        points = [Point([x], metric) for x in [0, 1, 100]]
+        self.assertRaises(ValueError, SNT(7, 1, 1).construct_from_greedy, points, [-1, 0, 1], [float('inf'), 1, 99])
+
+    def testconstructwithorder(self):
+        metric = Euclidean()
+        points = [Point([random.randint(-1000, 1000) for _ in range(2)], metric) for _ in range(100)]
+        points += points[:5]
+        for order in ['random', 'morton', 'hilbert', 'greedy', lambda P: reversed(range(len(P)))]:
+            T = SNT(7, 1, 1)
+            T.construct(points, SNTPointLocation, order=order)
+            ver = SNTVerify(T, list(set(points)))
+            ver.populate()
+            self.assertTrue(ver.relativescorrect())
+            self.assertTrue(ver.islocalnettree())
+            self.assertTrue(ver.issemicompressed())
+            self.assertEqual(T.duplicates(points[0]), [0, 100])
+        self.assertEqual(T.root.point, points[-1])
+        T = SNT(7, 1, 1)
+        T.construct(points, SNTPointLocation, order=lambda P: range(len(P)))
+        self.assertEqual(T.root.point, points[0])
+
+    def testgreedy_permutation(self):
+        metric = Euclidean()
+        points = [Point([random.randint(-1000, 1000) for _ in range(2)], metric) for _ in range(100)]
+        points = list(set(points))
+        T = SNT(7, 1, 1)
+        self.assertEqual(list(T.greedy_permutation()), [])
+        T.construct(points, SNTPointLocation)
+        perm = list(T.greedy_permutation())
+        self.assertEqual(perm[0], (T.root.point, float('inf')))
+        order = [p for p, _ in perm]
+        self.assertEqual(len(order), len(points))
+        self.assertEqual(set(order), set(points))
+        for i in range(1, len(order)):
+            self.assertGreaterEqual(perm[i][1], min(order[i].distto(q) for q in order[:i]))
+        
+    def testk_centers(self):
+        metric = Euclidean()
+        points = [Point([x, y], metric) for x in [0, 1000] for y in [0, 1000]]
+        points += [Point([x + dx, y + dy], metric) for x, y in [(0, 0), (1000, 1000)] for dx, dy in [(1, 0), (0, 1)]]
+        T = SNT(7, 1, 1)
+        T.construct(points, SNTPointLocation)
+        self.assertRaises(ValueError, T.k_centers, 0)
+        self.assertEqual(len(T.k_centers(3)), 3)
+        self.assertEqual(set(T.k_centers(100)), set(points))
+        centers = T.k_centers(4)
+        self.assertTrue(all(min(p.distto(c) for c in centers) <= 2 for p in points))
+        self.assertEqual(SNT(7, 1, 1).k_centers(3), [])
+        # The centers are the greedy order of Gonzalez from the point of the root
+        def gonzalez(points, first, k):
+            centers, dsts = [first], {p : p.distto(first) for p in points}
+            while len(centers) < k and max(dsts.values()) > 0:
+                farthest = max(points, key=dsts.get)
+                centers.append(farthest)
+                dsts = {p : min(d, p.distto(farthest)) for p, d in dsts.items()}
+            return centers
+        for dim in [1, 2, 3]:
+            points = list(set(Point([random.uniform(-1000, 1000) for _ in range(dim)], metric) for _ in range(150)))
+            T = SNT(7, 1, 1)
+            T.construct(points, SNTPointLocation)
+            for k in [1, 2, 5, 20, 149, 200]:
+                self.assertEqual(T.k_centers(k), gonzalez(points, T.root.point, k))
+
+    def testinsert_many(self):
+        metric = Euclidean()
+        points = [Point([random.randint(-1000, 1000) for _ in range(2)], metric) for _ in range(200)]
+        points = list(set(points))
+        T = SNT(7, 1, 1)
+        T.construct(points[:100], SNTPointLocation)
+        batch = points[100:] + [Point(list(p.coords), metric) for p in points[95:105]]
+        T.insert_many(batch)
+        self.assertEqual(set(T.points), set(points))
+        self.assertEqual(len(T.points), len(points))
+        self.assertEqual(T.records, 100 + len(batch))
+        self.assertEqual(T.multiplicity(points[97]), 2)
+        self.assertEqual(T.multiplicity(points[102]), 2)
+        ver = SNTVerify(T, points)
+        ver.populate()
+        self.assertTrue(ver.relativescorrect())
+        self.assertTrue(ver.islocalnettree())
+        self.assertTrue(ver.issemicompressed())
+        self.assertEqual(len(T.ploc._nn), 0)
+
+    def testinsert_manywithoutpointlocation(self):
+        metric = Euclidean()
+        points = [Point([random.randint(-1000, 1000) for _ in range(2)], metric) for _ in range(150)]
+        points = list(set(points))
+        T = SNT(7, 1, 1)
+        T.construct(points[:50], SNTPointLocation)
+        empty = SNT(7, 1, 1)
+        thawed = SNT.thaw(T.freeze(), T.points)
+        for U, expected in [(empty, points[50:]), (thawed, points)]:
+            U.insert_many(points[50:])
+            self.assertEqual(set(U.points), set(expected))
+            ver = SNTVerify(U, expected)
+            ver.populate()
+            self.assertTrue(ver.relativescorrect())
+            self.assertTrue(ver.islocalnettree())
+            self.assertTrue(ver.issemicompressed())
+            self.assertEqual(U.knn(points[60], 1), [(points[60], 0)])
+
+    def testmerge(self):
+        metric = Euclidean()
+        points = [Point([random.randint(-1000, 1000) for _ in range(2)], metric) for _ in range(200)]
+        points = list(set(points))
+        first, second = points[:110], points[100:]
+        T, U = SNT(7, 1, 1), SNT(7, 1, 1)
+        T.construct(first, SNTPointLocation)
+        U.construct(second + second[:3], SNTPointLocation)
+        T.merge(U)
+        ver = SNTVerify(T, points)
+        ver.populate()
+        self.assertTrue(ver.relativescorrect())
+        self.assertTrue(ver.islocalnettree())
+        self.assertTrue(ver.issemicompressed())
+        self.assertEqual(T.records, 110 + len(second) + 3)
+        self.assertEqual(set(T.points), set(points))
+        self.assertEqual(T.duplicates(points[100]), [100, 110, 110 + len(second)])
+        self.assertEqual(T.duplicates(points[-1]), [110 + len(second) - 1])
+        self.assertRaises(ValueError, T.merge, SNT(5, 1, 1))
+        
+        # Merging costs fewer distances than reinserting the points
+        counts = []
+        for merge in [SNT.merge, lambda T, U: T.insert_many(U.points)]:
+            T, U = SNT(7, 1, 1), SNT(7, 1, 1)
+            T.construct(first, SNTPointLocation)
+            U.construct([Point(list(p.coords), metric) for p in second], SNTPointLocation)
+            metric.reset()
+            merge(T, U)
+            counts.append(metric.counter)
+        self.assertLess(counts[0], counts[1])
+        
+        E = SNT(7, 1, 1)
+        E.merge(T)
+        self.assertTrue(E.root is T.root)
+        self.assertEqual(E.records, T.records)
+
+    def testthaw(self):
+        metric = Euclidean()
+        points = [Point([random.randint(-1000, 1000) for _ in range(2)], metric) for _ in range(100)]
+        points = list(set(points))
+        T = SNT(7, 1, 1)
+        T.construct(points, SNTPointLocation)
+        U = SNT.thaw(T.freeze(), T.points)
+        self.assertEqual(U.points, T.points)
+        def edges(tree):
+            nodes, stack = set(), [tree.root]
+            while stack:
+                node = stack.pop()
+                nodes.add((node.point, node.level, node.par and (node.par.point, node.par.level), len(node.rel)))
+                stack.extend(node.ch)
+            return nodes
+        self.assertEqual(edges(U), edges(T))
+        extra = Point([2000, 2000], metric)
+        U.insert(extra)
+        U.delete(points[0])
+        ver = SNTVerify(U, points[1:] + [extra])
+        ver.populate()
+        self.assertTrue(ver.relativescorrect())
+        self.assertTrue(ver.islocalnettree())
+        self.assertTrue(ver.issemicompressed())
+        self.assertEqual(U.knn(extra, 1), [(extra, 0)])
+        
+    def testsaveload(self):
+        metric = Manhattan()
+        points = [Point([random.randint(-1000, 1000) for _ in range(3)], metric) for _ in range(100)]
+        points = list(set(points))
+        T = SNT(7, 1, 1)
+        T.construct(points + points[:2], SNTPointLocation)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'tree.snt')
+            T.save(path)
+            for mmap in [True, False]:
+                U = SNT.load(path, mmap)
+                self.assertTrue(isinstance(U.root.point.metric, Manhattan))
+                self.assertEqual(set(U.points), set(points))
+                self.assertEqual(U.duplicates(points[1]), T.duplicates(points[1]))
+                self.assertEqual(U.records, T.records)
+                ver = SNTVerify(U, U.points)
+                ver.populate()
+                self.assertTrue(ver.relativescorrect())
+                self.assertTrue(ver.islocalnettree())
+                self.assertTrue(ver.issemicompressed())
+                query = Point([random.randint(-1000, 1000) for _ in range(3)], metric)
+                self.assertEqual([d for _, d in U.knn(query, 5)], [d for _, d in T.knn(query, 5)])
+                del U
+
+    def testinsertsave(self):
+        metric = Euclidean()
+        points = list(set(Point([random.randint(-1000, 1000) for _ in range(2)], metric) for _ in range(100)))
+        T = SNT(7, 1, 1)
+        T.construct(points[:90], PL)
+        for p in points[90:] + points[:2]:
+            T.insert(p)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'tree.snt')
+            T.save(path)
+            U = SNT.load(path, False)
+            self.assertEqual(set(U.points), set(points))
+            self.assertEqual(U.duplicates(points[0]), T.duplicates(points[0]))
+            self.assertEqual(U.duplicates(points[95]), T.duplicates(points[95]))
+            query = Point([random.randint(-1000, 1000) for _ in range(2)], metric)
+            self.assertEqual([d for _, d in U.knn(query, 5)], [d for _, d in T.knn(query, 5)])
+            # The loaded tree keeps growing
+            extra = Point([2000, 2000], metric)
+            U.insert(extra)
+            self.assertEqual(U.knn(extra, 1)[0][1], 0)
+            # An empty tree is saved and loaded empty
+            SNT(7, 1, 1).save(path)
+            U = SNT.load(path, False)
+            self.assertEqual(U.root, None)
+            self.assertEqual(U.knn(query, 3), [])
+
+    def testconstruct_parallel(self):
+        metric = Euclidean()
+        points = [Point([random.randint(-1000, 1000) for _ in range(2)], metric) for _ in range(300)]
+        points.append(Point(list(points[0].coords), metric))
+        T = SNT(7, 1, 1)
+        T.construct_parallel(points, workers=2, shards=3)
+        ver = SNTVerify(T, list(set(points)))
+        ver.populate()
+        self.assertTrue(ver.relativescorrect())
+        self.assertTrue(ver.islocalnettree())
+        self.assertTrue(ver.issemicompressed())
+        self.assertEqual(T.records, len(points))
+        self.assertEqual(T.duplicates(points[0])[-1], len(points) - 1)
+        self.assertGreater(metric.counter, 0)
+
+    def testconstruct_parallel_seams(self):
+        # Points of different shards meet at the seams in every direction
+        metric = Manhattan()
+        points = [Point([random.uniform(-1000, 1000) for _ in range(3)], metric) for _ in range(600)]
+        T = SNT(7, 1, 1)
+        T.construct_parallel(points, workers=2, shards=4)
+        ver = SNTVerify(T, points)
+        ver.populate()
+        self.assertTrue(ver.relativescorrect())
+        self.assertTrue(ver.islocalnettree())
+        self.assertTrue(ver.issemicompressed())
+        self.assertEqual(set(T.pointsbelow(T.root)), set(points))
+        self.assertEqual(sorted(i for p in points for i in T.duplicates(p)), list(range(len(points))))
+
+    def testconstruct_parallel_update(self):
+        metric = Euclidean()
+        points = list({Point([random.randint(-1000, 1000) for _ in range(2)], metric) for _ in range(300)})
+        T = SNT(7, 1, 1)
+        T.construct_parallel(points, workers=2, shards=3)
+        self.assertTrue(T.ploc.tree is T)
+        # The tree stays valid under updates through the adopted point location
+        root = T.root.point
+        T.delete(root)
+        new = list({Point([random.randint(-1000, 1000) for _ in range(2)], metric) for _ in range(30)} - set(points))
+        for p in new:
+            T.insert(p)
+        expected = [p for p in points if p != root] + new
+        ver = SNTVerify(T, [T.registry.intern(p) for p in expected])
+        ver.populate()
+        self.assertTrue(ver.relativescorrect())
+        self.assertTrue(ver.islocalnettree())
+        self.assertTrue(ver.issemicompressed())
+        self.assertEqual(set(T.pointsbelow(T.root)), set(expected))
+
+    def testdelete(self):
+        metric = Euclidean()
+        points = [Point([random.randint(-1000, 1000) for _ in range(2)], metric) for _ in range(100)]
+        points = list(set(points))
+        T = SNT(7, 1, 1)
+        T.construct(points + [Point(list(points[0].coords), metric)], SNTPointLocation)
+        root = T.root.point
+        order = [root] + [p for p in points if p is not root]
+        # A payload id that is not a copy of the point is rejected before anything changes
+        self.assertRaises(KeyError, T.delete, points[0], max(T.duplicates(points[0])) + 1)
+        self.assertEqual(T.multiplicity(points[0]), 2)
+        # Deleting one of two copies keeps the nodes of the point
+        T.delete(points[0])
+        self.assertEqual(T.multiplicity(points[0]), 1)
+        self.assertEqual(len(T.pointsbelow(T.root)), len(points))
+        for i, p in enumerate(order):
+            T.delete(p)
+            remaining = order[i + 1:]
+            self.assertEqual(T.multiplicity(p), 0)
+            self.assertEqual(set(T.points), set(remaining))
+            if not remaining: break
+            self.assertEqual(sorted(T.pointsbelow(T.root), key=lambda q: q.pid), sorted(remaining, key=lambda q: q.pid))
+            if i % 10 == 0:
+                ver = SNTVerify(T, remaining)
+                ver.populate()
+                self.assertTrue(ver.relativescorrect())
+                self.assertTrue(ver.islocalnettree())
+                self.assertTrue(ver.issemicompressed())
+        self.assertEqual(T.root, None)
+        self.assertRaises(KeyError, T.delete, points[0])
+
+    def testdeleteinsert(self):
+        metric = Euclidean()
+        points = list(set(Point([random.randint(-1000, 1000) for _ in range(2)], metric) for _ in range(300)))
+        T = SNT(7, 1, 1)
+        T.construct(points[:200], SNTPointLocation)
+        present = set(T.points)
+        # Deletions interleaved with insertions keep the list of points in step with the tree
+        for i in range(200, len(points)):
+            p = random.choice(T.points)
+            T.delete(p)
+            present.remove(p)
+            T.insert_many([points[i]])
+            present.add(points[i])
+            self.assertEqual(len(T.points), len(present))
+            self.assertEqual(set(T.points), present)
+        self.assertEqual(set(T.pointsbelow(T.root)), present)
+
+    def testconstructwithqueries(self):
+        metric = Euclidean()
+        points = [Point([random.randint(-1000, 1000) for _ in range(2)], metric) for _ in range(200)]
+        points = list(set(points))
+        queries = [Point([random.randint(-1000, 1000) + .5 for _ in range(2)], metric) for _ in range(100)]
+        queries += queries[:5] + points[:5]
+        for pointlocation in [SNTPointLocation, PL]:
+            T = SNT(7, 1, 1)
+            result = T.construct(points, pointlocation, queries)
+            self.assertEqual(len(result), len(queries))
+            for query, (p, dst) in zip(queries, result):
+                self.assertEqual(dst, min(query.distto(other) for other in points))
+                self.assertEqual(query.distto(p), dst)
+            self.assertEqual(set(T.points), set(points))
+            self.assertEqual(len(T.knn(queries[0], len(points) + 1)), len(points))
+        self.assertEqual(SNT(7, 1, 1).construct(points, SNTPointLocation), None)
+
+    def testknn(self):
+        metric = Euclidean()
+        points = [Point([x], metric) for x in [0, 2, 11, 28, 30, 64]]
+        T = SNT(5, 1, 1)
+        T.construct(points, PL)
+        # 28 and 30 are both at distance 1 from 29, and either one is a nearest neighbor
+        [(p, dst)] = T.knn(Point([29], metric), 1)
+        self.assertEqual(dst, 1)
+        self.assertIn(p, [points[3], points[4]])
+        self.assertEqual([p for p, _ in T.knn(Point([10], metric), 3)], [points[2], points[1], points[0]])
+        self.assertEqual([d for _, d in T.knn(Point([1], metric), 10)], [1, 1, 10, 27, 29, 63])
+        self.assertEqual(T.knn(Point([1], metric), 0), [])
+        
+        points = [Point([random.randint(-1000, 1000) for _ in range(3)], metric) for _ in range(300)]
+        points = list(set(points))
+        T = SNT(7, 1, 1)
+        T.construct(points, PL)
+        for _ in range(20):
+            query = Point([random.randint(-1000, 1000) for _ in range(3)], metric)
+            metric.reset()
+            result = T.knn(query, 5)
+            self.assertLess(metric.counter, len(points))
+            self.assertEqual([d for _, d in result], sorted(query.distto(p) for p in points)[:5])
+            self.assertEqual([d for _, d in result], [query.distto(p) for p, _ in result])
+
+    def testann(self):
+        metric = Euclidean()
+        points = [Point([random.randint(-1000, 1000) for _ in range(3)], metric) for _ in range(300)]
+        points = list(set(points))
+        T = SNT(7, 1, 1)
+        T.construct(points, PL)
+        exactcount, approxcount = 0, 0
+        for _ in range(20):
+            query = Point([random.randint(-1000, 1000) for _ in range(3)], metric)
+            nndist = min(query.distto(p) for p in points)
+            metric.reset()
+            p, dst, count = T.ann(query, 0)
+            self.assertEqual(count, metric.counter)
+            self.assertEqual(dst, nndist)
+            self.assertEqual(query.distto(p), dst)
+            exactcount += count
+            p, dst, count = T.ann(query, .5)
+            self.assertLessEqual(dst, 1.5 * nndist)
+            self.assertEqual(query.distto(p), dst)
+            approxcount += count
+        self.assertLessEqual(approxcount, exactcount)
+        self.assertEqual(SNT(7, 1, 1).ann(query, .5), None)
+
+    def testbatch_nn(self):
+        metric = Euclidean()
+        points = [Point([random.randint(-1000, 1000) for _ in range(2)], metric) for _ in range(200)]
+        points = list(set(points))
+        T = SNT(7, 1, 1)
+        T.construct(points, PL)
+        queries = [Point([random.randint(-1000, 1000) for _ in range(2)], metric) for _ in range(100)]
+        queries += queries[:10] + points[:10]
+        result = T.batch_nn(queries)
+        self.assertEqual(len(result), len(queries))
+        for query, (p, dst) in zip(queries, result):
+            self.assertEqual(dst, min(query.distto(other) for other in points))
+            self.assertEqual(query.distto(p), dst)
+        self.assertEqual(T.batch_nn([]), [])
+        self.assertEqual(T.batch_nn([points[0]]), [(points[0], 0)])
+        self.assertEqual(SNT(7, 1, 1).batch_nn(queries[:3]), [None] * 3)
+
+    def testbatch_nn_deep(self):
+        # Geometrically spaced points make a tree with a level per point
+        metric = Euclidean()
+        points = [Point([2.0 ** -i], metric) for i in range(400)]
+        T = SNT(2, 1, 1, 4)
+        T.construct(points, SNTPointLocation)
+        queries = [Point([3.0 * 2.0 ** -i], metric) for i in range(0, 400, 3)]
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(200)
+        try:
+            result = T.batch_nn(queries)
+        finally:
+            sys.setrecursionlimit(limit)
+        for query, (p, dst) in zip(queries, result):
+            self.assertEqual(dst, min(query.distto(other) for other in points))
+
+    def testall_nn(self):
+        metric = Euclidean()
+        points = [Point([x], metric) for x in [0, 2, 11, 28, 30]]
+        T = SNT(5, 1, 1)
+        T.construct(points, PL)
+        rows, indices, dists = T.all_nn()
+        self.assertEqual(indices.shape, (5, 1))
+        order = [rows.index(p) for p in points]
+        self.assertEqual([rows[indices[i, 0]] for i in order], [points[1], points[0], points[1], points[4], points[3]])
+        self.assertEqual([dists[i, 0] for i in order], [2, 2, 9, 2, 2])
+        rows, indices, dists = T.all_nn(5)
+        self.assertTrue((indices[:, 4] == -1).all())
+        self.assertTrue((dists[:, 4] == float('inf')).all())
+        
+        points = [Point([random.randint(-1000, 1000) for _ in range(2)], metric) for _ in range(200)]
+        points = list(set(points))
+        T = SNT(7, 1, 1)
+        T.construct(points[:150], PL)
+        # Points added by insert and removed by delete are numbered by the leaves as well
+        for p in points[150:]:
+            T.insert(p)
+        T.delete(points[0])
+        rows, indices, dists = T.all_nn(3)
+        self.assertEqual(set(rows), set(points[1:]))
+        for i, p in enumerate(rows):
+            self.assertEqual(list(dists[i]), sorted(p.distto(q) for q in points[1:] if q is not p)[:3])
+            self.assertEqual([p.distto(rows[j]) for j in indices[i]], list(dists[i]))
+        rows, indices, dists = SNT(7, 1, 1).all_nn(2)
+        self.assertEqual((rows, indices.shape, dists.shape), ([], (0, 2), (0, 2)))
+
+    def testrange(self):
+        metric = Euclidean()
+        points = [Point([x], metric) for x in [0, 2, 11, 28, 30, 64]]
+        T = SNT(5, 1, 1)
+        T.construct(points, PL)
+        self.assertEqual(set(T.range(Point([29], metric), 1)), {points[3], points[4]})
+        self.assertEqual(set(T.range(Point([5], metric), 6)), {points[0], points[1], points[2]})
+        self.assertEqual(T.range(Point([100], metric), 10), [])
+        metric.reset()
+        self.assertEqual(set(T.range(Point([0], metric), 10 ** 6)), set(points))
+        self.assertEqual(metric.counter, 1)
+        
+        points = [Point([random.randint(-1000, 1000) for _ in range(2)], metric) for _ in range(300)]
+        points = list(set(points))
+        T = SNT(7, 1, 1)
+        T.construct(points, PL)
+        for r in [0, 50, 200, 1000]:
+            query = Point([random.randint(-1000, 1000) for _ in range(2)], metric)
+            result = T.range(query, r)
+            self.assertEqual(len(result), len(set(result)))
+            self.assertEqual(set(result), {p for p in points if query.distto(p) <= r})
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,9 +1,18 @@
+import os
 import unittest
+import functools
+import tempfile
+import numpy
 from snt import SNT
-from snt_pointlocation import SNTPointLocation
+from snt_pointlocation import SNTPointLocation, ArrayPointLocation
+from snt_verify import SNTVerify
 from point import Point
+from pointset import PointSet
+from pointio import readnpy
 from metric import Euclidean
 from node import Node
+from pointlocation import ParallelPointLocation
+import random
 
 
 class TestSNTPointLocation(unittest.TestCase):
@@ -19,6 +28,24 @@ class TestSNTPointLocation(unittest.TestCase):
         self.assertEqual(ploc._rnn_in[T.root], set(points))
         self.assertEqual(len(ploc._rnn_out[T.root]), 0)
         
+    def testaddpoints(self):
+        metric = Euclidean()
+        points = [Point([random.randint(-1000, 1000) for _ in range(2)], metric) for _ in range(150)]
+        points = list(set(points))
+        T = SNT(7, 1, 1)
+        T.construct(points[:100], SNTPointLocation)
+        new = points[100:]
+        located = ParallelPointLocation(T, []).nnmany(new)
+        for p, (center, dst) in zip(new, located):
+            self.assertEqual(dst, p.distto(center.point))
+            self.assertEqual(dst, ParallelPointLocation(T, []).nndist(p))
+        T.ploc.addpoints(new)
+        for p, (center, dst) in zip(new, located):
+            self.assertTrue(T.ploc.nn(p) is center)
+            self.assertEqual(T.ploc.nndist(p), dst)
+            self.assertTrue(p in T.ploc.rnn(center))
+        self.assertEqual(ParallelPointLocation(T, []).nnmany([]), [])
+
     def testaddnode(self):
         T = SNT(5, 1, 1)
         T.setroot(Point([0], Euclidean()))
@@ -173,6 +200,73 @@ class TestSNTPointLocation(unittest.TestCase):
         self.assertEqual(ploc._nn[p12], n6)
         self.assertEqual(ploc._nn[p14], n10)
         self.assertEqual(ploc._nn[p15], n9)
-    
+
+
+class TestArrayPointLocation(unittest.TestCase):
+    def testinit(self):
+        T = SNT(5, 1, 1)
+        S = PointSet([[0], [1], [2], [4], [8]], Euclidean())
+        T.setroot(S[0])
+        ploc = ArrayPointLocation(T, [S[i] for i in range(1, 5)])
+        self.assertTrue(ploc.pointset is S)
+        for i in range(1, 5):
+            self.assertEqual(ploc.nn(S[i]), T.root)
+        self.assertEqual(sorted(ploc.rnn_in(T.root).tolist()), [1, 2, 3, 4])
+        self.assertEqual(len(ploc.rnn_out(T.root)), 0)
+        self.assertEqual(ploc.center[0], -1)
+        # Other points are copied into a point set of their own
+        points = [Point([i], Euclidean()) for i in [1, 2, 4, 8]]
+        ploc = ArrayPointLocation(T, points)
+        self.assertTrue(numpy.array_equal(ploc.pointset.coords.ravel(), [1, 2, 4, 8]))
+        self.assertEqual(ploc.nndist(points[2]), 4)
+
+    def testconstruct(self):
+        metric = Euclidean()
+        coords = numpy.array([[random.randint(-100, 100) for _ in range(2)] for _ in range(300)], dtype=float)
+        coords[-1] = coords[0]
+        queries = [Point([random.randint(-100, 100) for _ in range(2)], metric) for _ in range(20)]
+        with tempfile.TemporaryDirectory() as directory:
+            numpy.save(os.path.join(directory, 'points.npy'), coords)
+            S = readnpy(os.path.join(directory, 'points.npy'), metric)
+            T = SNT(7, 1, 1)
+            metric.reset()
+            nearest = T.construct(S, functools.partial(ArrayPointLocation, directory=directory), queries)
+            counter = metric.counter
+            self.assertTrue(isinstance(T.ploc.center, numpy.memmap))
+            points = list(dict.fromkeys(T.registry.intern(p) for p in S))
+            self.assertEqual(len(points), len({tuple(c) for c in coords.tolist()}))
+            self.assertEqual(T.payloads[T.registry.intern(S[0]).pid], [0, 299])
+            ver = SNTVerify(T, points)
+            ver.populate()
+            self.assertTrue(ver.relativescorrect())
+            self.assertTrue(ver.islocalnettree())
+            self.assertTrue(ver.issemicompressed())
+            # The cells are the same as in `SNTPointLocation`, so are the tree and the distances
+            U = SNT(7, 1, 1)
+            metric.reset()
+            self.assertEqual(U.construct(PointSet(coords, metric), SNTPointLocation, queries), nearest)
+            self.assertEqual(metric.counter, counter)
+            def edges(tree):
+                nodes, stack = set(), [tree.root]
+                while stack:
+                    node = stack.pop()
+                    nodes.add((node.point, node.level, node.par and (node.par.point, node.par.level), len(node.rel)))
+                    stack.extend(node.ch)
+                return nodes
+            self.assertEqual(edges(T), edges(U))
+            del T, S
+
+    def testaddpoints(self):
+        metric = Euclidean()
+        S = PointSet([[random.randint(-1000, 1000) for _ in range(2)] for _ in range(200)], metric, dedup=False)
+        T = SNT(7, 1, 1)
+        T.construct([S[i] for i in range(100)], ArrayPointLocation)
+        T.insert_many([S[i] for i in range(100, 200)])
+        ver = SNTVerify(T, list(dict.fromkeys(T.registry.intern(p) for p in S)))
+        ver.populate()
+        self.assertTrue(ver.relativescorrect())
+        self.assertTrue(ver.islocalnettree())
+        self.assertRaises(ValueError, T.ploc.addpoints, [Point([5000, 5000], metric)])
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,6 +1,9 @@
 import unittest
+import random
 from snt import SNT
 from point import Point
+from pointset import PointSet
+from snt_pointlocation import SNTPointLocation
 from metric import Euclidean
 from node import Node
 from snt_verify import SNTVerify
@@ -8,6 +11,19 @@ from snt_verify import SNTVerify
 
 class TestSNT(unittest.TestCase):
     
+    def testequalpoints(self):
+        metric = Euclidean()
+        points = list({Point([random.randint(-100, 100) for _ in range(2)], metric) for _ in range(60)})
+        T = SNT(7, 1, 1)
+        T.construct(points, SNTPointLocation)
+        # Copies and views equal to the points of the tree are accepted in their place
+        for copies in [[Point(list(p.coords), metric) for p in points], list(PointSet.frompoints(points))]:
+            ver = SNTVerify(T, copies)
+            ver.populate()
+            self.assertTrue(ver.relativescorrect())
+            self.assertTrue(ver.issemicompressed())
+        self.assertEqual(len(T.registry), len(points))
+
     def testfinduncomplevels(self):
         T = SNT(2, 1, 1, 4)
         p1 = Point([0], Euclidean())
@@ -55,16 +71,16 @@ class TestSNT(unittest.TestCase):
         T.insert(p4, [ch for ch in T.root.getchild().ch if ch.point == p3][0])
         ver = SNTVerify(T, [p1, p2, p3, p4])
         ver.findminlevelrels()
-        self.assertEqual(ver.minlevels[(p1, p1)], float('-inf'))
-        self.assertEqual(ver.minlevels[(p2, p2)], float('-inf'))
-        self.assertEqual(ver.minlevels[(p3, p3)], float('-inf'))
-        self.assertEqual(ver.minlevels[(p4, p4)], float('-inf'))
-        self.assertEqual(ver.minlevels[(p1, p2)], -1)
-        self.assertEqual(ver.minlevels[(p1, p3)], 2)
-        self.assertEqual(ver.minlevels[(p1, p4)], 3)
-        self.assertEqual(ver.minlevels[(p2, p3)], 2)
-        self.assertEqual(ver.minlevels[(p2, p4)], 3)
-        self.assertEqual(ver.minlevels[(p3, p4)], 3)
+        self.assertEqual(ver.minlevels[(p1.pid, p1.pid)], float('-inf'))
+        self.assertEqual(ver.minlevels[(p2.pid, p2.pid)], float('-inf'))
+        self.assertEqual(ver.minlevels[(p3.pid, p3.pid)], float('-inf'))
+        self.assertEqual(ver.minlevels[(p4.pid, p4.pid)], float('-inf'))
+        self.assertEqual(ver.minlevels[(p1.pid, p2.pid)], -1)
+        self.assertEqual(ver.minlevels[(p1.pid, p3.pid)], 2)
+        self.assertEqual(ver.minlevels[(p1.pid, p4.pid)], 3)
+        self.assertEqual(ver.minlevels[(p2.pid, p3.pid)], 2)
+        self.assertEqual(ver.minlevels[(p2.pid, p4.pid)], 3)
+        self.assertEqual(ver.minlevels[(p3.pid, p4.pid)], 3)
     
     def testfindleaves(self):
         T = SNT(3, 1, 1)